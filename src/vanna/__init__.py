@@ -5,7 +5,6 @@ from dataclasses import dataclass
 from typing import Callable, List, Tuple, Union
 
 import pandas as pd
-import requests
 import plotly.graph_objs
 
 from .exceptions import (
@@ -19,7 +18,7 @@ from .types import (
     UserEmail,
     UserOTP,
 )
-from .utils import sanitize_model_name, validate_config_path
+from .utils import get_http_session, sanitize_model_name, validate_config_path
 
 api_key: Union[str, None] = None  # API key for Vanna.AI
 
@@ -61,8 +60,8 @@ def __unauthenticated_rpc_call(method, params):
     }
     data = {"method": method, "params": [__dataclass_to_dict(obj) for obj in params]}
 
-    response = requests.post(
-        _unauthenticated_endpoint, headers=headers, data=json.dumps(data)
+    response = get_http_session().post(
+        _unauthenticated_endpoint, headers=headers, data=json.dumps(data), timeout=(10, 60)
     )
     return response.json()
 
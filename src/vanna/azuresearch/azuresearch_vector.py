@@ -19,9 +19,9 @@ from azure.search.documents.indexes.models import (
   VectorSearchProfile,
 )
 from azure.search.documents.models import VectorFilterMode, VectorizedQuery
-from fastembed import TextEmbedding
 
 from ..base import VannaBase
+from ..embeddings import get_embedding_model
 from ..utils import deterministic_uuid
 
 
@@ -231,6 +231,7 @@ class AzureAISearch_VectorStore(VannaBase):
         self.index_client.delete_index(self.index_name)
 
     def generate_embedding(self, data: str, **kwargs) -> List[float]:
-        embedding_model = TextEmbedding(model_name=self.fastembed_model)
+        # The model is loaded once per process instead of on every call
+        embedding_model = get_embedding_model("fastembed", self.fastembed_model)
         embedding = next(embedding_model.embed(data))
         return embedding.tolist()
@@ -48,15 +48,22 @@ flowchart
 
 """
 
+import copy
+import functools
 import json
 import os
 import re
 import sqlite3
+import threading
+import time
 import traceback
 from abc import ABC, abstractmethod
-from typing import List, Tuple, Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
 from urllib.parse import urlparse
 
+import numpy as np
 import pandas as pd
 import plotly
 import plotly.express as px
@@ -64,12 +71,92 @@ import plotly.graph_objects as go
 import requests
 import sqlparse
 
-from ..exceptions import DependencyError, ImproperlyConfigured, ValidationError
-from ..types import TrainingPlan, TrainingPlanItem
-from ..utils import validate_config_path
+from ..exceptions import (
+    DependencyError,
+    ImproperlyConfigured,
+    SQLCostError,
+    ValidationError,
+)
+from ..embeddings import EmbeddingReducer, reduction_overlap_report
+from ..snapshot import read_snapshot, read_snapshot_header, write_snapshot
+from ..types import SchemaSyncDiff, SQLCostEstimate, TrainingPlan, TrainingPlanItem
+from ..utils import atomic_write, deterministic_uuid, validate_config_path
+
+# Retrieval methods whose results are cached, mapped to the collection their n_results setting belongs to
+_CACHED_RETRIEVAL_METHODS = {
+    "get_similar_question_sql": "sql",
+    "get_related_ddl": "ddl",
+    "get_related_documentation": "documentation",
+}
+
+# The number of question and context item vectors kept for context_similarity="embedding"
+_CONTEXT_VECTOR_CACHE_SIZE = 4096
+
+# Methods that change the training data and therefore invalidate every cached retrieval result
+_TRAINING_DATA_MUTATIONS = (
+    "add_question_sql",
+    "add_ddl",
+    "add_documentation",
+    "add_question_sql_batch",
+    "add_ddl_batch",
+    "add_documentation_batch",
+    "remove_training_data",
+    "remove_collection",
+    "remove_tenant_training_data",
+)
+
+
+def _cached_retrieval(method):
+    @functools.wraps(method)
+    def wrapper(self, question: str, **kwargs):
+        key = self._retrieval_cache_key(method.__name__, question, kwargs)
+        if key is None:
+            return method(self, question, **kwargs)
+
+        hit, result = self._retrieval_cache_get(key)
+        if hit:
+            # Callers may modify the results (e.g. the dicts of question-SQL pairs), so they never share the cached copy
+            return copy.deepcopy(result)
+
+        # Tagged with the generation from before the lookup, so a result computed while training data
+        # was changing is never served afterwards
+        generation = self.training_data_generation
+        result = method(self, question, **kwargs)
+        self._retrieval_cache_put(key, generation, copy.deepcopy(result))
+        return result
+
+    wrapper._vanna_cached_retrieval = True
+    return wrapper
+
+
+def _invalidates_retrieval_cache(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.invalidate_retrieval_cache()
+
+    wrapper._vanna_invalidates_retrieval_cache = True
+    return wrapper
 
 
 class VannaBase(ABC):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        # Every backend gets the retrieval cache: its retrieval methods are cached and its training data
+        # mutations invalidate the cache, without the backend having to opt in
+        for name in _CACHED_RETRIEVAL_METHODS:
+            method = cls.__dict__.get(name)
+            if callable(method) and not getattr(method, "__isabstractmethod__", False) and not hasattr(method, "_vanna_cached_retrieval"):
+                setattr(cls, name, _cached_retrieval(method))
+
+        for name in _TRAINING_DATA_MUTATIONS:
+            method = cls.__dict__.get(name)
+            if callable(method) and not getattr(method, "__isabstractmethod__", False) and not hasattr(method, "_vanna_invalidates_retrieval_cache"):
+                setattr(cls, name, _invalidates_retrieval_cache(method))
+
     def __init__(self, config=None):
         if config is None:
             config = {}
@@ -80,10 +167,348 @@ class VannaBase(ABC):
         self.dialect = self.config.get("dialect", "SQL")
         self.language = self.config.get("language", None)
         self.max_tokens = self.config.get("max_tokens", 14000)
+        self.training_batch_size = self.config.get("training_batch_size", 100)
+
+        # Optional EXPLAIN-based guard that runs before the generated SQL is executed
+        self.cost_guard = self.config.get("cost_guard", None)
+        if self.cost_guard not in (None, "warn", "reject"):
+            raise ImproperlyConfigured(
+                f"cost_guard must be one of None, 'warn' or 'reject', got {self.cost_guard}"
+            )
+        self.cost_guard_max_rows = self.config.get("cost_guard_max_rows", None)
+        self.cost_guard_max_cost = self.config.get("cost_guard_max_cost", None)
+        self.cost_guard_max_bytes = self.config.get("cost_guard_max_bytes", None)
+        self.cost_guard_allow_cartesian = self.config.get("cost_guard_allow_cartesian", False)
+
+        # Retrieval results are cached per (method, normalized question, n_results, kwargs). Entries expire
+        # after `retrieval_cache_ttl` seconds (None for never) and a size of 0 turns the cache off. Changes made
+        # through this instance invalidate the cache right away, but changes made by other processes or clients
+        # of a shared vector store only show up once entries expire, so the default TTL is short
+        self.retrieval_cache_size = self.config.get("retrieval_cache_size", 1024)
+        self.retrieval_cache_ttl = self.config.get("retrieval_cache_ttl", 10)
+
+        # How retrieval snapshots are checked against changes other processes made to the vector store: "count"
+        # compares the number of items of each type where the store counts them without fetching the training data,
+        # "ids" hashes every training data ID, which fetches all of it on every save and load, and None only
+        # compares the training data generation
+        self.retrieval_snapshot_fingerprint = self.config.get("retrieval_snapshot_fingerprint", "count")
+        if self.retrieval_snapshot_fingerprint not in (None, "count", "ids"):
+            raise ImproperlyConfigured(
+                f"retrieval_snapshot_fingerprint must be one of None, 'count' or 'ids', got {self.retrieval_snapshot_fingerprint}"
+            )
+
+        # Context selection between retrieval and the prompt. Exact duplicates are always dropped; with
+        # "mmr" the context is also reordered by maximal marginal relevance, near-duplicates are collapsed
+        # and the total is kept within `context_token_budget` tokens. With `context_similarity="embedding"`
+        # the vectors the vector store retrieved are compared, where it hands them back through
+        # `_remember_context_vectors`; otherwise, and for other vector stores, the comparison is lexical
+        self.context_selection = self.config.get("context_selection", None)
+        if self.context_selection not in (None, "mmr"):
+            raise ImproperlyConfigured(
+                f"context_selection must be one of None or 'mmr', got {self.context_selection}"
+            )
+        self.context_similarity = self.config.get("context_similarity", "lexical")
+        if self.context_similarity not in ("lexical", "embedding"):
+            raise ImproperlyConfigured(
+                f"context_similarity must be one of 'lexical' or 'embedding', got {self.context_similarity}"
+            )
+        self.context_mmr_lambda = self.config.get("context_mmr_lambda", 0.7)
+        self.context_duplicate_threshold = self.config.get("context_duplicate_threshold", 0.9)
+        self.context_token_budget = self.config.get("context_token_budget", None)
+
+        # Optional reduction of embeddings to `embedding_reduction_dim` dimensions, applied by the vector stores
+        # that manage their own vectors both when indexing and when searching
+        self.embedding_reduction = self.config.get("embedding_reduction", None)
+        self.embedding_reduction_dim = self.config.get("embedding_reduction_dim", None)
+        if self.embedding_reduction is not None:
+            EmbeddingReducer(self.embedding_reduction, self.embedding_reduction_dim)
 
     def log(self, message: str, title: str = "Info"):
         print(f"{title}: {message}")
 
+    @property
+    def training_data_generation(self) -> int:
+        """
+        A counter that every change to the training data increments. Anything derived from the training data
+        is stale once the generation it was computed at is older than this.
+        """
+        return self.__dict__.get("_training_data_generation", 0)
+
+    def invalidate_retrieval_cache(self) -> None:
+        """
+        Marks every cached retrieval result as stale. It's called after every `add_*`, `remove_training_data`
+        and `remove_collection`; call it yourself if the training data was changed by another process.
+        """
+        with self._retrieval_cache_lock():
+            self._training_data_generation = self.training_data_generation + 1
+            self.__dict__.get("_retrieval_cache", {}).clear()
+
+    def _retrieval_cache_lock(self):
+        # Created on first use because vector stores can be used before VannaBase.__init__ has run
+        lock = self.__dict__.get("_retrieval_cache_mutex")
+        if lock is None:
+            lock = self.__dict__.setdefault("_retrieval_cache_mutex", threading.RLock())
+        return lock
+
+    def _retrieval_cache_key(self, method_name: str, question: str, kwargs: dict):
+        if getattr(self, "retrieval_cache_size", 0) <= 0 or not isinstance(question, str):
+            return None
+
+        collection = _CACHED_RETRIEVAL_METHODS[method_name]
+        n_results = getattr(self, f"n_results_{collection}", getattr(self, "n_results", None))
+        key = (method_name, " ".join(question.split()).casefold(), n_results, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _retrieval_cache_get(self, key):
+        with self._retrieval_cache_lock():
+            cache = self.__dict__.get("_retrieval_cache")
+            entry = cache.get(key) if cache is not None else None
+            if entry is None:
+                return False, None
+
+            generation, created, result = entry
+            if generation != self.training_data_generation or self._retrieval_cache_expired(created):
+                del cache[key]
+                return False, None
+
+            cache.move_to_end(key)
+            return True, result
+
+    def _retrieval_cache_expired(self, created: Union[float, None]) -> bool:
+        # Entries restored from a retrieval snapshot have no creation time and don't expire
+        ttl = getattr(self, "retrieval_cache_ttl", None)
+        return created is not None and ttl is not None and time.monotonic() - created > ttl
+
+    def _retrieval_cache_put(self, key, generation: int, result, expires: bool = True) -> None:
+        with self._retrieval_cache_lock():
+            if generation != self.training_data_generation:
+                return
+
+            cache = self.__dict__.setdefault("_retrieval_cache", OrderedDict())
+            cache[key] = (generation, time.monotonic() if expires else None, result)
+            cache.move_to_end(key)
+            while len(cache) > self.retrieval_cache_size:
+                cache.popitem(last=False)
+
+    def _shared_related_training_data(self, question: str, fetch: Callable[[], Any], **kwargs) -> Any:
+        """
+        Returns `fetch()`, reusing its result for the same question and kwargs until the training data changes or
+        `retrieval_cache_ttl` passes. Vector stores that retrieve the related question-SQL pairs, DDL and
+        documentation in one query use it to share that query between `get_similar_question_sql`,
+        `get_related_ddl` and `get_related_documentation`. Only the last question is kept.
+        """
+        key = (question, tuple(sorted(kwargs.items())))
+        with self._retrieval_cache_lock():
+            generation = self.training_data_generation
+            cached = self.__dict__.get("_related_training_data_entry")
+            ttl = getattr(self, "retrieval_cache_ttl", None)
+            if (
+                cached is not None
+                and cached[0] == key
+                and cached[1] == generation
+                and (ttl is None or time.monotonic() - cached[2] <= ttl)
+            ):
+                return copy.deepcopy(cached[3])
+
+        result = fetch()
+        with self._retrieval_cache_lock():
+            if generation == self.training_data_generation:
+                self.__dict__["_related_training_data_entry"] = (key, generation, time.monotonic(), result)
+        return copy.deepcopy(result)
+
+    def _adopt_training_data_generation(self, generation: int) -> None:
+        # Moves the current generation, and the cache entries computed at it, to `generation`
+        with self._retrieval_cache_lock():
+            current = self.training_data_generation
+            cache = self.__dict__.get("_retrieval_cache", {})
+            for key, (entry_generation, created, result) in list(cache.items()):
+                if entry_generation == current:
+                    cache[key] = (generation, created, result)
+            self._training_data_generation = generation
+
+    def _retrieval_state(self) -> Tuple[dict, Dict[str, np.ndarray]]:
+        """
+        Returns the in-process retrieval state of the vector store for `save_retrieval_snapshot`, as a
+        JSON-serializable dict and a dict of arrays. Vector stores that keep their index in the process override it.
+        """
+        return {}, {}
+
+    def _restore_retrieval_state(self, state: dict, arrays: Dict[str, np.ndarray]) -> None:
+        """
+        Restores the state returned by `_retrieval_state`. The arrays are read-only memory maps of the snapshot file.
+        """
+        pass
+
+    def _training_data_fingerprint(self) -> Union[str, None]:
+        """
+        Returns a fingerprint of the training data in the vector store, which changes when any process changes it,
+        so a retrieval snapshot can be checked against the store rather than against this process's generation,
+        or None if there's nothing to check.
+
+        With `retrieval_snapshot_fingerprint` set to "count", the default, it's the number of items of each type,
+        for vector stores that override `count_training_data` to count them without fetching the training data.
+        It's None for other vector stores, since counting them is as costly as "ids", which hashes the training data IDs.
+        Vector stores that keep their training data in files fingerprint those instead, and vector stores whose
+        training data is restored from the snapshot itself return None.
+        """
+        mode = getattr(self, "retrieval_snapshot_fingerprint", "count")
+        if mode == "ids":
+            df = self.get_training_data()
+            ids = sorted(df["id"].astype(str)) if df is not None and "id" in df.columns else []
+            return deterministic_uuid(f"{len(ids)}\n" + "\n".join(ids))
+
+        if mode == "count" and type(self).count_training_data is not VannaBase.count_training_data:
+            counts = [
+                self.count_training_data(training_data_type=training_data_type)
+                for training_data_type in ("sql", "ddl", "documentation")
+            ]
+            return deterministic_uuid(json.dumps(counts))
+        return None
+
+    def save_retrieval_snapshot(self, path: str) -> int:
+        """
+        Example:
+        ```python
+        vn.train(ddl="CREATE TABLE customers (id INT, name TEXT)")
+        vn.save_retrieval_snapshot("retrieval.snapshot")
+        ```
+
+        Saves the ready-to-serve retrieval state to a single file that new processes load with
+        `load_retrieval_snapshot` instead of rebuilding it: the in-process indexes of in-memory NumPy and FAISS
+        vector stores, the fitted PCA embedding reduction, the retrieval cache and the suggested questions.
+        The snapshot is tagged with a fingerprint of the training data in the vector store, chosen by
+        `retrieval_snapshot_fingerprint`.
+
+        The snapshot is tagged with the training data generation. Replacing a snapshot that this process didn't
+        write or load moves the generation past the old snapshot's, so generations only increase.
+
+        Args:
+            path (str): The file to write.
+
+        Returns:
+            int: The training data generation of the snapshot.
+        """
+        # Suggested questions are served from the retrieval cache
+        if getattr(self, "retrieval_cache_size", 0) > 0:
+            self.generate_questions()
+
+        with self._retrieval_cache_lock():
+            generation = self.training_data_generation
+            previous = read_snapshot_header(path)
+            if previous is not None and (
+                generation < previous["generation"]
+                or (generation == previous["generation"] and self.__dict__.get("_snapshot_generation") != generation)
+            ):
+                generation = previous["generation"] + 1
+                self._adopt_training_data_generation(generation)
+
+            entries = []
+            for key, (entry_generation, created, result) in self.__dict__.get("_retrieval_cache", {}).items():
+                if entry_generation != generation or self._retrieval_cache_expired(created):
+                    continue
+                # Keys have to survive the round trip through JSON
+                if not all(isinstance(value, (str, int, float, bool, type(None))) for _, value in key[3]):
+                    continue
+                try:
+                    entries.append(json.loads(json.dumps([list(key[:3]), [list(item) for item in key[3]], result])))
+                except (TypeError, ValueError):
+                    continue
+
+            state, arrays = self._retrieval_state()
+            arrays = {f"store_{name}": array for name, array in arrays.items()}
+            reducer = self.embedding_reducer
+            if reducer is not None and reducer.components is not None:
+                arrays["embedding_reducer_components"] = reducer.components
+
+            write_snapshot(
+                path,
+                {
+                    "store": type(self).__name__,
+                    "generation": generation,
+                    "fingerprint": self._training_data_fingerprint(),
+                    "created": time.time(),
+                    "retrieval_cache": entries,
+                    "state": state,
+                },
+                arrays,
+            )
+            self.__dict__["_snapshot_generation"] = generation
+
+        self.log(title="Retrieval Snapshot", message=f"Saved generation {generation} to {path}")
+        return generation
+
+    def load_retrieval_snapshot(self, path: str) -> bool:
+        """
+        Example:
+        ```python
+        vn = MyVanna(config={"client": "in-memory"})
+        vn.load_retrieval_snapshot("retrieval.snapshot")
+        ```
+
+        Loads a snapshot written by `save_retrieval_snapshot`, so the process is ready to serve without re-embedding
+        or re-indexing the training data, and the training data generation becomes the snapshot's. NumPy vectors
+        are memory-mapped from the file; FAISS indexes are deserialized from it into memory.
+
+        The restored retrieval cache entries were checked against the training data when the snapshot was loaded,
+        so they don't expire after `retrieval_cache_ttl`. They're dropped when the training data changes through
+        this instance; call `invalidate_retrieval_cache` to drop them after changes made elsewhere.
+
+        Args:
+            path (str): The snapshot file.
+
+        Returns:
+            bool: True if the snapshot was loaded. False if there's no snapshot, it was written by another vector
+            store, or the training data has changed since it was saved, either in this process or in the vector store.
+        """
+        header = read_snapshot_header(path)
+        if header is None or header["store"] != type(self).__name__:
+            return False
+        if self.training_data_generation > header["generation"] or self._snapshot_fingerprint_changed(header):
+            self.log(title="Retrieval Snapshot", message=f"Skipped stale snapshot {path} (generation {header['generation']})")
+            return False
+
+        header, arrays = read_snapshot(path)
+        with self._retrieval_cache_lock():
+            components = arrays.get("embedding_reducer_components")
+            if components is not None and self.embedding_reduction == "pca" and components.shape[0] == self.embedding_reduction_dim:
+                self.__dict__["_embedding_reducer"] = EmbeddingReducer("pca", self.embedding_reduction_dim, np.array(components))
+
+            self._restore_retrieval_state(
+                header["state"], {name[len("store_"):]: array for name, array in arrays.items() if name.startswith("store_")}
+            )
+
+            generation = header["generation"]
+            self.__dict__.get("_retrieval_cache", {}).clear()
+            self._training_data_generation = generation
+            self.__dict__["_snapshot_generation"] = generation
+            for (method_name, question, n_results), kwargs, result in header["retrieval_cache"]:
+                key = (method_name, question, n_results, tuple(tuple(item) for item in kwargs))
+                self._retrieval_cache_put(key, generation, result, expires=False)
+
+        self.log(title="Retrieval Snapshot", message=f"Loaded generation {generation} from {path}")
+        return True
+
+    def retrieval_snapshot_is_stale(self, path: str) -> bool:
+        """
+        Returns True if the snapshot at `path` has a different training data generation than this process, i.e.
+        either the training data changed here since it was saved or loaded, or a newer snapshot was saved since,
+        or if the training data in the vector store has changed since it was saved.
+        """
+        header = read_snapshot_header(path)
+        return (
+            header is None
+            or header["generation"] != self.training_data_generation
+            or self._snapshot_fingerprint_changed(header)
+        )
+
+    def _snapshot_fingerprint_changed(self, header: dict) -> bool:
+        fingerprint = self._training_data_fingerprint()
+        return fingerprint is not None and header.get("fingerprint") != fingerprint
+
     def _response_language(self) -> str:
         if self.language is None:
             return ""
@@ -105,6 +530,8 @@ class VannaBase(ABC):
 
         - [`get_related_documentation`][vanna.base.base.VannaBase.get_related_documentation]
 
+        - [`select_context`][vanna.base.base.VannaBase.select_context]
+
         - [`get_sql_prompt`][vanna.base.base.VannaBase.get_sql_prompt]
 
         - [`submit_prompt`][vanna.base.base.VannaBase.submit_prompt]
@@ -124,6 +551,7 @@ class VannaBase(ABC):
         question_sql_list = self.get_similar_question_sql(question, **kwargs)
         ddl_list = self.get_related_ddl(question, **kwargs)
         doc_list = self.get_related_documentation(question, **kwargs)
+        question_sql_list, ddl_list, doc_list = self.select_context(question, question_sql_list, ddl_list, doc_list)
         prompt = self.get_sql_prompt(
             initial_prompt=initial_prompt,
             question=question,
@@ -145,6 +573,7 @@ class VannaBase(ABC):
 
                 try:
                     self.log(title="Running Intermediate SQL", message=intermediate_sql)
+                    self.check_sql_cost(intermediate_sql)
                     df = self.run_sql(intermediate_sql)
 
                     prompt = self.get_sql_prompt(
@@ -385,6 +814,126 @@ class VannaBase(ABC):
     def generate_embedding(self, data: str, **kwargs) -> List[float]:
         pass
 
+    def generate_embeddings(self, data: List[str], **kwargs) -> List[List[float]]:
+        """
+        This method is used to generate embeddings for a batch of strings. By default it calls `generate_embedding` once per string.
+        Override this method if your embeddings API can embed several strings in one call.
+
+        Args:
+            data (List[str]): The strings to embed.
+
+        Returns:
+            List[List[float]]: One embedding per string, in the same order.
+        """
+        return [self.generate_embedding(item, **kwargs) for item in data]
+
+    def _embedding_reduction_path(self):
+        if "embedding_reduction_path" in self.config:
+            return self.config["embedding_reduction_path"]
+        if self.config.get("client", "persistent") == "in-memory":
+            return None
+        return os.path.join(self.config.get("path", "."), "embedding_reduction.npz")
+
+    @property
+    def embedding_reducer(self):
+        """
+        The `EmbeddingReducer` configured with `embedding_reduction` and `embedding_reduction_dim`, or None. A fitted
+        PCA projection is loaded from `embedding_reduction_path` (by default `embedding_reduction.npz` in `path`).
+        """
+        if getattr(self, "embedding_reduction", None) is None:
+            return None
+
+        reducer = self.__dict__.get("_embedding_reducer")
+        if reducer is None:
+            path = self._embedding_reduction_path()
+            if self.embedding_reduction == "pca" and path is not None and os.path.exists(path):
+                reducer = EmbeddingReducer.load(path)
+            else:
+                reducer = EmbeddingReducer(self.embedding_reduction, self.embedding_reduction_dim)
+            self.__dict__["_embedding_reducer"] = reducer
+        return reducer
+
+    def reduce_embeddings(self, embeddings) -> np.ndarray:
+        """
+        Applies the configured embedding reduction. Vector stores call this on every embedding they index or
+        search with, so both sides are always in the same space.
+
+        Args:
+            embeddings: The embeddings to reduce.
+
+        Returns:
+            np.ndarray: The reduced embeddings, or the embeddings unchanged if no reduction is configured.
+        """
+        reducer = self.embedding_reducer
+        if reducer is None:
+            return np.asarray(embeddings, dtype=np.float32)
+        return reducer.transform(embeddings)
+
+    def fit_embedding_reduction(self, texts: List[str]) -> None:
+        """
+        Example:
+        ```python
+        vn.fit_embedding_reduction(df_information_schema["column_name"].tolist() + example_questions)
+        ```
+
+        Fits the PCA projection used by `embedding_reduction="pca"` on the embeddings of `texts` and saves it next
+        to the vector store. Fit it before adding training data: training data added before a refit has to be
+        added again, since its vectors were reduced with the previous projection.
+
+        Args:
+            texts (List[str]): A representative sample of the text that will be embedded, at least
+            `embedding_reduction_dim` items.
+        """
+        if self.embedding_reduction != "pca":
+            raise ImproperlyConfigured("fit_embedding_reduction() is only needed with embedding_reduction='pca'")
+
+        reducer = EmbeddingReducer("pca", self.embedding_reduction_dim).fit(self.generate_embeddings(texts))
+        path = self._embedding_reduction_path()
+        if path is not None:
+            reducer.save(path)
+        self.__dict__["_embedding_reducer"] = reducer
+
+    def embedding_reduction_report(
+        self, dims: List[int] = None, k: int = 10, n_queries: int = 100, methods: List[str] = ("truncate", "pca")
+    ) -> pd.DataFrame:
+        """
+        Example:
+        ```python
+        vn.embedding_reduction_report(dims=[512, 256, 128])
+        ```
+
+        Measures how much retrieval over the training data changes when the embeddings are reduced. The training
+        data is embedded at full size and a sample of it is used as queries; for every method and target dimension
+        the report gives the fraction of the full-size top k that the reduced search also returns.
+
+        Args:
+            dims (List[int]): The target dimensions. Defaults to 1/2, 1/4 and 1/8 of the embedding size.
+            k (int): The number of results to compare.
+            n_queries (int): The number of training data items to sample as queries.
+            methods (List[str]): The reduction methods to measure, "truncate" and/or "pca".
+
+        Returns:
+            pd.DataFrame: One row per method and dimension with `overlap_at_k` and `relative_size`.
+        """
+        df = self.get_training_data()
+        if df is None or len(df) == 0:
+            return pd.DataFrame(columns=["method", "dim", "overlap_at_k", "relative_size"])
+
+        questions, texts = [], []
+        for record in self._training_data_records(df):
+            questions.append(record["question"])
+            texts.append(f"{record['question']} {record['content']}" if record["question"] is not None else record["content"])
+        vectors = np.asarray(self.generate_embeddings(texts), dtype=np.float32)
+
+        sample = np.random.default_rng(0).choice(len(texts), min(n_queries, len(texts)), replace=False)
+        queries = [questions[i] or texts[i] for i in sample]
+        query_vectors = np.asarray(self.generate_embeddings(queries), dtype=np.float32)
+
+        if dims is None:
+            dims = [vectors.shape[1] // divisor for divisor in (2, 4, 8) if vectors.shape[1] // divisor > 0]
+
+        return reduction_overlap_report(vectors, query_vectors, dims, k=k, methods=methods)
+
     # ----------------- Use Any Database to Store and Retrieve Context ----------------- #
     @abstractmethod
     def get_similar_question_sql(self, question: str, **kwargs) -> list:
@@ -465,6 +1014,102 @@ class VannaBase(ABC):
         """
         pass
 
+    def add_question_sql_batch(self, question_sql_list: List[dict], **kwargs) -> List[str]:
+        """
+        Example:
+        ```python
+        vn.add_question_sql_batch([
+            {"question": "How many customers are there?", "sql": "SELECT COUNT(*) FROM customers"},
+            {"question": "What is the total revenue?", "sql": "SELECT SUM(amount) FROM invoices"},
+        ])
+        ```
+
+        This method is used to add many question-SQL pairs to the training data. The items are processed in batches of `training_batch_size` (100 by default) and progress is logged after each batch.
+        By default it calls `add_question_sql` once per item. Vector stores override it to embed and write each batch in a single call.
+
+        Args:
+            question_sql_list (List[dict]): The question-SQL pairs to add, as dicts with "question" and "sql" keys.
+            batch_size (int, optional): Overrides `training_batch_size` for this call.
+            ids (List[str], optional): IDs to store the items under instead of the ones derived from their content. Vector stores that support it keep these; the default implementation ignores them. Used by `import_training_data`.
+            embeddings (List[List[float]], optional): Precomputed embeddings, already reduced by `reduce_embeddings`. Vector stores that support it store these instead of embedding the items; the default implementation ignores them.
+            metadatas (List[dict], optional): Metadata to store with each item, readable with `get_training_data_metadata`. Only vector stores that override `get_training_data_metadata` keep it; the default implementation ignores it and the native batch methods of other stores raise a ValueError. Used by `sync_schema`.
+
+        Returns:
+            List[str]: The IDs of the training data that was added.
+        """
+        ids = []
+        for batch in self._iter_training_batches(question_sql_list, **kwargs):
+            ids += [self.add_question_sql(question=item["question"], sql=item["sql"]) for item in batch]
+            self._log_training_progress("question-SQL pairs", len(ids), len(question_sql_list))
+
+        return ids
+
+    def add_ddl_batch(self, ddl_list: List[str], **kwargs) -> List[str]:
+        """
+        Example:
+        ```python
+        vn.add_ddl_batch(["CREATE TABLE customers (id INT, name TEXT)", "CREATE TABLE invoices (id INT, amount DECIMAL)"])
+        ```
+
+        This method is used to add many DDL statements to the training data. The items are processed in batches of `training_batch_size` (100 by default) and progress is logged after each batch.
+        By default it calls `add_ddl` once per item. Vector stores override it to embed and write each batch in a single call.
+
+        Args:
+            ddl_list (List[str]): The DDL statements to add.
+            batch_size (int, optional): Overrides `training_batch_size` for this call.
+            ids (List[str], optional): IDs to store the items under instead of the ones derived from their content. Vector stores that support it keep these; the default implementation ignores them. Used by `import_training_data`.
+            embeddings (List[List[float]], optional): Precomputed embeddings, already reduced by `reduce_embeddings`. Vector stores that support it store these instead of embedding the items; the default implementation ignores them.
+            metadatas (List[dict], optional): Metadata to store with each item, readable with `get_training_data_metadata`. Only vector stores that override `get_training_data_metadata` keep it; the default implementation ignores it and the native batch methods of other stores raise a ValueError. Used by `sync_schema`.
+
+        Returns:
+            List[str]: The IDs of the training data that was added.
+        """
+        ids = []
+        for batch in self._iter_training_batches(ddl_list, **kwargs):
+            ids += [self.add_ddl(ddl) for ddl in batch]
+            self._log_training_progress("DDL statements", len(ids), len(ddl_list))
+
+        return ids
+
+    def add_documentation_batch(self, documentation_list: List[str], **kwargs) -> List[str]:
+        """
+        Example:
+        ```python
+        vn.add_documentation_batch(["Our fiscal year starts in February.", "Revenue is recognized on invoice date."])
+        ```
+
+        This method is used to add many pieces of documentation to the training data. The items are processed in batches of `training_batch_size` (100 by default) and progress is logged after each batch.
+        By default it calls `add_documentation` once per item. Vector stores override it to embed and write each batch in a single call.
+
+        Args:
+            documentation_list (List[str]): The documentation to add.
+            batch_size (int, optional): Overrides `training_batch_size` for this call.
+            ids (List[str], optional): IDs to store the items under instead of the ones derived from their content. Vector stores that support it keep these; the default implementation ignores them. Used by `import_training_data`.
+            embeddings (List[List[float]], optional): Precomputed embeddings, already reduced by `reduce_embeddings`. Vector stores that support it store these instead of embedding the items; the default implementation ignores them.
+            metadatas (List[dict], optional): Metadata to store with each item, readable with `get_training_data_metadata`. Only vector stores that override `get_training_data_metadata` keep it; the default implementation ignores it and the native batch methods of other stores raise a ValueError. Used by `sync_schema`.
+
+        Returns:
+            List[str]: The IDs of the training data that was added.
+        """
+        ids = []
+        for batch in self._iter_training_batches(documentation_list, **kwargs):
+            ids += [self.add_documentation(documentation) for documentation in batch]
+            self._log_training_progress("documentation entries", len(ids), len(documentation_list))
+
+        return ids
+
+    def _iter_training_batches(self, items: list, batch_size: int = None, **kwargs):
+        if batch_size is None:
+            batch_size = self.training_batch_size
+
+        for start in range(0, len(items), batch_size):
+            yield items[start:start + batch_size]
+
+    def _log_training_progress(self, item_type: str, done: int, total: int):
+        # Single adds that go through the batch methods don't log progress
+        if total > 1:
+            self.log(title="Training Progress", message=f"Added {done}/{total} {item_type}")
+
     @abstractmethod
     def get_training_data(self, **kwargs) -> pd.DataFrame:
         """
@@ -480,6 +1125,118 @@ class VannaBase(ABC):
         """
         pass
 
+    def iter_training_data(
+        self,
+        page_size: int = 1000,
+        offset: int = 0,
+        training_data_type: str = None,
+        search: str = None,
+        **kwargs,
+    ):
+        """
+        Example:
+        ```python
+        for page in vn.iter_training_data(page_size=500, training_data_type="sql"):
+            print(page)
+        ```
+
+        This method is used to page through the training data instead of loading all of it at once. Pages have the same columns as `get_training_data`.
+        By default it pages over `get_training_data`. Vector stores override it to fetch one page at a time from the backend.
+
+        Args:
+            page_size (int): The maximum number of rows per page.
+            offset (int): The number of rows to skip.
+            training_data_type (str, optional): Only return "sql", "ddl" or "documentation" training data.
+            search (str, optional): Only return training data containing this text.
+
+        Returns:
+            Iterator[pd.DataFrame]: The pages of training data.
+        """
+        df = self._filter_training_data(self.get_training_data(**kwargs), training_data_type, search)
+        for start in range(offset, len(df), page_size):
+            yield df.iloc[start:start + page_size]
+
+    def count_training_data(self, training_data_type: str = None, search: str = None, **kwargs) -> int:
+        """
+        Example:
+        ```python
+        vn.count_training_data(training_data_type="ddl")
+        ```
+
+        This method is used to count the training data, using the same filters as `iter_training_data`.
+
+        Args:
+            training_data_type (str, optional): Only count "sql", "ddl" or "documentation" training data.
+            search (str, optional): Only count training data containing this text.
+
+        Returns:
+            int: The number of training data items.
+        """
+        return len(self._filter_training_data(self.get_training_data(**kwargs), training_data_type, search))
+
+    def page_training_data(
+        self,
+        page_size: int = 1000,
+        offset: int = 0,
+        training_data_type: str = None,
+        search: str = None,
+        **kwargs,
+    ) -> Tuple[int, Iterator[pd.DataFrame]]:
+        """
+        Example:
+        ```python
+        total, pages = vn.page_training_data(page_size=50, offset=100)
+        ```
+
+        This method is used to count the training data and page through it together, using the same filters as `iter_training_data`.
+        Vector stores that override `count_training_data` or `iter_training_data` are queried through them; otherwise `get_training_data` is fetched once for both.
+
+        Args:
+            page_size (int): The maximum number of rows per page.
+            offset (int): The number of rows to skip.
+            training_data_type (str, optional): Only return "sql", "ddl" or "documentation" training data.
+            search (str, optional): Only return training data containing this text.
+
+        Returns:
+            Tuple[int, Iterator[pd.DataFrame]]: The number of training data items and the pages of training data.
+        """
+        counts_natively = type(self).count_training_data is not VannaBase.count_training_data
+        pages_natively = type(self).iter_training_data is not VannaBase.iter_training_data
+
+        df = None
+        if not (counts_natively and pages_natively):
+            df = self._filter_training_data(self.get_training_data(**kwargs), training_data_type, search)
+
+        if counts_natively:
+            total = self.count_training_data(training_data_type=training_data_type, search=search, **kwargs)
+        else:
+            total = len(df)
+
+        if pages_natively:
+            pages = self.iter_training_data(
+                page_size=page_size, offset=offset, training_data_type=training_data_type, search=search, **kwargs
+            )
+        else:
+            pages = (df.iloc[start:start + page_size] for start in range(offset, len(df), page_size))
+
+        return total, pages
+
+    @staticmethod
+    def _filter_training_data(df: pd.DataFrame, training_data_type: str = None, search: str = None) -> pd.DataFrame:
+        if df is None or len(df) == 0:
+            return pd.DataFrame()
+
+        if training_data_type is not None:
+            df = df[df["training_data_type"] == training_data_type]
+
+        if search is not None:
+            matches = pd.Series(False, index=df.index)
+            for column in df.columns.drop(["id", "training_data_type"], errors="ignore"):
+                matches |= df[column].fillna("").astype(str).str.contains(search, regex=False)
+            df = df[matches]
+
+        return df.reset_index(drop=True)
+
     @abstractmethod
     def remove_training_data(self, id: str, **kwargs) -> bool:
         """
@@ -498,6 +1255,178 @@ class VannaBase(ABC):
         """
         pass
 
+    @staticmethod
+    def _training_data_records(df: pd.DataFrame) -> List[dict]:
+        # Stores name the text column "content" or after the training data type
+        records = []
+        for row in df.to_dict("records"):
+            question = row.get("question") if isinstance(row.get("question"), str) else None
+            content = next((row[column] for column in ("content", "sql", "ddl", "documentation") if isinstance(row.get(column), str)), "")
+            records.append({
+                "id": row.get("id"),
+                "question": question,
+                "content": content,
+                "training_data_type": row.get("training_data_type"),
+                "vector": row.get("vector"),
+            })
+        return records
+
+    def get_training_data_vectors(self, ids: List[str]) -> Dict[str, List[float]]:
+        """
+        This method is used to read the stored vectors of training data, so that they can be moved to another vector store without embedding the training data again.
+        Vector stores that keep their vectors retrievable override it; by default no vectors are returned.
+
+        Args:
+            ids (List[str]): The IDs of the training data.
+
+        Returns:
+            Dict[str, List[float]]: The stored vector of each ID that was found.
+        """
+        return {}
+
+    def _keeps_training_data_metadata(self) -> bool:
+        # Stores keep the metadatas passed to the batch methods exactly when they can read it back
+        return type(self).get_training_data_metadata is not VannaBase.get_training_data_metadata
+
+    def get_training_data_metadata(self, training_data_type: str, key: str, **kwargs) -> Union[Dict[str, dict], None]:
+        """
+        This method is used to read the metadata stored with training data through the `metadatas` argument of the batch add methods, without fetching the training data itself.
+        Vector stores that keep metadata override it; by default it returns None. Keyword arguments, such as the `tenant` of a partitioned Qdrant store, scope the lookup like they scope `get_training_data`.
+
+        Args:
+            training_data_type (str): "sql", "ddl" or "documentation".
+            key (str): Only return items whose metadata has this key.
+
+        Returns:
+            Dict[str, dict]: The metadata of each matching item by ID, or None if the vector store doesn't keep metadata.
+        """
+        return None
+
+    def export_training_data(
+        self, page_size: int = 1000, offset: int = 0, include_vectors: bool = True
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Example:
+        ```python
+        for page in vn.export_training_data(page_size=500):
+            other_vn.import_training_data(page)
+        ```
+
+        This method is used to stream the training data out of the vector store in pages.
+
+        Args:
+            page_size (int): The maximum number of rows per page.
+            offset (int): The number of rows to skip.
+            include_vectors (bool): Whether to include the stored vectors, where the vector store can return them.
+
+        Returns:
+            Iterator[pd.DataFrame]: Pages with "id", "question", "content", "training_data_type" and "vector" columns. "vector" is None where no vector was returned.
+        """
+        for page in self.iter_training_data(page_size=page_size, offset=offset):
+            records = self._training_data_records(page)
+            vectors = self.get_training_data_vectors([record["id"] for record in records]) if include_vectors else {}
+            for record in records:
+                record["vector"] = vectors.get(record["id"])
+            yield pd.DataFrame(records, columns=["id", "question", "content", "training_data_type", "vector"])
+
+    def import_training_data(self, df: pd.DataFrame, reuse_vectors: bool = False, **kwargs) -> List[str]:
+        """
+        Example:
+        ```python
+        vn.import_training_data(page)
+        ```
+
+        This method is used to write a page produced by `export_training_data` with the batch `add_*_batch` methods. The items keep their IDs, so importing the same page twice doesn't duplicate it.
+        IDs and vectors are only kept by the vector stores whose batch methods take `ids` and `embeddings`: ChromaDB, Qdrant, FAISS, NumPy, PGVector, Milvus, Pinecone, Weaviate, OpenSearch and BigQuery.
+        Weaviate keeps the UUID part of each ID. The other vector stores add the items with the default batch methods, which assign new IDs and embed them again.
+
+        Args:
+            df (pd.DataFrame): The training data, with the columns returned by `export_training_data`.
+            reuse_vectors (bool): Whether to store the exported vectors instead of embedding the training data again. Only set this when both vector stores use the same embedding model and reduction; `migrate_training_data` checks that before setting it.
+
+        Returns:
+            List[str]: The IDs of the training data that was added.
+        """
+        ids = []
+        records = self._training_data_records(df)
+        for training_data_type in ("sql", "ddl", "documentation"):
+            group = [record for record in records if record["training_data_type"] == training_data_type]
+            if not group:
+                continue
+
+            batch_kwargs = {**kwargs, "ids": [record["id"] for record in group]}
+            vectors = [record["vector"] for record in group]
+            if reuse_vectors and all(vector is not None for vector in vectors):
+                batch_kwargs["embeddings"] = [list(vector) for vector in vectors]
+
+            if training_data_type == "sql":
+                ids += self.add_question_sql_batch(
+                    [{"question": record["question"], "sql": record["content"]} for record in group], **batch_kwargs
+                )
+            elif training_data_type == "ddl":
+                ids += self.add_ddl_batch([record["content"] for record in group], **batch_kwargs)
+            else:
+                ids += self.add_documentation_batch([record["content"] for record in group], **batch_kwargs)
+
+        return ids
+
+    def _embeddings_match(self, other: "VannaBase") -> bool:
+        probe = "SELECT COUNT(*) FROM customers -- How many customers are there?"
+        try:
+            vectors = [vn.reduce_embeddings(vn.generate_embeddings([probe])).reshape(-1) for vn in (self, other)]
+        except (TypeError, ValueError):
+            # A store that can't embed on its own can't be compared
+            return False
+        if vectors[0].shape != vectors[1].shape:
+            return False
+        norms = np.linalg.norm(vectors[0]) * np.linalg.norm(vectors[1])
+        return bool(norms > 0 and float(vectors[0] @ vectors[1]) / norms > 0.999)
+
+    def migrate_training_data(
+        self,
+        target: "VannaBase",
+        page_size: int = 1000,
+        checkpoint_path: str = None,
+        reuse_vectors: bool = None,
+    ) -> int:
+        """
+        Example:
+        ```python
+        vn_chroma.migrate_training_data(vn_qdrant, checkpoint_path="migration.json")
+        ```
+
+        This method is used to copy all the training data to another vector store, one page at a time. The items keep their IDs and are written with the target's batch upserts, so a page that is copied twice isn't duplicated.
+        With `checkpoint_path`, the number of items copied is saved after every page and an interrupted migration resumes from there when it's called again.
+
+        Args:
+            target (VannaBase): The vector store to copy the training data to.
+            page_size (int): The number of items read and written at a time.
+            checkpoint_path (str, optional): A JSON file to save progress to and resume from.
+            reuse_vectors (bool, optional): Whether to copy the stored vectors instead of embedding the training data again. By default the vectors are reused when both vector stores embed a probe string to the same vector.
+
+        Returns:
+            int: The number of items copied, including those copied before resuming.
+        """
+        offset = 0
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                offset = json.load(f)["offset"]
+
+        if reuse_vectors is None:
+            reuse_vectors = self._embeddings_match(target)
+
+        total = self.count_training_data()
+        for page in self.export_training_data(page_size=page_size, offset=offset, include_vectors=reuse_vectors):
+            target.import_training_data(page, reuse_vectors=reuse_vectors, batch_size=page_size)
+            offset += len(page)
+
+            if checkpoint_path is not None:
+                with atomic_write(checkpoint_path) as tmp_path, open(tmp_path, "w") as f:
+                    json.dump({"offset": offset, "total": total}, f)
+            self.log(title="Migration Progress", message=f"Copied {offset}/{total} training data items")
+
+        return offset
+
     # ----------------- Use Any Language Model API ----------------- #
 
     @abstractmethod
@@ -515,6 +1444,139 @@ class VannaBase(ABC):
     def str_to_approx_token_count(self, string: str) -> int:
         return len(string) / 4
 
+    @staticmethod
+    def _context_text(item) -> str:
+        if isinstance(item, dict):
+            return f"{item.get('question', '')}\n{item.get('sql', '')}"
+        return str(item)
+
+    def _remember_context_vectors(self, question: str, query: np.ndarray, items: list, vectors: np.ndarray) -> None:
+        """
+        Keeps the embedding of a question and the vectors of the context items a vector store retrieved for it, in
+        the same space, so `context_similarity="embedding"` compares them without embedding anything again.
+        Vector stores that have the vectors at hand when they search call it.
+        """
+        if getattr(self, "context_similarity", None) != "embedding":
+            return
+
+        with self._retrieval_cache_lock():
+            cache = self.__dict__.setdefault("_context_vectors", OrderedDict())
+            keys = [("question", question)] + [("item", self._context_text(item)) for item in items]
+            for key, vector in zip(keys, [query, *vectors]):
+                cache[key] = np.asarray(vector, dtype=np.float32).reshape(-1)
+                cache.move_to_end(key)
+            while len(cache) > _CONTEXT_VECTOR_CACHE_SIZE:
+                cache.popitem(last=False)
+
+    def _remembered_context_vectors(self, question: str, texts: List[str]) -> Union[np.ndarray, None]:
+        # The question's vector followed by the texts', or None unless every one of them was remembered
+        with self._retrieval_cache_lock():
+            cache = self.__dict__.get("_context_vectors", {})
+            keys = [("question", question)] + [("item", text) for text in texts]
+            if not all(key in cache for key in keys):
+                return None
+            vectors = [cache[key] for key in keys]
+        if len(set(vector.shape for vector in vectors)) != 1:
+            return None
+        return np.stack(vectors)
+
+    def _context_similarities(self, question: str, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the relevance of each text to the question and the pairwise similarity of the texts.
+        """
+        if self.context_similarity == "embedding":
+            vectors = self._remembered_context_vectors(question, texts)
+            if vectors is not None:
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors = vectors / np.where(norms == 0, 1, norms)
+                similarities = vectors[1:] @ vectors[1:].T
+                return vectors[1:] @ vectors[0], similarities
+
+        # Word-set Jaccard similarity; relevance follows the order the vector store returned the texts in.
+        # It's also used for context the vector store didn't hand back the vectors of
+        words = [set(re.findall(r"\w+", text.lower())) for text in texts]
+        similarities = np.eye(len(texts))
+        for i in range(len(texts)):
+            for j in range(i + 1, len(texts)):
+                union = len(words[i] | words[j])
+                similarities[i, j] = similarities[j, i] = len(words[i] & words[j]) / union if union else 1.0
+        return 1 - np.arange(len(texts)) / max(len(texts), 1), similarities
+
+    def _mmr_order(self, question: str, items: list) -> list:
+        if len(items) < 2:
+            return items
+
+        relevance, similarities = self._context_similarities(question, [self._context_text(item) for item in items])
+        selected, remaining = [], list(range(len(items)))
+        while remaining:
+            redundancy = similarities[np.ix_(remaining, selected)].max(axis=1) if selected else np.zeros(len(remaining))
+            scores = self.context_mmr_lambda * relevance[remaining] - (1 - self.context_mmr_lambda) * redundancy
+            best = remaining[int(np.argmax(scores))]
+            remaining.remove(best)
+            # Near-duplicates of something already selected add tokens without adding context
+            if selected and similarities[best, selected].max() >= self.context_duplicate_threshold:
+                continue
+            selected.append(best)
+
+        return [items[i] for i in selected]
+
+    def select_context(
+        self, question: str, question_sql_list: list, ddl_list: list, doc_list: list, **kwargs
+    ) -> Tuple[list, list, list]:
+        """
+        Example:
+        ```python
+        question_sql_list, ddl_list, doc_list = vn.select_context(question, question_sql_list, ddl_list, doc_list)
+        ```
+
+        Picks the retrieved context that goes into the prompt. Exact duplicates are always dropped. With
+        `context_selection="mmr"` each list is also reordered by maximal marginal relevance, near-duplicates
+        (similarity of at least `context_duplicate_threshold`) are dropped, and if `context_token_budget` is set,
+        items are taken from the three lists in turn until the budget is used up.
+
+        Args:
+            question (str): The question the context was retrieved for.
+            question_sql_list (list): The similar question-SQL pairs.
+            ddl_list (list): The related DDL statements.
+            doc_list (list): The related documentation.
+
+        Returns:
+            Tuple[list, list, list]: The selected question-SQL pairs, DDL statements and documentation.
+        """
+        lists = []
+        for items in (question_sql_list or [], ddl_list or [], doc_list or []):
+            seen, unique = set(), []
+            for item in items:
+                text = self._context_text(item)
+                if text not in seen:
+                    seen.add(text)
+                    unique.append(item)
+            lists.append(unique)
+
+        if self.context_selection != "mmr":
+            return tuple(lists)
+
+        retrieved = sum(len(items) for items in lists)
+        lists = [self._mmr_order(question, items) for items in lists]
+
+        if self.context_token_budget is not None:
+            # Taking one item from each list in turn spends the budget on the best items of every kind
+            budget, selected = self.context_token_budget, [[] for _ in lists]
+            for rank in range(max(len(items) for items in lists)):
+                for items, kept in zip(lists, selected):
+                    if rank < len(items):
+                        tokens = self.str_to_approx_token_count(self._context_text(items[rank]))
+                        if tokens <= budget:
+                            budget -= tokens
+                            kept.append(items[rank])
+            lists = selected
+
+        self.log(
+            title="Context Selection",
+            message=f"Kept {sum(len(items) for items in lists)} of {retrieved} retrieved items",
+        )
+        return tuple(lists)
+
     def add_ddl_to_prompt(
         self, initial_prompt: str, ddl_list: list[str], max_tokens: int = 14000
     ) -> str:
@@ -836,8 +1898,25 @@ class VannaBase(ABC):
 
             return df
 
+        def estimate_sql_cost_snowflake(sql: str) -> SQLCostEstimate:
+            df = run_sql_snowflake(f"EXPLAIN USING TABULAR {sql.rstrip().rstrip(';')}")
+            df.columns = [c.lower() for c in df.columns]
+
+            bytes_assigned = pd.to_numeric(df["bytesassigned"], errors="coerce").sum()
+            operations = df["operation"].astype(str).tolist()
+
+            return SQLCostEstimate(
+                dialect="Snowflake SQL",
+                estimated_rows=None,
+                estimated_cost=None,
+                estimated_bytes=int(bytes_assigned),
+                cartesian_join="CartesianJoin" in operations,
+                plan=df.to_markdown(),
+            )
+
         self.dialect = "Snowflake SQL"
         self.run_sql = run_sql_snowflake
+        self.estimate_sql_cost = estimate_sql_cost_snowflake
         self.run_sql_is_set = True
 
     def connect_to_sqlite(self, url: str, check_same_thread: bool = False,  **kwargs):
@@ -874,8 +1953,27 @@ class VannaBase(ABC):
         def run_sql_sqlite(sql: str):
             return pd.read_sql_query(sql, conn)
 
+        def estimate_sql_cost_sqlite(sql: str) -> SQLCostEstimate:
+            # SQLite doesn't estimate rows, but two full table scans under the same parent
+            # are a nested loop over both tables, i.e. a cartesian join
+            df = pd.read_sql_query(f"EXPLAIN QUERY PLAN {sql}", conn)
+            full_scans = df[
+                df["detail"].str.match(r"^SCAN ")
+                & ~df["detail"].str.contains("CONSTANT ROW")
+            ]
+
+            return SQLCostEstimate(
+                dialect="SQLite",
+                estimated_rows=None,
+                estimated_cost=None,
+                estimated_bytes=None,
+                cartesian_join=bool((full_scans.groupby("parent").size() > 1).any()),
+                plan="\n".join(df["detail"].tolist()),
+            )
+
         self.dialect = "SQLite"
         self.run_sql = run_sql_sqlite
+        self.estimate_sql_cost = estimate_sql_cost_sqlite
         self.run_sql_is_set = True
 
     def connect_to_postgres(
@@ -1000,9 +2098,27 @@ class VannaBase(ABC):
                         conn.rollback()
                         raise e
 
+        def estimate_sql_cost_postgres(sql: str) -> SQLCostEstimate:
+            df = run_sql_postgres(f"EXPLAIN (FORMAT JSON) {sql.rstrip().rstrip(';')}")
+            plan = df.iloc[0, 0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+
+            root = plan[0]["Plan"]
+
+            return SQLCostEstimate(
+                dialect="PostgreSQL",
+                estimated_rows=root.get("Plan Rows"),
+                estimated_cost=root.get("Total Cost"),
+                estimated_bytes=None,
+                cartesian_join=self._postgres_plan_has_cartesian_join(root),
+                plan=json.dumps(plan),
+            )
+
         self.dialect = "PostgreSQL"
         self.run_sql_is_set = True
         self.run_sql = run_sql_postgres
+        self.estimate_sql_cost = estimate_sql_cost_postgres
 
 
     def connect_to_mysql(
@@ -1090,8 +2206,27 @@ class VannaBase(ABC):
                     conn.rollback()
                     raise e
 
+        def estimate_sql_cost_mysql(sql: str) -> SQLCostEstimate:
+            df = run_sql_mysql(f"EXPLAIN FORMAT=JSON {sql.rstrip().rstrip(';')}")
+            plan = json.loads(df.iloc[0, 0])
+
+            query_cost = self._find_plan_values(plan, "query_cost")
+            rows_produced = [
+                float(rows) for rows in self._find_plan_values(plan, "rows_produced_per_join")
+            ]
+
+            return SQLCostEstimate(
+                dialect="MySQL",
+                estimated_rows=max(rows_produced) if len(rows_produced) > 0 else None,
+                estimated_cost=float(query_cost[0]) if len(query_cost) > 0 else None,
+                estimated_bytes=None,
+                cartesian_join=self._mysql_plan_has_cartesian_join(plan),
+                plan=json.dumps(plan),
+            )
+
         self.run_sql_is_set = True
         self.run_sql = run_sql_mysql
+        self.estimate_sql_cost = estimate_sql_cost_mysql
 
     def connect_to_clickhouse(
         self,
@@ -1347,9 +2482,23 @@ class VannaBase(ABC):
                 return df
             return None
 
+        def estimate_sql_cost_bigquery(sql: str) -> SQLCostEstimate:
+            job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+            job = conn.query(sql, job_config=job_config)
+
+            return SQLCostEstimate(
+                dialect="BigQuery SQL",
+                estimated_rows=None,
+                estimated_cost=None,
+                estimated_bytes=job.total_bytes_processed,
+                cartesian_join=False,
+                plan="",
+            )
+
         self.dialect = "BigQuery SQL"
         self.run_sql_is_set = True
         self.run_sql = run_sql_bigquery
+        self.estimate_sql_cost = estimate_sql_cost_bigquery
 
     def connect_to_duckdb(self, url: str, init_sql: str = None, **kwargs):
         """
@@ -1396,8 +2545,28 @@ class VannaBase(ABC):
         def run_sql_duckdb(sql: str):
             return conn.query(sql).to_df()
 
+        def estimate_sql_cost_duckdb(sql: str) -> SQLCostEstimate:
+            plan = "\n".join(
+                str(value) for _, value in conn.execute(f"EXPLAIN {sql}").fetchall()
+            )
+            # Cardinality estimates are printed as "~1,000 rows" (or "EC: 1000" in older versions)
+            rows = [
+                float(match.replace(",", ""))
+                for match in re.findall(r"(?:~|EC:\s*)([\d,]+)", plan)
+            ]
+
+            return SQLCostEstimate(
+                dialect="DuckDB SQL",
+                estimated_rows=max(rows) if len(rows) > 0 else None,
+                estimated_cost=None,
+                estimated_bytes=None,
+                cartesian_join="CROSS_PRODUCT" in plan,
+                plan=plan,
+            )
+
         self.dialect = "DuckDB SQL"
         self.run_sql = run_sql_duckdb
+        self.estimate_sql_cost = estimate_sql_cost_duckdb
         self.run_sql_is_set = True
 
     def connect_to_mssql(self, odbc_conn_str: str, **kwargs):
@@ -1680,6 +2849,146 @@ class VannaBase(ABC):
             "You need to connect to a database first by running vn.connect_to_snowflake(), vn.connect_to_postgres(), similar function, or manually set vn.run_sql"
         )
 
+    def estimate_sql_cost(self, sql: str, **kwargs) -> Union[SQLCostEstimate, None]:
+        """
+        Example:
+        ```python
+        vn.estimate_sql_cost("SELECT * FROM my_table")
+        ```
+
+        Estimate the cost of a SQL query without running it, using the EXPLAIN (or dry run) of the connected database.
+        This is set by the `vn.connect_to_...` functions for PostgreSQL, MySQL, DuckDB, SQLite, Snowflake and BigQuery. You can also manually set vn.estimate_sql_cost for other databases.
+
+        Args:
+            sql (str): The SQL query to estimate.
+
+        Returns:
+            SQLCostEstimate: The estimated rows, cost and bytes of the query, or None if the database doesn't support estimation.
+        """
+        return None
+
+    def check_sql_cost(self, sql: str) -> Union[SQLCostEstimate, None]:
+        """
+        Example:
+        ```python
+        vn.check_sql_cost("SELECT * FROM a CROSS JOIN b")
+        ```
+
+        Checks the estimated cost of a SQL query against the configured limits before it is run. This is a no-op unless `cost_guard` is set in the config.
+        With `cost_guard="warn"` the violations are logged, with `cost_guard="reject"` a SQLCostError is raised.
+        The limits are set with `cost_guard_max_rows`, `cost_guard_max_cost` and `cost_guard_max_bytes`. Cartesian joins are rejected unless `cost_guard_allow_cartesian` is set.
+
+        Args:
+            sql (str): The SQL query to check.
+
+        Returns:
+            SQLCostEstimate: The estimate that was checked, or None if the guard is disabled or the cost couldn't be estimated.
+        """
+        if self.cost_guard is None:
+            return None
+
+        try:
+            estimate = self.estimate_sql_cost(sql)
+        except Exception as e:
+            self.log(title="Cost Guard", message=f"Couldn't estimate the cost of the SQL query: {e}")
+            return None
+
+        if estimate is None:
+            return None
+
+        self.log(
+            title="Cost Estimate",
+            message=f"rows: {estimate.estimated_rows}, cost: {estimate.estimated_cost}, bytes: {estimate.estimated_bytes}, cartesian join: {estimate.cartesian_join}",
+        )
+
+        violations = []
+
+        if (
+            self.cost_guard_max_rows is not None
+            and estimate.estimated_rows is not None
+            and estimate.estimated_rows > self.cost_guard_max_rows
+        ):
+            violations.append(
+                f"estimated rows {estimate.estimated_rows:,.0f} exceed the limit of {self.cost_guard_max_rows:,}"
+            )
+
+        if (
+            self.cost_guard_max_cost is not None
+            and estimate.estimated_cost is not None
+            and estimate.estimated_cost > self.cost_guard_max_cost
+        ):
+            violations.append(
+                f"estimated cost {estimate.estimated_cost:,.2f} exceeds the limit of {self.cost_guard_max_cost:,}"
+            )
+
+        if (
+            self.cost_guard_max_bytes is not None
+            and estimate.estimated_bytes is not None
+            and estimate.estimated_bytes > self.cost_guard_max_bytes
+        ):
+            violations.append(
+                f"estimated bytes processed {estimate.estimated_bytes:,} exceed the limit of {self.cost_guard_max_bytes:,}"
+            )
+
+        if estimate.cartesian_join and not self.cost_guard_allow_cartesian:
+            violations.append("the query plan contains a cartesian join")
+
+        if len(violations) > 0:
+            message = "The SQL query was stopped by the cost guard: " + "; ".join(violations)
+
+            if self.cost_guard == "reject":
+                raise SQLCostError(message)
+
+            self.log(title="Cost Guard", message=message)
+
+        return estimate
+
+    def _find_plan_values(self, plan, key: str) -> list:
+        # Walk a nested EXPLAIN plan (dicts and lists) and collect every value stored under key
+        values = []
+
+        if isinstance(plan, dict):
+            for k, v in plan.items():
+                if k == key:
+                    values.append(v)
+                else:
+                    values += self._find_plan_values(v, key)
+        elif isinstance(plan, list):
+            for item in plan:
+                values += self._find_plan_values(item, key)
+
+        return values
+
+    def _postgres_plan_has_cartesian_join(self, node: dict) -> bool:
+        # A Nested Loop joins on a Join Filter or on an Index Cond looked up from the outer row;
+        # with neither, every outer row is paired with every inner row
+        children = node.get("Plans", [])
+
+        if (
+            node.get("Node Type") == "Nested Loop"
+            and "Join Filter" not in node
+            and len(self._find_plan_values(children, "Index Cond")) == 0
+        ):
+            return True
+
+        return any(self._postgres_plan_has_cartesian_join(child) for child in children)
+
+    def _mysql_plan_has_cartesian_join(self, plan: dict) -> bool:
+        # A table read through a Block Nested Loop join buffer without a ref key is matched against
+        # every buffered row of the tables before it
+        for table in self._find_plan_values(plan, "table"):
+            if not isinstance(table, dict):
+                continue
+
+            if "Block Nested Loop" in str(table.get("using_join_buffer", "")) and "ref" not in table:
+                return True
+
+            # Derived tables carry their own query block
+            if self._mysql_plan_has_cartesian_join(table):
+                return True
+
+        return False
+
     def ask(
         self,
         question: Union[str, None] = None,
@@ -1740,6 +3049,7 @@ class VannaBase(ABC):
                 return sql, None, None
 
         try:
+            self.check_sql_cost(sql)
             df = self.run_sql(sql)
 
             if print_results:
@@ -1840,13 +3150,24 @@ class VannaBase(ABC):
             return self.add_ddl(ddl)
 
         if plan:
+            ddl_list = []
+            documentation_list = []
+            question_sql_list = []
+
             for item in plan._plan:
                 if item.item_type == TrainingPlanItem.ITEM_TYPE_DDL:
-                    self.add_ddl(item.item_value)
+                    ddl_list.append(item.item_value)
                 elif item.item_type == TrainingPlanItem.ITEM_TYPE_IS:
-                    self.add_documentation(item.item_value)
+                    documentation_list.append(item.item_value)
                 elif item.item_type == TrainingPlanItem.ITEM_TYPE_SQL:
-                    self.add_question_sql(question=item.item_name, sql=item.item_value)
+                    question_sql_list.append({"question": item.item_name, "sql": item.item_value})
+
+            if len(ddl_list) > 0:
+                self.add_ddl_batch(ddl_list)
+            if len(documentation_list) > 0:
+                self.add_documentation_batch(documentation_list)
+            if len(question_sql_list) > 0:
+                self.add_question_sql_batch(question_sql_list)
 
     def _get_databases(self) -> List[str]:
         try:
@@ -1880,6 +3201,54 @@ class VannaBase(ABC):
         Returns:
             TrainingPlan: The training plan.
         """
+        plan = TrainingPlan([])
+
+        for chunk in self.iter_training_plan_generic(df):
+            plan._plan += chunk._plan
+
+        return plan
+
+    def iter_training_plan_generic(self, df, chunk_size: Union[int, None] = None):
+        """
+        **Example:**
+        ```python
+        df_information_schema = vn.run_sql("SELECT * FROM INFORMATION_SCHEMA.COLUMNS")
+
+        for plan in vn.iter_training_plan_generic(df_information_schema, chunk_size=500):
+            vn.train(plan=plan)
+        ```
+
+        Generates the same training plan items as [`vn.get_training_plan_generic()`][vanna.base.base.VannaBase.get_training_plan_generic], but yields them in chunks so that training can start before the whole plan exists.
+        The information schema is grouped by database, schema and table in a single pass, so the cost grows linearly with the number of rows.
+
+        Args:
+            df (pd.DataFrame): The dataframe to generate the training plan from.
+            chunk_size (int): The number of items in each yielded plan. Defaults to None, which yields a single plan with every item.
+
+        Yields:
+            TrainingPlan: A training plan with up to chunk_size items.
+        """
+        items = []
+
+        for (database, schema, table), doc in self._iter_table_documentation(df):
+            items.append(
+                TrainingPlanItem(
+                    item_type=TrainingPlanItem.ITEM_TYPE_IS,
+                    item_group=f"{database}.{schema}",
+                    item_name=table,
+                    item_value=doc,
+                )
+            )
+
+            if chunk_size is not None and len(items) >= chunk_size:
+                yield TrainingPlan(items)
+                items = []
+
+        if len(items) > 0 or chunk_size is None:
+            yield TrainingPlan(items)
+
+    @staticmethod
+    def _information_schema_columns(df) -> Tuple[str, str, str]:
         # For each of the following, we look at the df columns to see if there's a match:
         database_column = df.columns[
             df.columns.str.lower().str.contains("database")
@@ -1891,6 +3260,11 @@ class VannaBase(ABC):
         table_column = df.columns[
             df.columns.str.lower().str.contains("table_name")
         ].to_list()[0]
+        return database_column, schema_column, table_column
+
+    def _iter_table_documentation(self, df):
+        # Yields ((database, schema, table), documentation) for each table of an information schema dataframe
+        database_column, schema_column, table_column = self._information_schema_columns(df)
         columns = [database_column,
                     schema_column,
                     table_column]
@@ -1900,37 +3274,170 @@ class VannaBase(ABC):
         matches = df.columns.str.lower().str.contains("|".join(candidates), regex=True)
         columns += df.columns[matches].to_list()
 
-        plan = TrainingPlan([])
+        # Tables are ordered by the first appearance of their database, then of their schema within
+        # the database, then of the table within the schema. The sort is stable so the rows of each
+        # table keep their original order and index.
+        order = pd.DataFrame(
+            {
+                "database": df.groupby(database_column, sort=False).ngroup().to_numpy(),
+                "schema": df.groupby([database_column, schema_column], sort=False).ngroup().to_numpy(),
+                "table": df.groupby([database_column, schema_column, table_column], sort=False).ngroup().to_numpy(),
+            }
+        )
+        df = df.iloc[order.sort_values(["database", "schema", "table"], kind="stable").index]
 
-        for database in df[database_column].unique().tolist():
-            for schema in (
-                df.query(f'{database_column} == "{database}"')[schema_column]
-                .unique()
-                .tolist()
-            ):
-                for table in (
-                    df.query(
-                        f'{database_column} == "{database}" and {schema_column} == "{schema}"'
-                    )[table_column]
-                    .unique()
-                    .tolist()
-                ):
-                    df_columns_filtered_to_table = df.query(
-                        f'{database_column} == "{database}" and {schema_column} == "{schema}" and {table_column} == "{table}"'
-                    )
-                    doc = f"The following columns are in the {table} table in the {database} database:\n\n"
-                    doc += df_columns_filtered_to_table[columns].to_markdown()
+        for (database, schema, table), df_columns_filtered_to_table in df.groupby(
+            [database_column, schema_column, table_column], sort=False
+        ):
+            doc = f"The following columns are in the {table} table in the {database} database:\n\n"
+            doc += df_columns_filtered_to_table[columns].to_markdown()
+            yield (database, schema, table), doc
 
-                    plan._plan.append(
-                        TrainingPlanItem(
-                            item_type=TrainingPlanItem.ITEM_TYPE_IS,
-                            item_group=f"{database}.{schema}",
-                            item_name=table,
-                            item_value=doc,
-                        )
-                    )
+    def sync_schema(self, df: Union[pd.DataFrame, None] = None, dry_run: bool = False) -> SchemaSyncDiff:
+        """
+        **Example:**
+        ```python
+        diff = vn.sync_schema()
+        print(diff.added, diff.changed, diff.removed)
+        ```
 
-        return plan
+        Incrementally syncs the information schema documentation in the training data with the database. Each table is fingerprinted by hashing the documentation generated for its columns, data types and comments,
+        and only the tables whose fingerprint differs from the stored one are re-embedded. Tables that no longer exist are removed.
+        Only tables in the databases and schemas present in df are touched, so a partial information schema doesn't remove anything outside of it.
+
+        The table and fingerprint are stored in the metadata of each documentation item, so with vector stores that keep metadata a sync only reads that metadata, not the training data.
+        Other vector stores, and the first sync, find the schema documentation in `get_training_data()` instead, which fetches all of the training data, so with those vector stores every sync costs as much as reading the whole store.
+        Documentation trained with [`vn.get_training_plan_generic()`][vanna.base.base.VannaBase.get_training_plan_generic] before the first sync is replaced once.
+
+        The rows of each table are ordered by ordinal position (or column name) before fingerprinting, so the result doesn't depend on the order the database returns them in.
+        New documentation is added before the documentation it replaces is removed, so a failed sync never loses a table.
+
+        Args:
+            df (pd.DataFrame): The information schema columns to sync. Defaults to running SELECT * FROM INFORMATION_SCHEMA.COLUMNS.
+            dry_run (bool): Only report the diff without changing the training data.
+
+        Returns:
+            SchemaSyncDiff: The tables that were added, changed and removed, as database.schema.table strings, and the number of unchanged tables.
+        """
+        if df is None:
+            if self.run_sql_is_set is False:
+                raise ImproperlyConfigured("Please connect to a database first.")
+
+            df = self.run_sql("SELECT * FROM INFORMATION_SCHEMA.COLUMNS")
+
+        table_columns = list(self._information_schema_columns(df))
+        sort_columns = df.columns[df.columns.str.lower().str.contains("ordinal_position")].to_list()[:1]
+        if not sort_columns:
+            sort_columns = df.columns[df.columns.str.lower().str.contains("column_name")].to_list()[:1]
+        df = df.sort_values(table_columns + sort_columns, kind="stable")
+        df.index = df.groupby(table_columns, sort=False).cumcount().to_numpy()
+
+        desired = {
+            tuple(str(part) for part in key): documentation
+            for key, documentation in self._iter_table_documentation(df)
+        }
+        scope = set((database, schema) for database, schema, _ in desired)
+        existing, retag = self._schema_documentation_state(scope)
+
+        added, changed, removed = [], [], []
+        documentation_to_add = []
+        metadatas = []
+        ids_to_remove = []
+        unchanged = 0
+
+        for key, documentation in desired.items():
+            fingerprint = deterministic_uuid(documentation)
+            stored = existing.get(key, [])
+
+            if len(stored) == 1 and stored[0][1] == fingerprint:
+                unchanged += 1
+                if retag:
+                    # Re-added under the same ID to attach the metadata the next sync reads
+                    documentation_to_add.append(documentation)
+                    metadatas.append({"schema_table": json.dumps(list(key)), "schema_hash": fingerprint})
+                    ids_to_remove += [id for id, _ in stored]
+                continue
+
+            if len(stored) == 0:
+                added.append(".".join(key))
+            else:
+                changed.append(".".join(key))
+                ids_to_remove += [id for id, _ in stored]
+
+            documentation_to_add.append(documentation)
+            metadatas.append({"schema_table": json.dumps(list(key)), "schema_hash": fingerprint})
+
+        for key, stored in existing.items():
+            if key not in desired:
+                removed.append(".".join(key))
+                ids_to_remove += [id for id, _ in stored]
+
+        diff = SchemaSyncDiff(added=added, changed=changed, removed=removed, unchanged=unchanged)
+        self.log(
+            title="Schema Sync",
+            message=f"{len(added)} added, {len(changed)} changed, {len(removed)} removed, {unchanged} unchanged",
+        )
+
+        if dry_run:
+            return diff
+
+        added_ids = set()
+        if len(documentation_to_add) > 0:
+            if self._keeps_training_data_metadata():
+                added_ids = set(self.add_documentation_batch(documentation_to_add, metadatas=metadatas))
+            else:
+                added_ids = set(self.add_documentation_batch(documentation_to_add))
+
+        # Documentation that was re-added unchanged (e.g. to store its metadata) keeps its ID and isn't removed
+        for id in ids_to_remove:
+            if id not in added_ids:
+                self.remove_training_data(id)
+
+        return diff
+
+    def _schema_documentation_state(self, scope: set) -> Tuple[Dict[Tuple[str, str, str], List[Tuple[str, str]]], bool]:
+        # The (ID, fingerprint) of the stored documentation of each table in scope, and whether
+        # that documentation was found without metadata in a store that keeps it
+        state = {}
+        metadata = self.get_training_data_metadata("documentation", "schema_table")
+        if metadata:
+            for id, item in metadata.items():
+                key = tuple(json.loads(item["schema_table"]))
+                if key[:2] in scope:
+                    state.setdefault(key, []).append((id, item.get("schema_hash")))
+            return state, False
+
+        # Vector stores without metadata, or without any schema documentation tagged yet, are read in full
+        df_training_data = self.get_training_data()
+        # Not every store reports the documentation text as a "content" column
+        if df_training_data is not None and "content" in df_training_data.columns:
+            df_documentation = df_training_data[
+                df_training_data["training_data_type"] == "documentation"
+            ]
+            for id, content in zip(df_documentation["id"], df_documentation["content"]):
+                key = self._parse_schema_documentation(content)
+                if key is not None and key[:2] in scope:
+                    state.setdefault(key, []).append((id, deterministic_uuid(content)))
+        return state, metadata is not None and len(state) > 0
+
+    def _parse_schema_documentation(self, content: str) -> Union[Tuple[str, str, str], None]:
+        # Recovers (database, schema, table) from documentation generated by get_training_plan_generic
+        match = re.match(
+            r"The following columns are in the (.*) table in the (.*) database:\n\n", content
+        )
+        if match is None:
+            return None
+
+        lines = content[match.end():].split("\n")
+        if len(lines) < 3:
+            return None
+
+        # The first data row is "| index | database | schema | table | ..."
+        cells = [cell.strip() for cell in lines[2].strip().strip("|").split("|")]
+        if len(cells) < 3:
+            return None
+
+        return match.group(2), cells[2], match.group(1)
 
     def get_training_plan_snowflake(
         self,
@@ -1938,12 +3445,30 @@ class VannaBase(ABC):
         filter_schemas: Union[List[str], None] = None,
         include_information_schema: bool = False,
         use_historical_queries: bool = True,
+        max_workers: int = 8,
     ) -> TrainingPlan:
+        """
+        This method is used to generate a training plan by crawling the information schema of every Snowflake database and sampling the query history.
+
+        The per-database INFORMATION_SCHEMA queries and the LLM calls that generate questions for historical queries run concurrently on a pool of at most max_workers threads.
+
+        Args:
+            filter_databases (List[str]): Only include these databases.
+            filter_schemas (List[str]): Only include these schemas.
+            include_information_schema (bool): Whether to include the INFORMATION_SCHEMA schemas.
+            use_historical_queries (bool): Whether to train on a sample of the query history.
+            max_workers (int): The maximum number of concurrent queries and LLM calls. Defaults to 8.
+
+        Returns:
+            TrainingPlan: The training plan.
+        """
         plan = TrainingPlan([])
 
         if self.run_sql_is_set is False:
             raise ImproperlyConfigured("Please connect to a database first.")
 
+        queries = []
+
         if use_historical_queries:
             try:
                 print("Trying query history")
@@ -1979,88 +3504,113 @@ class VannaBase(ABC):
                 if len(df_history_filtered) > 10:
                     df_history_filtered = df_history_filtered.sample(10)
 
-                for query in df_history_filtered["QUERY_TEXT"].unique().tolist():
+                queries = df_history_filtered["QUERY_TEXT"].unique().tolist()
+
+            except Exception as e:
+                print(e)
+
+        databases = [
+            database
+            for database in self._get_databases()
+            if filter_databases is None or database in filter_databases
+        ]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Question generation and the catalog crawl share the pool, so the wall time is
+            # bounded by the slowest database or LLM call rather than the sum of all of them
+            question_futures = [
+                executor.submit(self.generate_question, query) for query in queries
+            ]
+            database_futures = [
+                executor.submit(
+                    self._get_training_plan_snowflake_database,
+                    database,
+                    filter_schemas,
+                    include_information_schema,
+                )
+                for database in databases
+            ]
+
+            for query, future in zip(queries, question_futures):
+                try:
                     plan._plan.append(
                         TrainingPlanItem(
                             item_type=TrainingPlanItem.ITEM_TYPE_SQL,
                             item_group="",
-                            item_name=self.generate_question(query),
+                            item_name=future.result(),
                             item_value=query,
                         )
                     )
+                except Exception as e:
+                    print(e)
 
-            except Exception as e:
-                print(e)
-
-        databases = self._get_databases()
+            for future in database_futures:
+                plan._plan += future.result()
 
-        for database in databases:
-            if filter_databases is not None and database not in filter_databases:
-                continue
+        return plan
 
-            try:
-                df_tables = self._get_information_schema_tables(database=database)
+    def _get_training_plan_snowflake_database(
+        self,
+        database: str,
+        filter_schemas: Union[List[str], None] = None,
+        include_information_schema: bool = False,
+    ) -> List[TrainingPlanItem]:
+        items = []
 
-                print(f"Trying INFORMATION_SCHEMA.COLUMNS for {database}")
-                df_columns = self.run_sql(
-                    f"SELECT * FROM {database}.INFORMATION_SCHEMA.COLUMNS"
-                )
+        try:
+            df_tables = self._get_information_schema_tables(database=database)
 
-                for schema in df_tables["TABLE_SCHEMA"].unique().tolist():
-                    if filter_schemas is not None and schema not in filter_schemas:
-                        continue
+            print(f"Trying INFORMATION_SCHEMA.COLUMNS for {database}")
+            df_columns = self.run_sql(
+                f"SELECT * FROM {database}.INFORMATION_SCHEMA.COLUMNS"
+            )
 
-                    if (
-                        not include_information_schema
-                        and schema == "INFORMATION_SCHEMA"
-                    ):
-                        continue
+            for schema in df_tables["TABLE_SCHEMA"].unique().tolist():
+                if filter_schemas is not None and schema not in filter_schemas:
+                    continue
 
-                    df_columns_filtered_to_schema = df_columns.query(
-                        f"TABLE_SCHEMA == '{schema}'"
-                    )
+                if (
+                    not include_information_schema
+                    and schema == "INFORMATION_SCHEMA"
+                ):
+                    continue
 
-                    try:
-                        tables = (
-                            df_columns_filtered_to_schema["TABLE_NAME"]
-                            .unique()
-                            .tolist()
-                        )
+                df_columns_filtered_to_schema = df_columns[
+                    df_columns["TABLE_SCHEMA"] == schema
+                ]
 
-                        for table in tables:
-                            df_columns_filtered_to_table = (
-                                df_columns_filtered_to_schema.query(
-                                    f"TABLE_NAME == '{table}'"
-                                )
-                            )
-                            doc = f"The following columns are in the {table} table in the {database} database:\n\n"
-                            doc += df_columns_filtered_to_table[
-                                [
-                                    "TABLE_CATALOG",
-                                    "TABLE_SCHEMA",
-                                    "TABLE_NAME",
-                                    "COLUMN_NAME",
-                                    "DATA_TYPE",
-                                    "COMMENT",
-                                ]
-                            ].to_markdown()
-
-                            plan._plan.append(
-                                TrainingPlanItem(
-                                    item_type=TrainingPlanItem.ITEM_TYPE_IS,
-                                    item_group=f"{database}.{schema}",
-                                    item_name=table,
-                                    item_value=doc,
-                                )
+                try:
+                    for table, df_columns_filtered_to_table in df_columns_filtered_to_schema.groupby(
+                        "TABLE_NAME", sort=False
+                    ):
+                        doc = f"The following columns are in the {table} table in the {database} database:\n\n"
+                        doc += df_columns_filtered_to_table[
+                            [
+                                "TABLE_CATALOG",
+                                "TABLE_SCHEMA",
+                                "TABLE_NAME",
+                                "COLUMN_NAME",
+                                "DATA_TYPE",
+                                "COMMENT",
+                            ]
+                        ].to_markdown()
+
+                        items.append(
+                            TrainingPlanItem(
+                                item_type=TrainingPlanItem.ITEM_TYPE_IS,
+                                item_group=f"{database}.{schema}",
+                                item_name=table,
+                                item_value=doc,
                             )
+                        )
 
-                    except Exception as e:
-                        print(e)
-                        pass
-            except Exception as e:
-                print(e)
+                except Exception as e:
+                    print(e)
+                    pass
+        except Exception as e:
+            print(e)
 
-        return plan
+        return items
 
     def get_plotly_figure(
         self, plotly_code: str, df: pd.DataFrame, dark_mode: bool = True
@@ -1,16 +1,14 @@
 import json
-from typing import List
+from typing import Dict, List
 
 import chromadb
 import pandas as pd
 from chromadb.config import Settings
-from chromadb.utils import embedding_functions
 
 from ..base import VannaBase
+from ..embeddings import get_embedding_model
 from ..utils import deterministic_uuid
 
-default_ef = embedding_functions.DefaultEmbeddingFunction()
-
 
 class ChromaDB_VectorStore(VannaBase):
     def __init__(self, config=None):
@@ -19,7 +17,9 @@ class ChromaDB_VectorStore(VannaBase):
             config = {}
 
         path = config.get("path", ".")
-        self.embedding_function = config.get("embedding_function", default_ef)
+        self.embedding_function = config.get("embedding_function")
+        if self.embedding_function is None:
+            self.embedding_function = get_embedding_model("chromadb_default")
         curr_client = config.get("client", "persistent")
         collection_metadata = config.get("collection_metadata", None)
         self.n_results_sql = config.get("n_results_sql", config.get("n_results", 10))
@@ -73,7 +73,7 @@ class ChromaDB_VectorStore(VannaBase):
         id = deterministic_uuid(question_sql_json) + "-sql"
         self.sql_collection.add(
             documents=question_sql_json,
-            embeddings=self.generate_embedding(question_sql_json),
+            embeddings=self._embed([question_sql_json]),
             ids=id,
         )
 
@@ -83,7 +83,7 @@ class ChromaDB_VectorStore(VannaBase):
         id = deterministic_uuid(ddl) + "-ddl"
         self.ddl_collection.add(
             documents=ddl,
-            embeddings=self.generate_embedding(ddl),
+            embeddings=self._embed([ddl]),
             ids=id,
         )
         return id
@@ -92,11 +92,90 @@ class ChromaDB_VectorStore(VannaBase):
         id = deterministic_uuid(documentation) + "-doc"
         self.documentation_collection.add(
             documents=documentation,
-            embeddings=self.generate_embedding(documentation),
+            embeddings=self._embed([documentation]),
             ids=id,
         )
         return id
 
+    def generate_embeddings(self, data: List[str], **kwargs) -> List[List[float]]:
+        return self.embedding_function(data)
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        if self.embedding_reducer is None:
+            return self.generate_embeddings(texts)
+        return self.reduce_embeddings(self.generate_embeddings(texts)).tolist()
+
+    def _query(self, collection, question: str, n_results: int):
+        # Without a reduction Chroma embeds the question itself; with one, the question has to be reduced
+        # the same way as the stored documents
+        if self.embedding_reducer is None:
+            return collection.query(query_texts=[question], n_results=n_results)
+        return collection.query(query_embeddings=self._embed([question]), n_results=n_results)
+
+    def _add_batch(
+        self, collection, documents: List[str], suffix: str, item_type: str, ids=None, embeddings=None, metadatas=None, **kwargs
+    ) -> List[str]:
+        if ids is None:
+            ids = [deterministic_uuid(doc) + suffix for doc in documents]
+
+        added = []
+        items = list(zip(ids, documents, embeddings or [None] * len(documents), metadatas or [None] * len(documents)))
+        for batch in self._iter_training_batches(items, **kwargs):
+            # Chroma rejects duplicate ids within one call. Upserting lets items that already exist pick up new metadata
+            batch_items = {id: (doc, embedding, metadata or None) for id, doc, embedding, metadata in batch}
+            batch_documents = [doc for doc, _, _ in batch_items.values()]
+            collection.upsert(
+                documents=batch_documents,
+                embeddings=self._embed(batch_documents) if embeddings is None else [embedding for _, embedding, _ in batch_items.values()],
+                metadatas=None if metadatas is None else [metadata for _, _, metadata in batch_items.values()],
+                ids=list(batch_items.keys()),
+            )
+            added += [id for id, _, _, _ in batch]
+            self._log_training_progress(item_type, len(added), len(documents))
+
+        return added
+
+    def add_question_sql_batch(self, question_sql_list: List[dict], **kwargs) -> List[str]:
+        documents = [
+            json.dumps(
+                {
+                    "question": item["question"],
+                    "sql": item["sql"],
+                },
+                ensure_ascii=False,
+            )
+            for item in question_sql_list
+        ]
+        return self._add_batch(self.sql_collection, documents, "-sql", "question-SQL pairs", **kwargs)
+
+    def add_ddl_batch(self, ddl_list: List[str], **kwargs) -> List[str]:
+        return self._add_batch(self.ddl_collection, ddl_list, "-ddl", "DDL statements", **kwargs)
+
+    def add_documentation_batch(self, documentation_list: List[str], **kwargs) -> List[str]:
+        return self._add_batch(
+            self.documentation_collection, documentation_list, "-doc", "documentation entries", **kwargs
+        )
+
+    def get_training_data_metadata(self, training_data_type: str, key: str, **kwargs) -> Dict[str, dict]:
+        collection = dict(self._training_data_collections())[training_data_type]
+        # Chroma's $ne also matches metadata without the key, so only the metadata is fetched and filtered here
+        result = collection.get(include=["metadatas"])
+        return {
+            id: dict(metadata)
+            for id, metadata in zip(result["ids"], result["metadatas"])
+            if metadata is not None and key in metadata
+        }
+
+    def get_training_data_vectors(self, ids: List[str]) -> Dict[str, List[float]]:
+        collections = {"-sql": self.sql_collection, "-ddl": self.ddl_collection, "-doc": self.documentation_collection}
+        vectors = {}
+        for suffix, collection in collections.items():
+            collection_ids = [id for id in ids if id.endswith(suffix)]
+            if collection_ids:
+                result = collection.get(ids=collection_ids, include=["embeddings"])
+                vectors.update({id: list(map(float, embedding)) for id, embedding in zip(result["ids"], result["embeddings"])})
+        return vectors
+
     def get_training_data(self, **kwargs) -> pd.DataFrame:
         sql_data = self.sql_collection.get()
 
@@ -162,6 +241,88 @@ class ChromaDB_VectorStore(VannaBase):
 
         return df
 
+    def _training_data_collections(self, training_data_type: str = None) -> list:
+        collections = [
+            ("sql", self.sql_collection),
+            ("ddl", self.ddl_collection),
+            ("documentation", self.documentation_collection),
+        ]
+        return [(name, collection) for name, collection in collections if training_data_type in (None, name)]
+
+    @staticmethod
+    def _count_collection(collection, search: str = None) -> int:
+        if search is None:
+            return collection.count()
+
+        # Only the ids are fetched to count the matching documents
+        return len(collection.get(where_document={"$contains": search}, include=[])["ids"])
+
+    @staticmethod
+    def _training_data_page(training_data_type: str, ids: list, documents: list) -> pd.DataFrame:
+        if training_data_type == "sql":
+            documents = [json.loads(doc) for doc in documents]
+            questions = [doc["question"] for doc in documents]
+            contents = [doc["sql"] for doc in documents]
+        else:
+            questions = [None for doc in documents]
+            contents = documents
+
+        return pd.DataFrame(
+            {
+                "id": ids,
+                "question": questions,
+                "content": contents,
+                "training_data_type": training_data_type,
+            }
+        )
+
+    def count_training_data(self, training_data_type: str = None, search: str = None, **kwargs) -> int:
+        return sum(
+            self._count_collection(collection, search)
+            for _, collection in self._training_data_collections(training_data_type)
+        )
+
+    def iter_training_data(
+        self,
+        page_size: int = 1000,
+        offset: int = 0,
+        training_data_type: str = None,
+        search: str = None,
+        **kwargs,
+    ):
+        where_document = {"$contains": search} if search is not None else None
+        pages, buffered = [], 0
+
+        for name, collection in self._training_data_collections(training_data_type):
+            size = self._count_collection(collection, search)
+            if offset >= size:
+                offset -= size
+                continue
+
+            while offset < size:
+                # Pages continue across collections, so only the rows still missing from this page are fetched
+                results = collection.get(
+                    limit=page_size - buffered,
+                    offset=offset,
+                    where_document=where_document,
+                    include=["documents"],
+                )
+                if len(results["ids"]) == 0:
+                    break
+
+                offset += len(results["ids"])
+                buffered += len(results["ids"])
+                pages.append(self._training_data_page(name, results["ids"], results["documents"]))
+
+                if buffered == page_size:
+                    yield pd.concat(pages, ignore_index=True)
+                    pages, buffered = [], 0
+
+            offset = 0
+
+        if pages:
+            yield pd.concat(pages, ignore_index=True)
+
     def remove_training_data(self, id: str, **kwargs) -> bool:
         if id.endswith("-sql"):
             self.sql_collection.delete(ids=id)
@@ -234,24 +395,15 @@ class ChromaDB_VectorStore(VannaBase):
 
     def get_similar_question_sql(self, question: str, **kwargs) -> list:
         return ChromaDB_VectorStore._extract_documents(
-            self.sql_collection.query(
-                query_texts=[question],
-                n_results=self.n_results_sql,
-            )
+            self._query(self.sql_collection, question, self.n_results_sql)
         )
 
     def get_related_ddl(self, question: str, **kwargs) -> list:
         return ChromaDB_VectorStore._extract_documents(
-            self.ddl_collection.query(
-                query_texts=[question],
-                n_results=self.n_results_ddl,
-            )
+            self._query(self.ddl_collection, question, self.n_results_ddl)
         )
 
     def get_related_documentation(self, question: str, **kwargs) -> list:
         return ChromaDB_VectorStore._extract_documents(
-            self.documentation_collection.query(
-                query_texts=[question],
-                n_results=self.n_results_documentation,
-            )
+            self._query(self.documentation_collection, question, self.n_results_documentation)
         )
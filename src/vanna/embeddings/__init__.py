@@ -0,0 +1,159 @@
+import json
+import os
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..exceptions import DependencyError
+from .reduction import EmbeddingReducer, reduction_overlap_report
+
+
+def _load_fastembed(model_name: str, **options):
+    from fastembed import TextEmbedding
+
+    return TextEmbedding(model_name=model_name, **options)
+
+
+def _load_sentence_transformers(model_name: str, **options):
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name, **options)
+
+
+def _load_chromadb_default(model_name: str, **options):
+    from chromadb.utils import embedding_functions
+
+    return embedding_functions.DefaultEmbeddingFunction(**options)
+
+
+def _load_huggingface(model_name: str, **options):
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=model_name, **options)
+
+
+def _load_milvus_default(model_name: str, **options):
+    from pymilvus import model
+
+    return model.DefaultEmbeddingFunction(**options)
+
+
+def _load_vertexai(model_name: str, **options):
+    from vertexai.language_models import TextEmbeddingModel
+
+    return TextEmbeddingModel.from_pretrained(model_name, **options)
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+
+        # Peak resident size; kilobytes on Linux, bytes on macOS
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+
+
+def _parameter_bytes(model) -> Optional[int]:
+    parameters = getattr(model, "parameters", None)
+    if not callable(parameters):
+        return None
+    try:
+        return sum(p.numel() * p.element_size() for p in parameters())
+    except Exception:
+        return None
+
+
+class EmbeddingModelRegistry:
+    """
+    Loads each embedding model once per process, on first use, and shares it between vector stores.
+
+    Models are keyed by (backend, model name, options). Call `preload` before forking worker processes
+    (e.g. from a gunicorn `on_starting` hook or with `--preload`) so the workers share the loaded weights
+    copy-on-write instead of each loading their own.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable] = {
+            "fastembed": _load_fastembed,
+            "sentence_transformers": _load_sentence_transformers,
+            "chromadb_default": _load_chromadb_default,
+            "huggingface": _load_huggingface,
+            "milvus_default": _load_milvus_default,
+            "vertexai": _load_vertexai,
+        }
+        self._models: Dict[Tuple[str, str, str], Any] = {}
+        self._memory: Dict[Tuple[str, str, str], int] = {}
+        self._key_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register_loader(self, backend: str, loader: Callable) -> None:
+        """
+        Registers a function `loader(model_name, **options)` that loads models for a backend.
+        """
+        with self._lock:
+            self._loaders[backend] = loader
+
+    @staticmethod
+    def _key(backend: str, model_name: str, options: dict) -> Tuple[str, str, str]:
+        return backend, model_name, json.dumps(options, sort_keys=True, default=str)
+
+    def get(self, backend: str, model_name: str = None, **options):
+        """
+        Returns the model for (backend, model_name, options), loading it if this process hasn't yet.
+        """
+        key = self._key(backend, model_name, options)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if backend not in self._loaders:
+                raise DependencyError(f"No embedding model loader is registered for backend {backend}")
+            loader = self._loaders[backend]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Loading holds only this model's lock, so other models can load in parallel
+        with key_lock:
+            model = self._models.get(key)
+            if model is None:
+                rss_before = _rss_bytes()
+                model = loader(model_name, **options)
+                memory = _parameter_bytes(model)
+                self._memory[key] = memory if memory is not None else max(_rss_bytes() - rss_before, 0)
+                self._models[key] = model
+
+        return model
+
+    def preload(self, models: List[Tuple]) -> None:
+        """
+        Loads models ahead of time, e.g. `[("fastembed", "BAAI/bge-small-en-v1.5"), ("sentence_transformers", "all-MiniLM-L6-v2", {"device": "cpu"})]`.
+        """
+        for spec in models:
+            backend, model_name, options = (tuple(spec) + ({},))[:3]
+            self.get(backend, model_name, **options)
+
+    def loaded(self) -> List[Tuple[str, str, str]]:
+        return list(self._models.keys())
+
+    def memory_usage(self) -> Dict[Tuple[str, str, str], int]:
+        """
+        Returns the approximate memory used by each loaded model in bytes. It's the size of the weights for
+        torch models and the growth of the process's resident memory while loading for other models.
+        """
+        return dict(self._memory)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+            self._memory.clear()
+            self._key_locks.clear()
+
+
+embedding_models = EmbeddingModelRegistry()
+
+
+def get_embedding_model(backend: str, model_name: str = None, **options):
+    return embedding_models.get(backend, model_name, **options)
@@ -0,0 +1,116 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..exceptions import ImproperlyConfigured
+from ..utils import atomic_write
+
+
+class EmbeddingReducer:
+    """
+    Reduces embeddings to `dim` dimensions, either by keeping their first `dim` dimensions ("truncate", for
+    Matryoshka-trained models such as OpenAI text-embedding-3 or nomic-embed-text) or with a PCA projection
+    fitted on a sample of embeddings ("pca"). Reduced vectors are rescaled to unit length.
+
+    The projection isn't centered: the top singular vectors of the raw embeddings best preserve their inner
+    products, and with them the cosine ranking the full embeddings produce.
+    """
+
+    def __init__(self, method: str, dim: int, components: Optional[np.ndarray] = None):
+        if method not in ("truncate", "pca"):
+            raise ImproperlyConfigured(f"embedding_reduction must be one of 'truncate' or 'pca', got {method}")
+        if not isinstance(dim, int) or dim <= 0:
+            raise ImproperlyConfigured(f"embedding_reduction_dim must be a positive integer, got {dim}")
+
+        self.method = method
+        self.dim = dim
+        self.components = components
+
+    @property
+    def fitted(self) -> bool:
+        return self.method == "truncate" or self.components is not None
+
+    def fit(self, vectors) -> "EmbeddingReducer":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.method == "truncate":
+            return self
+
+        if self.dim > min(vectors.shape):
+            raise ValueError(
+                f"Fitting PCA to {self.dim} dimensions needs at least {self.dim} embeddings of at least {self.dim} dimensions, "
+                f"got {vectors.shape[0]} of {vectors.shape[1]}"
+            )
+
+        _, _, components = np.linalg.svd(vectors, full_matrices=False)
+        self.components = np.ascontiguousarray(components[:self.dim], dtype=np.float32)
+        return self
+
+    def transform(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors.reshape(len(vectors), -1)
+
+        if self.method == "truncate":
+            if vectors.shape[1] < self.dim:
+                raise ValueError(f"Can't truncate {vectors.shape[1]}-dimensional embeddings to {self.dim} dimensions")
+            reduced = vectors[:, :self.dim]
+        else:
+            if not self.fitted:
+                raise ImproperlyConfigured(
+                    "The PCA embedding reduction hasn't been fitted yet. Call fit_embedding_reduction() with a sample of "
+                    "your training data before adding or searching training data."
+                )
+            reduced = vectors @ self.components.T
+
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        return np.ascontiguousarray(reduced / np.where(norms == 0, 1, norms), dtype=np.float32)
+
+    def save(self, path: str) -> None:
+        with atomic_write(path) as tmp_path, open(tmp_path, "wb") as f:
+            np.savez(f, method=self.method, dim=self.dim, components=self.components)
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingReducer":
+        with np.load(path) as data:
+            return cls(str(data["method"]), int(data["dim"]), data["components"])
+
+
+def reduction_overlap_report(
+    vectors, queries, dims: List[int], k: int = 10, methods: List[str] = ("truncate", "pca")
+) -> pd.DataFrame:
+    """
+    Compares cosine top-k retrieval over reduced embeddings with retrieval over the full embeddings.
+
+    Args:
+        vectors: The embeddings being searched.
+        queries: The query embeddings.
+        dims (List[int]): The target dimensions to measure.
+        k (int): The number of results to compare.
+        methods (List[str]): The reduction methods to measure.
+
+    Returns:
+        pd.DataFrame: One row per method and dimension with the mean fraction of the full-dimension top k that
+        the reduced search also returns, and the size relative to the full embeddings.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    k = min(k, len(vectors))
+
+    def top_k(corpus, query_vectors):
+        corpus = corpus / np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+        query_vectors = query_vectors / np.maximum(np.linalg.norm(query_vectors, axis=1, keepdims=True), 1e-12)
+        scores = query_vectors @ corpus.T
+        return [set(row.tolist()) for row in np.argpartition(-scores, k - 1, axis=1)[:, :k]]
+
+    truth = top_k(vectors, queries)
+    rows = [[None, vectors.shape[1], 1.0, 1.0]]
+    for method in methods:
+        for dim in dims:
+            if dim > vectors.shape[1] or (method == "pca" and dim > len(vectors)):
+                continue
+            reducer = EmbeddingReducer(method, dim).fit(vectors)
+            found = top_k(reducer.transform(vectors), reducer.transform(queries))
+            overlap = float(np.mean([len(expected & result) / k for expected, result in zip(truth, found)]))
+            rows.append([method, dim, overlap, dim / vectors.shape[1]])
+
+    return pd.DataFrame(rows, columns=["method", "dim", "overlap_at_k", "relative_size"])
@@ -34,6 +34,12 @@ class ExecutionError(Exception):
     pass
 
 
+class SQLCostError(Exception):
+    """Raise when the estimated cost of a SQL query exceeds the configured limits"""
+
+    pass
+
+
 class ValidationError(Exception):
     """Raise for validations"""
 
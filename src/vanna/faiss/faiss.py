@@ -1,22 +1,131 @@
-import os 
+import os
 import json
+import math
+import time
 import uuid
-from typing import List, Dict, Any
+import atexit
+import base64
+import sqlite3
+import weakref
+import threading
+import contextlib
+from collections.abc import MutableMapping
+from typing import Any, Dict, List, Optional, Tuple
 
 import faiss
 import numpy as np
 import pandas as pd
 
 from ..base import VannaBase
+from ..embeddings import get_embedding_model
 from ..exceptions import DependencyError
+from ..utils import atomic_write, deterministic_uuid, file_lock, file_version, read_journal
+
+# Persistent stores still open in this process, flushed on exit without being kept alive by the exit handler
+_persistent_stores = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_persistent_stores() -> None:
+    for store in list(_persistent_stores):
+        store.shutdown()
+
+class _SQLiteMetadata(MutableMapping):
+    """
+    The metadata of one collection keyed by faiss id, stored in a SQLite table instead of being parsed
+    into every process on startup.
+    """
+
+    def __init__(self, conn, lock, collection: str):
+        self.conn = conn
+        self.lock = lock
+        self.collection = collection
+        # The count, and the data_version of the database it was read at
+        self._count = None
+
+    def __getitem__(self, faiss_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data FROM training_data WHERE collection = ? AND faiss_id = ?", (self.collection, int(faiss_id))
+            ).fetchone()
+        if row is None:
+            raise KeyError(faiss_id)
+        return json.loads(row[0])
+
+    def __setitem__(self, faiss_id, entry):
+        self.update({faiss_id: entry})
+
+    def __delitem__(self, faiss_id):
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM training_data WHERE collection = ? AND faiss_id = ?", (self.collection, int(faiss_id))
+            )
+        self._count = None
+        if cursor.rowcount == 0:
+            raise KeyError(faiss_id)
+
+    def __contains__(self, faiss_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM training_data WHERE collection = ? AND faiss_id = ?", (self.collection, int(faiss_id))
+            ).fetchone() is not None
+
+    def __iter__(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT faiss_id FROM training_data WHERE collection = ? ORDER BY rowid", (self.collection,)
+            ).fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self):
+        # Cached because HNSW searches use it on every query. data_version changes whenever another
+        # connection (e.g. another process) commits, which invalidates the cached count
+        with self.lock:
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._count is None or self._count[0] != data_version:
+                count = self.conn.execute(
+                    "SELECT COUNT(*) FROM training_data WHERE collection = ?", (self.collection,)
+                ).fetchone()[0]
+                self._count = (data_version, count)
+            return self._count[1]
+
+    def values(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT data FROM training_data WHERE collection = ? ORDER BY rowid", (self.collection,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def with_metadata(self, key: str) -> Dict[str, dict]:
+        # Reads only the metadata of the entries, by training data id
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT json_extract(data, '$.id'), json_extract(data, '$.metadata') FROM training_data "
+                "WHERE collection = ? AND json_extract(data, ?) IS NOT NULL",
+                (self.collection, f'$.metadata."{key}"'),
+            ).fetchall()
+        return {id: json.loads(metadata) for id, metadata in rows}
+
+    def update(self, entries):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO training_data (collection, faiss_id, data) VALUES (?, ?, ?)",
+                [(self.collection, int(faiss_id), json.dumps(entry)) for faiss_id, entry in dict(entries).items()],
+            )
+        self._count = None
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM training_data WHERE collection = ?", (self.collection,))
+        self._count = None
 
 class FAISS(VannaBase):
     def __init__(self, config=None):
         if config is None:
             config = {}
-        
+
         VannaBase.__init__(self, config=config)
-        
+
         try:
             import faiss
         except ImportError:
@@ -30,147 +139,732 @@ class FAISS(VannaBase):
             raise DependencyError(
                 "SentenceTransformer is not installed. Please install it with 'pip install sentence-transformers'."
             )
-        
+
         self.path = config.get("path", ".")
-        self.embedding_dim = config.get('embedding_dim', 384)
+        # With an embedding reduction the index holds the reduced vectors
+        self.embedding_dim = self.embedding_reduction_dim if self.embedding_reduction is not None else config.get('embedding_dim', 384)
         self.n_results_sql = config.get('n_results_sql', config.get("n_results", 10))
         self.n_results_ddl = config.get('n_results_ddl', config.get("n_results", 10))
         self.n_results_documentation = config.get('n_results_documentation', config.get("n_results", 10))
         self.curr_client = config.get("client", "persistent")
 
+        # Index type: "flat" (exact), "hnsw", "ivf_flat" or "ivf_pq"; metric: "l2", "ip" or "cosine"
+        self.index_type = config.get("index_type", "flat")
+        self.metric = config.get("metric", "l2")
+        if self.index_type not in ("flat", "hnsw", "ivf_flat", "ivf_pq"):
+            raise ValueError(f"Unsupported index_type was set in config: {self.index_type}")
+        if self.metric not in ("l2", "ip", "cosine"):
+            raise ValueError(f"Unsupported metric was set in config: {self.metric}")
+        self.hnsw_m = config.get("hnsw_m", 32)
+        self.ef_construction = config.get("ef_construction", 40)
+        self.ef_search = config.get("ef_search", 64)
+        self.nlist = config.get("nlist", None)
+        self.nprobe = config.get("nprobe", 16)
+        self.pq_m = config.get("pq_m", 16)
+        self.pq_nbits = config.get("pq_nbits", 8)
+        # IVF indexes need training, so they start as a flat index until this many vectors exist
+        self.min_train_size = config.get("min_train_size", 10000)
+        # HNSW can't delete in place, so it's rebuilt once this fraction of its vectors is stale
+        self.tombstone_ratio = config.get("tombstone_ratio", 0.2)
+
+        # Write-behind persistence: changes go to an append-only journal and full snapshots are written
+        # after `flush_every` journaled items, `flush_interval` seconds, or an explicit flush(). Processes sharing
+        # a path share the journal: each one applies the changes the others journaled before it writes, so
+        # searches see them after the next write or flush
+        self.flush_every = config.get("flush_every", 1000)
+        self.flush_interval = config.get("flush_interval", 5.0)
+        self.journal_fsync = config.get("journal_fsync", False)
+        self._lock = threading.RLock()
+        self._flush_timer = None
+        self._pending = 0
+        self._dirty = set()
+        # How far into each journal this process has applied, and the version of each snapshot it last read or wrote
+        self._journal_offsets = {}
+        self._snapshot_versions = {}
+
+        # Persistent indexes are memory-mapped read-only so worker processes share pages through the OS cache;
+        # an index is read into memory the first time this process writes to it
+        self.mmap = config.get("mmap", True)
+        self._mmapped = set()
+
+        self.embedding_model_name = config.get('embedding_model', 'all-MiniLM-L6-v2')
+
+        # Metadata is keyed by the int64 id the vector is stored under in the index
+        if self.curr_client == 'in-memory':
+            self.sql_metadata: Dict[int, Dict[str, Any]] = {}
+            self.ddl_metadata: Dict[int, Dict[str, str]] = {}
+            self.doc_metadata: Dict[int, Dict[str, str]] = {}
+        else:
+            self._metadata_conn = sqlite3.connect(os.path.join(self.path, "metadata.sqlite"), check_same_thread=False)
+            self._metadata_conn.execute("PRAGMA journal_mode=WAL")
+            self._metadata_conn.execute(
+                "CREATE TABLE IF NOT EXISTS training_data ("
+                "collection TEXT NOT NULL, faiss_id INTEGER NOT NULL, data TEXT NOT NULL, "
+                "PRIMARY KEY (collection, faiss_id))"
+            )
+            self.sql_metadata = self._load_or_create_metadata('sql')
+            self.ddl_metadata = self._load_or_create_metadata('ddl')
+            self.doc_metadata = self._load_or_create_metadata('doc')
+
         if self.curr_client == 'persistent':
-            self.sql_index = self._load_or_create_index('sql_index.faiss')
-            self.ddl_index = self._load_or_create_index('ddl_index.faiss')
-            self.doc_index = self._load_or_create_index('doc_index.faiss')
+            # Another process may be writing a snapshot and truncating its journal at the same time
+            with self._file_lock():
+                self.sql_index = self._load_or_create_index('sql', self.sql_metadata)
+                self.ddl_index = self._load_or_create_index('ddl', self.ddl_metadata)
+                self.doc_index = self._load_or_create_index('doc', self.doc_metadata)
+
+                for prefix in ('sql', 'ddl', 'doc'):
+                    self._snapshot_versions[prefix] = file_version(os.path.join(self.path, f"{prefix}_index.faiss"))
+                    replayed = self._replay_journal(prefix)
+                    if replayed > 0:
+                        self.log(title="FAISS Journal", message=f"Replayed {replayed} journaled changes to the {prefix} index")
+                        self._dirty.add(prefix)
         elif self.curr_client == 'in-memory':
-            self.sql_index = faiss.IndexFlatL2(self.embedding_dim)
-            self.ddl_index = faiss.IndexFlatL2(self.embedding_dim)
-            self.doc_index = faiss.IndexFlatL2(self.embedding_dim)
+            self.sql_index = self._create_index()
+            self.ddl_index = self._create_index()
+            self.doc_index = self._create_index()
         elif isinstance(self.curr_client, list) and len(self.curr_client) == 3 and all(isinstance(idx, faiss.Index) for idx in self.curr_client):
-            self.sql_index = self.curr_client[0]
-            self.ddl_index = self.curr_client[1]
-            self.doc_index = self.curr_client[2]
+            self.sql_index = self._ensure_id_map(self.curr_client[0], self.sql_metadata)
+            self.ddl_index = self._ensure_id_map(self.curr_client[1], self.ddl_metadata)
+            self.doc_index = self._ensure_id_map(self.curr_client[2], self.doc_metadata)
         else:
             raise ValueError(f"Unsupported storage type was set in config: {self.curr_client}")
 
-        self.sql_metadata: List[Dict[str, Any]] = self._load_or_create_metadata('sql_metadata.json')
-        self.ddl_metadata: List[Dict[str, str]] = self._load_or_create_metadata('ddl_metadata.json')
-        self.doc_metadata: List[Dict[str, str]] = self._load_or_create_metadata('doc_metadata.json')
+        # Switch existing indexes over to the configured index type and search parameters
+        with self._file_lock():
+            for prefix in ('sql', 'ddl', 'doc'):
+                self._catch_up(prefix)
+                self._maintain_index(prefix)
 
-        model_name = config.get('embedding_model', 'all-MiniLM-L6-v2')
-        self.embedding_model = SentenceTransformer(model_name)
+        if self.curr_client == 'persistent':
+            self.flush()
+            _persistent_stores.add(self)
+
+    @property
+    def embedding_model(self):
+        # Loaded on first use and shared with every other store using the same model in this process
+        return get_embedding_model("sentence_transformers", self.embedding_model_name)
+
+    @staticmethod
+    def _faiss_id(entry_id: str) -> int:
+        # Stable, non-negative int64 derived from the uuid part of the training data id
+        return uuid.UUID(entry_id[:36]).int & ((1 << 63) - 1)
+
+    @staticmethod
+    def _embedding_text(metadata: Dict[str, str]) -> str:
+        if "sql" in metadata:
+            return metadata["question"] + " " + metadata["sql"]
+        if "ddl" in metadata:
+            return metadata["ddl"]
+        return metadata["documentation"]
+
+    @property
+    def _faiss_metric(self):
+        return faiss.METRIC_L2 if self.metric == "l2" else faiss.METRIC_INNER_PRODUCT
+
+    def _prepare(self, vectors):
+        vectors = np.array(vectors, dtype=np.float32).reshape(-1, self.embedding_dim)
+        if self.metric == "cosine":
+            # Cosine similarity is inner product over unit vectors
+            faiss.normalize_L2(vectors)
+        return vectors
+
+    @staticmethod
+    def _index_kind(index) -> str:
+        index = faiss.downcast_index(index)
+        if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            index = faiss.downcast_index(index.index)
+        if isinstance(index, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(index, faiss.IndexIVFPQ):
+            return "ivf_pq"
+        if isinstance(index, faiss.IndexIVF):
+            return "ivf_flat"
+        return "flat"
+
+    def _create_index(self):
+        if self.index_type == "hnsw":
+            index = faiss.index_factory(self.embedding_dim, f"IDMap2,HNSW{self.hnsw_m}", self._faiss_metric)
+            faiss.downcast_index(index.index).hnsw.efConstruction = self.ef_construction
+        else:
+            # IVF indexes use a flat index until there are enough vectors to train on
+            index = faiss.IndexIDMap2(faiss.IndexFlat(self.embedding_dim, self._faiss_metric))
+        self._configure_search(index)
+        return index
+
+    def _build_index(self, vectors, ids):
+        if self.index_type in ("ivf_flat", "ivf_pq") and len(ids) >= self.min_train_size:
+            nlist = self.nlist or self._auto_nlist(len(ids))
+            if self.index_type == "ivf_flat":
+                description = f"IVF{nlist},Flat"
+            else:
+                description = f"IVF{nlist},PQ{self.pq_m}x{self.pq_nbits}"
+            # IVF indexes store ids natively; the hashtable direct map keeps remove_ids and reconstruct working
+            index = faiss.index_factory(self.embedding_dim, description, self._faiss_metric)
+            index.train(vectors)
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)
+            self._configure_search(index)
+        else:
+            index = self._create_index()
+        if len(ids) > 0:
+            index.add_with_ids(vectors, ids)
+        return index
+
+    @staticmethod
+    def _auto_nlist(n: int) -> int:
+        # ~4 * sqrt(n) lists, keeping at least 39 training points per centroid
+        return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+    def _configure_search(self, index) -> None:
+        kind = self._index_kind(index)
+        if kind == "hnsw":
+            faiss.ParameterSpace().set_index_parameter(index, "efSearch", self.ef_search)
+        elif kind in ("ivf_flat", "ivf_pq"):
+            faiss.ParameterSpace().set_index_parameter(index, "nprobe", self.nprobe)
+
+    def _reconstruct(self, index, ids):
+        if len(ids) == 0:
+            return np.zeros((0, self.embedding_dim), dtype=np.float32)
+        index = faiss.downcast_index(index)
+        if isinstance(index, faiss.IndexIVF) and index.direct_map.type == faiss.DirectMap.NoMap:
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return np.vstack([index.reconstruct(int(i)) for i in ids])
 
-    def _load_or_create_index(self, filename):
-        filepath = os.path.join(self.path, filename)
+    def _needs_rebuild(self, index, metadata) -> bool:
+        kind = self._index_kind(index)
+        if index.metric_type != self._faiss_metric:
+            return True
+        if kind != self.index_type:
+            staging = self.index_type in ("ivf_flat", "ivf_pq") and kind == "flat"
+            return not staging or len(metadata) >= self.min_train_size
+        if kind in ("ivf_flat", "ivf_pq") and self.nlist is None:
+            # Retrain with more lists once the corpus has grown well past what the index was trained on
+            return self._auto_nlist(len(metadata)) >= 4 * faiss.extract_index_ivf(index).nlist
+        return index.ntotal - len(metadata) > self.tombstone_ratio * max(index.ntotal, 1)
+
+    def _maintain_index(self, prefix: str) -> None:
+        """
+        Rebuilds the index from its own vectors when it doesn't match the configured index type or metric,
+        when an IVF index has collected enough vectors to be trained, or when an HNSW index has too many
+        stale vectors.
+        """
+        index = getattr(self, f"{prefix}_index")
+        metadata = getattr(self, f"{prefix}_metadata")
+        if self._needs_rebuild(index, metadata):
+            ids = np.array(list(metadata.keys()), dtype=np.int64)
+            index = self._build_index(self._prepare(self._reconstruct(index, ids)), ids)
+            self._set_index(prefix, index)
+            self._dirty.add(prefix)
+        else:
+            self._configure_search(index)
+
+    def _ensure_id_map(self, index, metadata):
+        """
+        Migrates a positional index (as written by earlier versions) to an ID-mapped index.
+
+        Vectors are copied over without re-embedding when the index and metadata line up. If they don't
+        (earlier versions could leave a stale index behind after a delete), the vectors are re-embedded
+        from the metadata once.
+        """
+        if isinstance(faiss.downcast_index(index), (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexIVF)):
+            return index
+
+        ids = np.array(list(metadata.keys()), dtype=np.int64)
+        if len(metadata) == 0:
+            vectors = np.zeros((0, self.embedding_dim), dtype=np.float32)
+        elif index.ntotal == len(metadata):
+            vectors = index.reconstruct_n(0, index.ntotal)
+        else:
+            self.log(
+                title="FAISS Migration",
+                message=f"Index has {index.ntotal} vectors but metadata has {len(metadata)} entries, re-embedding the metadata",
+            )
+            vectors = self.reduce_embeddings(self.generate_embeddings([self._embedding_text(m) for m in metadata.values()]))
+        return self._build_index(self._prepare(vectors), ids)
+
+    def _read_index(self, prefix):
+        filepath = os.path.join(self.path, f"{prefix}_index.faiss")
+        if self.mmap:
+            # IVF indexes (fourcc "Iw..") map their inverted lists; flat and HNSW indexes map their flat codes
+            with open(filepath, 'rb') as f:
+                is_ivf = f.read(2) == b"Iw"
+            mmap_flag = faiss.IO_FLAG_MMAP if is_ivf else faiss.IO_FLAG_MMAP_IFC
+            return faiss.read_index(filepath, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+        return faiss.read_index(filepath)
+
+    def _load_or_create_index(self, prefix, metadata):
+        filepath = os.path.join(self.path, f"{prefix}_index.faiss")
         if os.path.exists(filepath):
-            return faiss.read_index(filepath)
-        return faiss.IndexFlatL2(self.embedding_dim)
+            index = self._read_index(prefix)
+            migrated = self._ensure_id_map(index, metadata)
+            if migrated is not index:
+                self._save_index(migrated, f"{prefix}_index.faiss")
+            elif self.mmap:
+                self._mmapped.add(prefix)
+            return migrated
+        return self._create_index()
 
-    def _load_or_create_metadata(self, filename):
-        filepath = os.path.join(self.path, filename)
+    def _load_or_create_metadata(self, prefix):
+        metadata = _SQLiteMetadata(self._metadata_conn, self._lock, prefix)
+        filepath = os.path.join(self.path, f"{prefix}_metadata.json")
         if os.path.exists(filepath):
+            # Earlier versions kept a JSON list per collection; import it once
             with open(filepath, 'r') as f:
-                return json.load(f)
-        return []
+                metadata.update({self._faiss_id(entry["id"]): entry for entry in json.load(f)})
+            os.remove(filepath)
+        return metadata
+
+    def _set_index(self, prefix, index) -> None:
+        self._mmapped.discard(prefix)
+        setattr(self, f"{prefix}_index", index)
+
+    def _writable_index(self, prefix):
+        # A memory-mapped index is read-only, so it's read into memory before the first write
+        if prefix in self._mmapped:
+            index = faiss.read_index(os.path.join(self.path, f"{prefix}_index.faiss"))
+            self._configure_search(index)
+            self._set_index(prefix, index)
+        return getattr(self, f"{prefix}_index")
 
     def _save_index(self, index, filename):
         if self.curr_client == 'persistent':
-            filepath = os.path.join(self.path, filename)
-            faiss.write_index(index, filepath)
+            # Write to a temporary file and rename it over the old one so readers never see a torn index
+            with atomic_write(os.path.join(self.path, filename)) as tmp_path:
+                faiss.write_index(index, tmp_path)
 
-    def _save_metadata(self, metadata, filename):
-        if self.curr_client == 'persistent':
-            filepath = os.path.join(self.path, filename)
-            with open(filepath, 'w') as f:
-                json.dump(metadata, f)
+    def _file_lock(self):
+        # Serializes writes and snapshots with the other processes using the same path
+        if self.curr_client != 'persistent':
+            return contextlib.nullcontext()
+        return file_lock(os.path.join(self.path, "faiss.lock"))
+
+    def _journal(self, prefix: str, records: List[Dict[str, Any]]) -> None:
+        # Called with the file lock held, once the journal has been caught up with
+        if self.curr_client != 'persistent':
+            return
+
+        with open(os.path.join(self.path, f"{prefix}_journal.jsonl"), 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            if self.journal_fsync:
+                os.fsync(f.fileno())
+            self._journal_offsets[prefix] = f.tell()
+
+        self._dirty.add(prefix)
+        self._pending += len(records)
+
+    def _schedule_flush(self) -> None:
+        if self.curr_client != 'persistent':
+            return
+
+        with self._lock:
+            if self.flush_every is not None and self._pending >= self.flush_every:
+                self.flush()
+            elif self.flush_interval is not None and self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _replay_journal(self, prefix: str) -> int:
+        """
+        Applies the journaled changes after the point this process last read the journal to: on startup, the
+        changes the last snapshot doesn't hold, e.g. after a crash, and later the changes other processes
+        journaled. Replaying is idempotent, so a snapshot that was only partly written is also recovered.
+        """
+        records, self._journal_offsets[prefix] = read_journal(
+            os.path.join(self.path, f"{prefix}_journal.jsonl"), self._journal_offsets.get(prefix, 0)
+        )
+        for record in records:
+            if record["op"] == "add":
+                vector = np.frombuffer(base64.b64decode(record["vector"]), dtype=np.float32)
+                self._apply_upsert(prefix, [record["entry"]], vector.reshape(1, -1))
+            elif record["op"] == "remove":
+                self._apply_remove(prefix, record["id"], replay=True)
+        return len(records)
+
+    def _catch_up(self, prefix: str) -> None:
+        # Called with the file lock held, before this process writes to the index or its journal
+        if self.curr_client != 'persistent':
+            return
+
+        version = file_version(os.path.join(self.path, f"{prefix}_index.faiss"))
+        if version is not None and version != self._snapshot_versions.get(prefix):
+            # Another process wrote a snapshot, which holds everything journaled before it, and truncated the
+            # journal, so the snapshot replaces this process's index
+            index = self._read_index(prefix)
+            self._configure_search(index)
+            self._set_index(prefix, index)
+            if self.mmap:
+                self._mmapped.add(prefix)
+            self._journal_offsets[prefix] = 0
+            self._snapshot_versions[prefix] = version
+        self._replay_journal(prefix)
+
+    def _write_snapshot(self, prefix: str) -> None:
+        # Called with the file lock held. The journal is only dropped once the snapshot is in place
+        self._save_index(getattr(self, f"{prefix}_index"), f"{prefix}_index.faiss")
+        open(os.path.join(self.path, f"{prefix}_journal.jsonl"), 'w').close()
+        self._journal_offsets[prefix] = 0
+        self._snapshot_versions[prefix] = file_version(os.path.join(self.path, f"{prefix}_index.faiss"))
+
+    def flush(self) -> None:
+        """
+        Writes snapshots of every index with journaled changes and truncates their journals.
+        """
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+            if self._dirty and self.curr_client == 'persistent':
+                with self._file_lock():
+                    for prefix in sorted(self._dirty):
+                        # Metadata is committed to SQLite as it changes, so only the index needs a snapshot.
+                        # Other processes' snapshots and journaled changes are applied first, so it holds them too
+                        self._catch_up(prefix)
+                        self._write_snapshot(prefix)
+
+            self._dirty.clear()
+            self._pending = 0
+
+    def shutdown(self) -> None:
+        self.flush()
+
+    def _retrieval_state(self) -> Tuple[dict, Dict[str, np.ndarray]]:
+        # Persistent indexes are loaded from their own files and their metadata is in SQLite
+        if self.curr_client != 'in-memory':
+            return {}, {}
+
+        with self._lock:
+            state = {"metadata": {prefix: list(getattr(self, f"{prefix}_metadata").values()) for prefix in ('sql', 'ddl', 'doc')}}
+            arrays = {prefix: faiss.serialize_index(getattr(self, f"{prefix}_index")) for prefix in ('sql', 'ddl', 'doc')}
+        return state, arrays
+
+    def _restore_retrieval_state(self, state: dict, arrays: Dict[str, np.ndarray]) -> None:
+        if self.curr_client != 'in-memory' or not state:
+            return
+
+        with self._lock:
+            for prefix in ('sql', 'ddl', 'doc'):
+                # Deserializing copies the index into memory, but it's read straight from the snapshot's memory map
+                index = faiss.deserialize_index(arrays[prefix])
+                self._configure_search(index)
+                self._set_index(prefix, index)
+                setattr(self, f"{prefix}_metadata", {self._faiss_id(entry["id"]): entry for entry in state["metadata"][prefix]})
+
+    def _training_data_fingerprint(self) -> Optional[str]:
+        # An in-memory store's training data comes from the snapshot itself
+        if self.curr_client == 'in-memory':
+            return None
+        if self.curr_client != 'persistent' or self.retrieval_snapshot_fingerprint != "count":
+            return super()._training_data_fingerprint()
+
+        # Every change by any process replaces an index snapshot or appends to its journal. Pending changes
+        # are written first, so writing them later doesn't make the retrieval snapshot look stale
+        self.flush()
+        with self._file_lock():
+            versions = [
+                [file_version(os.path.join(self.path, filename)) for filename in (f"{prefix}_index.faiss", f"{prefix}_journal.jsonl")]
+                for prefix in ('sql', 'ddl', 'doc')
+            ]
+        return deterministic_uuid(json.dumps(versions))
 
     def generate_embedding(self, data: str, **kwargs) -> List[float]:
         embedding = self.embedding_model.encode(data)
-        assert embedding.shape[0] == self.embedding_dim, \
+        assert self.embedding_reduction is not None or embedding.shape[0] == self.embedding_dim, \
             f"Embedding dimension mismatch: expected {self.embedding_dim}, got {embedding.shape[0]}"
         return embedding.tolist()
 
-    def _add_to_index(self, index, metadata_list, text, extra_metadata=None) -> str:
-        embedding = self.generate_embedding(text)
-        index.add(np.array([embedding], dtype=np.float32))
-        entry_id = str(uuid.uuid4())
-        metadata_list.append({"id": entry_id, **(extra_metadata or {})})
+    def generate_embeddings(self, data: List[str], **kwargs) -> List[List[float]]:
+        embeddings = self.embedding_model.encode(data)
+        return embeddings.tolist()
+
+    def _apply_upsert(self, prefix, entries, vectors):
+        index = self._writable_index(prefix)
+        metadata = getattr(self, f"{prefix}_metadata")
+        # Re-adding an existing id replaces its vector in place; nothing else is re-embedded.
+        # HNSW can't remove, so the old vector stays behind as a stale entry until the next rebuild
+        ids = np.array([self._faiss_id(entry["id"]) for entry in entries], dtype=np.int64)
+        if self._index_kind(index) != "hnsw":
+            index.remove_ids(ids)
+        index.add_with_ids(vectors, ids)
+        metadata.update(dict(zip(ids.tolist(), entries)))
+
+    def _contains(self, prefix, id: str) -> bool:
+        entry = getattr(self, f"{prefix}_metadata").get(self._faiss_id(id))
+        return entry is not None and entry['id'] == id
+
+    def _apply_remove(self, prefix, id: str, replay: bool = False) -> bool:
+        metadata = getattr(self, f"{prefix}_metadata")
+        faiss_id = self._faiss_id(id)
+        contains = self._contains(prefix, id)
+        # The metadata is committed before the index snapshot, so a replayed remove may find the
+        # metadata already gone while the last snapshot still holds the vector
+        if contains or replay:
+            index = self._writable_index(prefix)
+            if self._index_kind(index) != "hnsw":
+                index.remove_ids(np.array([faiss_id], dtype=np.int64))
+        if contains:
+            del metadata[faiss_id]
+        return contains
+
+    def _upsert(self, prefix, entries, embeddings, reduce=True):
+        vectors = self._prepare(self.reduce_embeddings(embeddings) if reduce else embeddings)
+        with self._lock:
+            with self._file_lock():
+                self._catch_up(prefix)
+                # Journal first so a crash before the next snapshot can always be replayed
+                self._journal(prefix, [
+                    {"op": "add", "entry": entry, "vector": base64.b64encode(vector.tobytes()).decode("ascii")}
+                    for entry, vector in zip(entries, vectors)
+                ])
+                self._apply_upsert(prefix, entries, vectors)
+                self._maintain_index(prefix)
+            self._schedule_flush()
+
+    def _add_batch_to_index(
+        self, prefix, texts, extra_metadata_list, item_type, suffix, ids=None, embeddings=None, metadatas=None, **kwargs
+    ) -> List[str]:
+        if ids is None:
+            ids = [deterministic_uuid(text) + suffix for text in texts]
+        if metadatas is not None:
+            extra_metadata_list = [
+                {**extra_metadata, "metadata": metadata} if metadata else extra_metadata
+                for extra_metadata, metadata in zip(extra_metadata_list, metadatas)
+            ]
+
+        entry_ids = []
+        items = list(zip(ids, texts, extra_metadata_list, embeddings or [None] * len(texts)))
+        for batch in self._iter_training_batches(items, **kwargs):
+            # Identical items in one batch collapse to a single entry
+            entries = {entry_id: extra_metadata for entry_id, _, extra_metadata, _ in batch}
+            if embeddings is None:
+                batch_embeddings = self.generate_embeddings([text for _, text, _, _ in batch])
+            else:
+                batch_embeddings = [embedding for _, _, _, embedding in batch]
+            batch_embeddings = {entry_id: embedding for (entry_id, _, _, _), embedding in zip(batch, batch_embeddings)}
+            self._upsert(
+                prefix,
+                [{"id": entry_id, **extra_metadata} for entry_id, extra_metadata in entries.items()],
+                list(batch_embeddings.values()),
+                reduce=embeddings is None,
+            )
+            entry_ids += [entry_id for entry_id, _, _, _ in batch]
+            self._log_training_progress(item_type, len(entry_ids), len(items))
+
+        return entry_ids
+
+    def add_question_sql_batch(self, question_sql_list: List[Dict[str, str]], **kwargs) -> List[str]:
+        return self._add_batch_to_index(
+            'sql',
+            [item["question"] + " " + item["sql"] for item in question_sql_list],
+            [{"question": item["question"], "sql": item["sql"]} for item in question_sql_list],
+            "question-SQL pairs", "-sql", **kwargs
+        )
+
+    def add_ddl_batch(self, ddl_list: List[str], **kwargs) -> List[str]:
+        return self._add_batch_to_index(
+            'ddl', ddl_list, [{"ddl": ddl} for ddl in ddl_list], "DDL statements", "-ddl", **kwargs
+        )
+
+    def add_documentation_batch(self, documentation_list: List[str], **kwargs) -> List[str]:
+        return self._add_batch_to_index(
+            'doc', documentation_list, [{"documentation": documentation} for documentation in documentation_list],
+            "documentation entries", "-doc", **kwargs
+        )
+
+    def _add_to_index(self, prefix, text, extra_metadata, suffix) -> str:
+        entry_id = deterministic_uuid(text) + suffix
+        self._upsert(prefix, [{"id": entry_id, **extra_metadata}], [self.generate_embedding(text)])
         return entry_id
-    
+
     def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
-        entry_id = self._add_to_index(self.sql_index, self.sql_metadata, question + " " + sql, {"question": question, "sql": sql})
-        self._save_index(self.sql_index, 'sql_index.faiss')
-        self._save_metadata(self.sql_metadata, 'sql_metadata.json')
-        return entry_id
+        return self._add_to_index('sql', question + " " + sql, {"question": question, "sql": sql}, "-sql")
 
     def add_ddl(self, ddl: str, **kwargs) -> str:
-        entry_id = self._add_to_index(self.ddl_index, self.ddl_metadata, ddl, {"ddl": ddl})
-        self._save_index(self.ddl_index, 'ddl_index.faiss')
-        self._save_metadata(self.ddl_metadata, 'ddl_metadata.json')
-        return entry_id
+        return self._add_to_index('ddl', ddl, {"ddl": ddl}, "-ddl")
 
     def add_documentation(self, documentation: str, **kwargs) -> str:
-        entry_id = self._add_to_index(self.doc_index, self.doc_metadata, documentation, {"documentation": documentation})
-        self._save_index(self.doc_index, 'doc_index.faiss')
-        self._save_metadata(self.doc_metadata, 'doc_metadata.json')
-        return entry_id
+        return self._add_to_index('doc', documentation, {"documentation": documentation}, "-doc")
+
+    def _search_ids(self, index, metadata, queries, n_results) -> List[List[int]]:
+        # Over-fetch by the number of stale vectors so they can't crowd out live results
+        D, I = index.search(queries, k=n_results + max(index.ntotal - len(metadata), 0))
+        results = []
+        for row in I.tolist():
+            ids = []
+            for i in row:
+                if i != -1 and i not in ids and i in metadata:
+                    ids.append(i)
+                if len(ids) == n_results:
+                    break
+            results.append(ids)
+        return results
 
-    def _get_similar(self, index, metadata_list, text, n_results) -> list:
-        embedding = self.generate_embedding(text)
-        D, I = index.search(np.array([embedding], dtype=np.float32), k=n_results)
-        return [] if len(I[0]) == 0 or I[0][0] == -1 else [metadata_list[i] for i in I[0]]
+    def _get_similar(self, prefix, text, n_results, item) -> list:
+        query = self._prepare(self.reduce_embeddings([self.generate_embedding(text)]))
+        vectors = None
+        # Writers replace the index and its metadata under the lock
+        with self._lock:
+            index = getattr(self, f"{prefix}_index")
+            metadata = getattr(self, f"{prefix}_metadata")
+            ids = self._search_ids(index, metadata, query, n_results)[0]
+            items = [item(metadata[i]) for i in ids]
+            if ids and self.context_similarity == "embedding":
+                try:
+                    vectors = np.stack([index.reconstruct(i) for i in ids])
+                except RuntimeError:
+                    # Not every index type can reconstruct its vectors
+                    pass
+        # Context selection compares these instead of embedding the context again
+        if vectors is not None:
+            self._remember_context_vectors(text, query[0], items, vectors)
+        return items
 
     def get_similar_question_sql(self, question: str, **kwargs) -> list:
-        return self._get_similar(self.sql_index, self.sql_metadata, question, self.n_results_sql)
-    
+        return self._get_similar('sql', question, self.n_results_sql, lambda metadata: metadata)
+
     def get_related_ddl(self, question: str, **kwargs) -> list:
-        return [metadata["ddl"] for metadata in self._get_similar(self.ddl_index, self.ddl_metadata, question, self.n_results_ddl)]
+        return self._get_similar('ddl', question, self.n_results_ddl, lambda metadata: metadata["ddl"])
 
     def get_related_documentation(self, question: str, **kwargs) -> list:
-        return [metadata["documentation"] for metadata in self._get_similar(self.doc_index, self.doc_metadata, question, self.n_results_documentation)]
+        return self._get_similar('doc', question, self.n_results_documentation, lambda metadata: metadata["documentation"])
+
+    def index_recall_report(self, collection_name: str = "sql", queries: List[str] = None, k: int = 10, n_queries: int = 100, params: Dict[str, List[int]] = None) -> pd.DataFrame:
+        """
+        Measures recall and latency of the configured index against exact (flat) search on the current corpus.
+
+        Args:
+            collection_name (str): sql or ddl or documentation
+            queries (List[str]): The questions to search with. Defaults to a sample of the stored training data.
+            k (int): The number of results to compare.
+            n_queries (int): The number of training data items to sample when no queries are given.
+            params (Dict[str, List[int]]): The search parameters to sweep, e.g. {"efSearch": [16, 64]} or {"nprobe": [1, 16]}.
+
+        Returns:
+            pd.DataFrame: One row per search parameter value with the recall@k and mean latency per query in milliseconds.
+        """
+        prefixes = {"sql": "sql", "ddl": "ddl", "documentation": "doc"}
+        if collection_name not in prefixes:
+            raise ValueError(f"Unknown collection: {collection_name}")
+
+        index = getattr(self, f"{prefixes[collection_name]}_index")
+        metadata = getattr(self, f"{prefixes[collection_name]}_metadata")
+        columns = ["index_type", "parameter", "value", "recall_at_k", "latency_ms"]
+        if len(metadata) == 0:
+            return pd.DataFrame(columns=columns)
+
+        ids = np.array(list(metadata.keys()), dtype=np.int64)
+        kind = self._index_kind(index)
+        if kind == "ivf_pq":
+            # PQ only keeps approximate vectors, so the ground truth is computed from fresh embeddings
+            vectors = self._prepare(self.reduce_embeddings(self.generate_embeddings([self._embedding_text(m) for m in metadata.values()])))
+        else:
+            vectors = self._reconstruct(index, ids)
+        exact = faiss.IndexFlat(self.embedding_dim, self._faiss_metric)
+        exact.add(vectors)
+
+        if queries is None:
+            entries = list(metadata.values())
+            sample = np.random.default_rng(0).choice(len(entries), min(n_queries, len(entries)), replace=False)
+            queries = [entries[i].get("question") or self._embedding_text(entries[i]) for i in sample]
+        query_vectors = self._prepare(self.reduce_embeddings(self.generate_embeddings(queries)))
+        k = min(k, len(ids))
+
+        start = time.perf_counter()
+        _, truth = exact.search(query_vectors, k)
+        rows = [["flat (exact)", None, None, 1.0, (time.perf_counter() - start) * 1000 / len(queries)]]
+        truth = [set(ids[row].tolist()) for row in truth]
+
+        if params is None:
+            if kind == "hnsw":
+                params = {"efSearch": [16, 32, 64, 128, 256]}
+            elif kind in ("ivf_flat", "ivf_pq"):
+                nlist = faiss.extract_index_ivf(index).nlist
+                params = {"nprobe": sorted({p for p in (1, 4, 16, 64) if p < nlist} | {nlist})}
+            else:
+                params = {}
+
+        settings = [(name, value) for name, values in params.items() for value in values] or [(None, None)]
+        try:
+            for name, value in settings:
+                if name is not None:
+                    faiss.ParameterSpace().set_index_parameter(index, name, value)
+                start = time.perf_counter()
+                found = self._search_ids(index, metadata, query_vectors, k)
+                latency = (time.perf_counter() - start) * 1000 / len(queries)
+                recall = float(np.mean([len(truth_ids & set(row)) / k for truth_ids, row in zip(truth, found)]))
+                rows.append([kind, name, value, recall, latency])
+        finally:
+            self._configure_search(index)
+
+        return pd.DataFrame(rows, columns=columns)
 
     def get_training_data(self, **kwargs) -> pd.DataFrame:
-        sql_data = pd.DataFrame(self.sql_metadata)
+        sql_data = pd.DataFrame(list(self.sql_metadata.values()))
         sql_data['training_data_type'] = 'sql'
 
-        ddl_data = pd.DataFrame(self.ddl_metadata)
+        ddl_data = pd.DataFrame(list(self.ddl_metadata.values()))
         ddl_data['training_data_type'] = 'ddl'
 
-        doc_data = pd.DataFrame(self.doc_metadata)
+        doc_data = pd.DataFrame(list(self.doc_metadata.values()))
         doc_data['training_data_type'] = 'documentation'
 
-        return pd.concat([sql_data, ddl_data, doc_data], ignore_index=True)
+        return pd.concat([sql_data, ddl_data, doc_data], ignore_index=True).drop(columns="metadata", errors="ignore")
+
+    def get_training_data_metadata(self, training_data_type: str, key: str, **kwargs) -> Dict[str, dict]:
+        prefix = {"sql": "sql", "ddl": "ddl", "documentation": "doc"}[training_data_type]
+        metadata = getattr(self, f"{prefix}_metadata")
+        if isinstance(metadata, _SQLiteMetadata):
+            return metadata.with_metadata(key)
+        return {entry["id"]: entry["metadata"] for entry in metadata.values() if key in entry.get("metadata", {})}
+
+    def get_training_data_vectors(self, ids: List[str]) -> Dict[str, List[float]]:
+        vectors = {}
+        with self._lock:
+            for prefix in ('sql', 'ddl', 'doc'):
+                index = getattr(self, f"{prefix}_index")
+                # PQ codes only reconstruct an approximation, so those vectors are re-embedded instead
+                if self._index_kind(index) == "ivf_pq":
+                    continue
+                found = [id for id in ids if self._contains(prefix, id)]
+                reconstructed = self._reconstruct(index, [self._faiss_id(id) for id in found])
+                vectors.update(zip(found, reconstructed.tolist()))
+        return vectors
 
     def remove_training_data(self, id: str, **kwargs) -> bool:
-        for metadata_list, index, index_name in [
-            (self.sql_metadata, self.sql_index, 'sql_index.faiss'),
-            (self.ddl_metadata, self.ddl_index, 'ddl_index.faiss'),
-            (self.doc_metadata, self.doc_index, 'doc_index.faiss')
-        ]:
-            for i, item in enumerate(metadata_list):
-                if item['id'] == id:
-                    del metadata_list[i]
-                    new_index = faiss.IndexFlatL2(self.embedding_dim)
-                    embeddings = [self.generate_embedding(json.dumps(m)) for m in metadata_list]
-                    if embeddings:
-                        new_index.add(np.array(embeddings, dtype=np.float32))
-                    setattr(self, index_name.split('.')[0], new_index)
-                    
-                    if self.curr_client == 'persistent':
-                        self._save_index(new_index, index_name)
-                        self._save_metadata(metadata_list, f"{index_name.split('.')[0]}_metadata.json")
-                    
-                    return True
-        return False
+        try:
+            self._faiss_id(id)
+        except ValueError:
+            return False
+
+        with self._lock:
+            with self._file_lock():
+                for prefix in ('sql', 'ddl', 'doc'):
+                    self._catch_up(prefix)
+                    if self._contains(prefix, id):
+                        self._journal(prefix, [{"op": "remove", "id": id}])
+                        self._apply_remove(prefix, id)
+                        self._maintain_index(prefix)
+                        break
+                else:
+                    return False
+            self._schedule_flush()
+        return True
 
     def remove_collection(self, collection_name: str) -> bool:
-        if collection_name in ["sql", "ddl", "documentation"]:
-            setattr(self, f"{collection_name}_index", faiss.IndexFlatL2(self.embedding_dim))
-            setattr(self, f"{collection_name}_metadata", [])
-            
-            if self.curr_client == 'persistent':
-                self._save_index(getattr(self, f"{collection_name}_index"), f"{collection_name}_index.faiss")
-                self._save_metadata([], f"{collection_name}_metadata.json")
-            
+        prefixes = {"sql": "sql", "ddl": "ddl", "documentation": "doc"}
+        if collection_name in prefixes:
+            prefix = prefixes[collection_name]
+            with self._lock, self._file_lock():
+                self._set_index(prefix, self._create_index())
+                getattr(self, f"{prefix}_metadata").clear()
+
+                # The journal is dropped with the snapshot, so no process replays the removed changes
+                if self.curr_client == 'persistent':
+                    self._write_snapshot(prefix)
+                    self._dirty.discard(prefix)
+
             return True
-        return False
\ No newline at end of file
+        return False
@@ -506,6 +506,7 @@ class VannaFlaskAPI:
                         }
                     )
 
+                vn.check_sql_cost(sql)
                 df = vn.run_sql(sql=sql)
 
                 self.cache.set(id=id, field="df", value=df)
@@ -713,11 +714,27 @@ class VannaFlaskAPI:
         @self.requires_auth
         def get_training_data(user: any):
             """
-            Get all training data
+            Get all training data, or one page of it when page_size is set
             ---
             parameters:
               - name: user
                 in: query
+              - name: page_size
+                in: query
+                type: integer
+                required: false
+              - name: offset
+                in: query
+                type: integer
+                required: false
+              - name: training_data_type
+                in: query
+                type: string
+                required: false
+              - name: search
+                in: query
+                type: string
+                required: false
             responses:
               200:
                 schema:
@@ -731,10 +748,27 @@ class VannaFlaskAPI:
                       default: training_data
                     df:
                       type: object
+                    total:
+                      type: integer
             """
-            df = vn.get_training_data()
+            page_size = request.args.get("page_size", type=int)
+            offset = request.args.get("offset", 0, type=int)
+            training_data_type = request.args.get("training_data_type")
+            search = request.args.get("search")
+
+            if page_size is not None and page_size <= 0:
+                return jsonify({"type": "error", "error": "page_size must be a positive integer."}), 400
+            if offset < 0:
+                return jsonify({"type": "error", "error": "offset must not be negative."}), 400
+
+            total, pages = vn.page_training_data(
+                page_size=page_size or 1000,
+                offset=offset if page_size is not None else 0,
+                training_data_type=training_data_type,
+                search=search,
+            )
 
-            if df is None or len(df) == 0:
+            if total == 0:
                 return jsonify(
                     {
                         "type": "error",
@@ -742,13 +776,31 @@ class VannaFlaskAPI:
                     }
                 )
 
-            return jsonify(
-                {
-                    "type": "df",
-                    "id": "training_data",
-                    "df": df.to_json(orient="records"),
-                }
-            )
+            if page_size is not None:
+                df = next(pages, None)
+
+                return jsonify(
+                    {
+                        "type": "df",
+                        "id": "training_data",
+                        "df": df.to_json(orient="records") if df is not None else "[]",
+                        "total": total,
+                        "offset": offset,
+                    }
+                )
+
+            def generate():
+                # The df field is a JSON string, so each page is escaped as part of that string as it is streamed
+                yield '{"type": "df", "id": "training_data", "df": "['
+                separator = ""
+                for df in pages:
+                    if len(df) == 0:
+                        continue
+                    yield json.dumps(separator + df.to_json(orient="records")[1:-1])[1:-1]
+                    separator = ","
+                yield ']", "total": ' + json.dumps(total) + "}"
+
+            return Response(generate(), mimetype="application/json")
 
         @self.flask_app.route("/api/v0/remove_training_data", methods=["POST"])
         @self.requires_auth
@@ -1,16 +1,20 @@
 import datetime
+import json
 import os
 import uuid
 from typing import List, Optional
-from vertexai.language_models import (
-  TextEmbeddingInput,
-  TextEmbeddingModel
-)
+from vertexai.language_models import TextEmbeddingInput
 
 import pandas as pd
 from google.cloud import bigquery
 
 from ..base import VannaBase
+from ..embeddings import get_embedding_model
+
+# Vertex AI accepts at most 250 texts per embedding request
+_MAX_EMBEDDING_REQUEST = 250
+# and the Gemini API at most 100 per batchEmbedContents request
+_MAX_GEMINI_EMBEDDING_REQUEST = 100
 
 
 class BigQuery_VectorStore(VannaBase):
@@ -20,6 +24,17 @@ class BigQuery_VectorStore(VannaBase):
         self.n_results_sql = config.get("n_results_sql", config.get("n_results", 10))
         self.n_results_documentation = config.get("n_results_documentation", config.get("n_results", 10))
         self.n_results_ddl = config.get("n_results_ddl", config.get("n_results", 10))
+        self.training_batch_size = config.get("training_batch_size", 100)
+        self.embedding_model_name = config.get("embedding_model", "text-embedding-004")
+
+        # Searches go through a vector index on the embedding column. BigQuery only builds it once the table is
+        # large enough, and VECTOR_SEARCH falls back to brute force until then
+        self.vector_index = config.get("vector_index", True)
+        self.vector_index_name = config.get("vector_index_name", "training_data_embedding_index")
+        self.vector_index_type = config.get("vector_index_type", "IVF")
+        self.vector_index_options = config.get("vector_index_options", None)
+        self.fraction_lists_to_search = config.get("fraction_lists_to_search", None)
+        self._vector_index_created = False
 
         if "api_key" in config or os.getenv("GOOGLE_API_KEY"):
             """
@@ -83,134 +98,160 @@ class BigQuery_VectorStore(VannaBase):
             self.conn.create_table(table, timeout=30)  # Make an API request.
             print(f"Created table {self.table_id}")
 
-        # Create VECTOR INDEX IF NOT EXISTS
-        # TODO: This requires 5000 rows before it can be created
-        # vector_index_query = f"""
-        # CREATE VECTOR INDEX IF NOT EXISTS my_index
-        # ON `{self.table_id}`(embedding)
-        # OPTIONS(
-        #     distance_type='COSINE',
-        #     index_type='IVF',
-        #     ivf_options='{{"num_lists": 1000}}'
-        # )
-        # """
-
-        # try:
-        #     self.conn.query(vector_index_query).result()  # Make an API request.
-        #     print(f"Vector index on {self.table_id} created or already exists")
-        # except Exception as e:
-        #     print(f"Failed to create vector index: {e}")
+        if self.vector_index:
+            self.create_vector_index()
 
-    def store_training_data(self, training_data_type: str, question: str, content: str, embedding: List[float], **kwargs) -> str:
-        id = str(uuid.uuid4())
-        created_at = datetime.datetime.now()
-        self.conn.insert_rows_json(self.table_id, [{
-            "id": id,
-            "training_data_type": training_data_type,
-            "question": question,
-            "content": content,
-            "embedding": embedding,
-            "created_at": created_at.isoformat()
-        }])
-
-        return id
+    def create_vector_index(self) -> bool:
+        """
+        Creates the vector index on the embedding column if it doesn't exist. The training data type, question
+        and content are stored in the index, so searches filtered on the type are answered from the index.
 
-    def fetch_similar_training_data(self, training_data_type: str, question: str, n_results, **kwargs) -> pd.DataFrame:
-        question_embedding = self.generate_question_embedding(question)
+        Returns:
+            bool: True if the index exists.
+        """
+        options = [f"distance_type='COSINE'", f"index_type='{self.vector_index_type}'"]
+        if self.vector_index_options is not None:
+            options.append(f"{self.vector_index_type.lower()}_options='{json.dumps(self.vector_index_options)}'")
 
         query = f"""
-        SELECT
-            base.id as id,
-            base.question as question,
-            base.training_data_type as training_data_type,
-            base.content as content,
-            distance
-        FROM
-            VECTOR_SEARCH(
-                TABLE `{self.table_id}`,
-                'embedding',
-                (SELECT * FROM UNNEST([STRUCT({question_embedding})])),
-                top_k => 5,
-                distance_type => 'COSINE',
-                options => '{{"use_brute_force":true}}'
-            )
-        WHERE
-            base.training_data_type = '{training_data_type}'
+        CREATE VECTOR INDEX IF NOT EXISTS `{self.vector_index_name}`
+        ON `{self.table_id}`(embedding)
+        STORING(training_data_type, question, content)
+        OPTIONS({", ".join(options)})
         """
 
-        results = self.conn.query(query).result().to_dataframe()
-        return results
-
-    def get_embeddings(self, data: str, task: str) -> List[float]:
-        embeddings = None
-
-        if self.type == "VERTEX_AI":
-          input = [TextEmbeddingInput(data, task)]
-          model = TextEmbeddingModel.from_pretrained("text-embedding-004")
+        try:
+            self.conn.query(query).result()
+            self._vector_index_created = True
+        except Exception as e:
+            self.log(title="BigQuery Vector Index", message=f"Could not create the vector index yet: {e}")
+        return self._vector_index_created
 
-          result = model.get_embeddings(input)
+    def _training_row(self, training_data_type: str, question: str, content: str, embedding: List[float], id: Optional[str] = None) -> dict:
+        return {
+            "id": str(uuid.uuid4()) if id is None else id,
+            "training_data_type": training_data_type,
+            "question": question,
+            "content": content,
+            "embedding": embedding,
+            "created_at": datetime.datetime.now().isoformat(),
+        }
 
-          if len(result) > 0:
-              embeddings = result[0].values
+    def _insert_rows(self, rows: List[dict], row_ids: Optional[List[str]] = None) -> None:
+        # Rows with row_ids are deduplicated by BigQuery on a best-effort basis when an insert is retried
+        if row_ids is None:
+            errors = self.conn.insert_rows_json(self.table_id, rows)
         else:
-          # Use Gemini Consumer API
-          result = self.genai.embed_content(
-            model="models/text-embedding-004",
-            content=data,
-            task_type=task)
-
-          if 'embedding' in result:
-            embeddings = result['embedding']
-
-        return embeddings
-
-    def generate_question_embedding(self, data: str, **kwargs) -> List[float]:
-        result = self.get_embeddings(data, "RETRIEVAL_QUERY")
+            errors = self.conn.insert_rows_json(self.table_id, rows, row_ids=row_ids)
+        if errors:
+            raise ValueError(f"Failed to insert training data: {errors}")
 
-        if result != None:
-            return result
-        else:
-            raise ValueError("No embeddings returned")
+    def store_training_data(self, training_data_type: str, question: str, content: str, embedding: List[float], **kwargs) -> str:
+        row = self._training_row(training_data_type, question, content, embedding)
+        self._insert_rows([row])
+
+        return row["id"]
+
+    def _vector_search(self, training_data_type: str, top_k: int) -> str:
+        options = {"fraction_lists_to_search": self.fraction_lists_to_search} if self.fraction_lists_to_search else {}
+        return f"""
+            SELECT
+                base.id AS id,
+                base.question AS question,
+                base.training_data_type AS training_data_type,
+                base.content AS content,
+                distance
+            FROM
+                VECTOR_SEARCH(
+                    (SELECT * FROM `{self.table_id}` WHERE training_data_type = '{training_data_type}'),
+                    'embedding',
+                    (SELECT @embedding AS embedding),
+                    top_k => {int(top_k)},
+                    distance_type => 'COSINE',
+                    options => '{json.dumps(options)}'
+                )
+        """
 
-    def generate_storage_embedding(self, data: str, **kwargs) -> List[float]:
-        result = self.get_embeddings(data, "RETRIEVAL_DOCUMENT")
+    def _search(self, query: str, question: str) -> pd.DataFrame:
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ArrayQueryParameter("embedding", "FLOAT64", self.generate_question_embedding(question)),
+            ]
+        )
+        return self.conn.query(query, job_config=job_config).result().to_dataframe()
 
-        if result != None:
-            return result
+    def fetch_similar_training_data(self, training_data_type: str, question: str, n_results, **kwargs) -> pd.DataFrame:
+        query = self._vector_search(training_data_type, n_results) + "\nORDER BY distance"
+        return self._search(query, question)
+
+    def _related_training_data(self, question: str) -> pd.DataFrame:
+        return self._shared_related_training_data(question, lambda: self._query_related_training_data(question))
+
+    def _query_related_training_data(self, question: str) -> pd.DataFrame:
+        # One query returns the nearest neighbours of all three training data types
+        n_results = {"sql": self.n_results_sql, "ddl": self.n_results_ddl, "documentation": self.n_results_documentation}
+        query = " UNION ALL ".join(
+            f"({self._vector_search(training_data_type, top_k)})" for training_data_type, top_k in n_results.items()
+        ) + "\nORDER BY training_data_type, distance"
+        return self._search(query, question)
+
+    @property
+    def embedding_model(self):
+        # Loaded on first use and shared with every other store using the same model in this process
+        return get_embedding_model("vertexai", self.embedding_model_name)
+
+    def get_embeddings_batch(self, data: List[str], task: str) -> List[List[float]]:
+        embeddings = []
+        if self.type == "VERTEX_AI":
+            for start in range(0, len(data), _MAX_EMBEDDING_REQUEST):
+                inputs = [TextEmbeddingInput(text, task) for text in data[start:start + _MAX_EMBEDDING_REQUEST]]
+                embeddings += [result.values for result in self.embedding_model.get_embeddings(inputs)]
         else:
+            # Use Gemini Consumer API
+            for start in range(0, len(data), _MAX_GEMINI_EMBEDDING_REQUEST):
+                result = self.genai.embed_content(
+                    model=f"models/{self.embedding_model_name}",
+                    content=data[start:start + _MAX_GEMINI_EMBEDDING_REQUEST],
+                    task_type=task)
+                embeddings += result.get('embedding', [])
+
+        if len(embeddings) != len(data):
             raise ValueError("No embeddings returned")
+        return embeddings
 
-        # task = "RETRIEVAL_DOCUMENT"
-        # inputs = [TextEmbeddingInput(data, task)]
-        # embeddings = self.vertex_embedding_model.get_embeddings(inputs)
-
-        # if len(embeddings) == 0:
-        #     raise ValueError("No embeddings returned")
+    def get_embeddings(self, data: str, task: str) -> List[float]:
+        return self.get_embeddings_batch([data], task)[0]
 
-        # return embeddings[0].values
+    def generate_question_embedding(self, data: str, **kwargs) -> List[float]:
+        return self.get_embeddings(data, "RETRIEVAL_QUERY")
 
-        return result
+    def generate_storage_embedding(self, data: str, **kwargs) -> List[float]:
+        return self.get_embeddings(data, "RETRIEVAL_DOCUMENT")
 
     def generate_embedding(self, data: str, **kwargs) -> List[float]:
         return self.generate_storage_embedding(data, **kwargs)
 
+    def generate_embeddings(self, data: List[str], **kwargs) -> List[List[float]]:
+        return self.get_embeddings_batch(data, "RETRIEVAL_DOCUMENT")
+
     def get_similar_question_sql(self, question: str, **kwargs) -> list:
-        df = self.fetch_similar_training_data(training_data_type="sql", question=question, n_results=self.n_results_sql)
+        df = self._related_training_data(question)
+        df = df[df["training_data_type"] == "sql"]
 
         # Return a list of dictionaries with only question, sql fields. The content field needs to be renamed to sql
         return df.rename(columns={"content": "sql"})[["question", "sql"]].to_dict(orient="records")
 
     def get_related_ddl(self, question: str, **kwargs) -> list:
-        df = self.fetch_similar_training_data(training_data_type="ddl", question=question, n_results=self.n_results_ddl)
+        df = self._related_training_data(question)
 
         # Return a list of strings of the content
-        return df["content"].tolist()
+        return df[df["training_data_type"] == "ddl"]["content"].tolist()
 
     def get_related_documentation(self, question: str, **kwargs) -> list:
-        df = self.fetch_similar_training_data(training_data_type="documentation", question=question, n_results=self.n_results_documentation)
+        df = self._related_training_data(question)
 
         # Return a list of strings of the content
-        return df["content"].tolist()
+        return df[df["training_data_type"] == "documentation"]["content"].tolist()
 
     def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
         doc = {
@@ -232,16 +273,62 @@ class BigQuery_VectorStore(VannaBase):
 
         return self.store_training_data(training_data_type="documentation", question="", content=documentation, embedding=embedding)
 
+    def _store_training_data_batch(
+        self, training_data_type: str, questions: List[str], contents: List[str], texts: List[str], item_type: str,
+        ids=None, embeddings=None, metadatas=None, **kwargs
+    ) -> List[str]:
+        if metadatas is not None:
+            raise ValueError("The BigQuery training data table has no metadata column, so metadatas can't be stored")
+
+        added = []
+        items = list(zip(questions, contents, texts, ids or [None] * len(texts), embeddings or [None] * len(texts)))
+        for batch in self._iter_training_batches(items, **kwargs):
+            if embeddings is None:
+                batch_embeddings = self.generate_embeddings([text for _, _, text, _, _ in batch])
+            else:
+                batch_embeddings = [embedding for _, _, _, _, embedding in batch]
+            rows = [
+                self._training_row(training_data_type, question, content, embedding, id)
+                for (question, content, _, id, _), embedding in zip(batch, batch_embeddings)
+            ]
+            # Imported training data keeps its id
+            self._insert_rows(rows, row_ids=None if ids is None else [row["id"] for row in rows])
+            added += [row["id"] for row in rows]
+            self._log_training_progress(item_type, len(added), len(items))
+
+        if self.vector_index and not self._vector_index_created:
+            self.create_vector_index()
+        return added
+
+    def add_question_sql_batch(self, question_sql_list: List[dict], **kwargs) -> List[str]:
+        return self._store_training_data_batch(
+            "sql",
+            [item["question"] for item in question_sql_list],
+            [item["sql"] for item in question_sql_list],
+            [str({"question": item["question"], "sql": item["sql"]}) for item in question_sql_list],
+            "question-SQL pairs",
+            **kwargs,
+        )
+
+    def add_ddl_batch(self, ddl_list: List[str], **kwargs) -> List[str]:
+        return self._store_training_data_batch("ddl", [""] * len(ddl_list), ddl_list, ddl_list, "DDL statements", **kwargs)
+
+    def add_documentation_batch(self, documentation_list: List[str], **kwargs) -> List[str]:
+        return self._store_training_data_batch(
+            "documentation", [""] * len(documentation_list), documentation_list, documentation_list, "documentation entries", **kwargs
+        )
+
     def get_training_data(self, **kwargs) -> pd.DataFrame:
         query = f"SELECT id, training_data_type, question, content FROM `{self.table_id}`"
 
         return self.conn.query(query).result().to_dataframe()
 
     def remove_training_data(self, id: str, **kwargs) -> bool:
-        query = f"DELETE FROM `{self.table_id}` WHERE id = '{id}'"
+        query = f"DELETE FROM `{self.table_id}` WHERE id = @id"
+        job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("id", "STRING", id)])
 
         try:
-            self.conn.query(query).result()
+            self.conn.query(query, job_config=job_config).result()
             return True
 
         except Exception as e:
@@ -1,10 +1,12 @@
+import json
 import uuid
-from typing import List
+from typing import List, Optional
 
 import pandas as pd
-from pymilvus import DataType, MilvusClient, model
+from pymilvus import DataType, MilvusClient
 
 from ..base import VannaBase
+from ..embeddings import get_embedding_model
 
 # Setting the URI as a local file, e.g.`./milvus.db`,
 # is the most convenient method, as it automatically utilizes Milvus Lite
@@ -19,6 +21,7 @@ DEFAULT_MILVUS_URI = "./milvus.db"
 # DEFAULT_MILVUS_URI = "http://localhost:19530"
 
 MAX_LIMIT_SIZE = 10_000
+TENANT_FIELD = "tenant"
 
 
 class Milvus_VectorStore(VannaBase):
@@ -32,6 +35,10 @@ class Milvus_VectorStore(VannaBase):
                 A `milvus_model.base.BaseEmbeddingFunction` instance. Defaults to `DefaultEmbeddingFunction()`.
                 For more models, please refer to:
                 https://milvus.io/docs/embeddings.md
+            - tenant_partitioning: If `True`, new collections get a `tenant` partition key, and add, retrieval, count and remove calls
+                take a `tenant=` argument. Defaults to `False`.
+            - num_partitions: Number of partitions the tenants are hashed into. Defaults to the Milvus default.
+            - default_tenant: The tenant of calls that don't pass one when `tenant_partitioning` is set. Defaults to `"default"`.
     """
     def __init__(self, config=None):
         VannaBase.__init__(self, config=config)
@@ -44,8 +51,11 @@ class Milvus_VectorStore(VannaBase):
         if "embedding_function" in config:
             self.embedding_function = config.get("embedding_function")
         else:
-            self.embedding_function = model.DefaultEmbeddingFunction()
+            self.embedding_function = get_embedding_model("milvus_default")
         self._embedding_dim = self.embedding_function.encode_documents(["foo"])[0].shape[0]
+        self.tenant_partitioning = config.get("tenant_partitioning", False)
+        self.num_partitions = config.get("num_partitions", None)
+        self.default_tenant = config.get("default_tenant", "default")
         self._create_collections()
         self.n_results = config.get("n_results", 10)
 
@@ -54,10 +64,53 @@ class Milvus_VectorStore(VannaBase):
         self._create_ddl_collection("vannaddl")
         self._create_doc_collection("vannadoc")
 
+        if self.tenant_partitioning:
+            for name in ("vannasql", "vannaddl", "vannadoc"):
+                fields = self.milvus_client.describe_collection(collection_name=name)["fields"]
+                if not any(field["name"] == TENANT_FIELD for field in fields):
+                    raise ValueError(
+                        f"Collection {name} was created without tenant partitioning. Drop it or migrate its training data "
+                        "to a new collection to partition it by tenant."
+                    )
+
+    def _add_tenant_field(self, schema):
+        # Milvus hashes each tenant to a partition, and filtering on the tenant only searches that partition
+        if self.tenant_partitioning:
+            schema.add_field(field_name=TENANT_FIELD, datatype=DataType.VARCHAR, max_length=512, is_partition_key=True)
+
+    def _create_collection(self, name: str, schema, index_params):
+        params = {}
+        if self.tenant_partitioning and self.num_partitions is not None:
+            params["num_partitions"] = self.num_partitions
+        self.milvus_client.create_collection(
+            collection_name=name,
+            schema=schema,
+            index_params=index_params,
+            consistency_level="Strong",
+            **params,
+        )
+
+    def _tenant(self, kwargs: dict) -> Optional[str]:
+        tenant = kwargs.get("tenant")
+        if not self.tenant_partitioning:
+            if tenant is not None:
+                raise ValueError("Training data can only be scoped to a tenant with tenant_partitioning set in config")
+            return None
+        return self.default_tenant if tenant is None else tenant
+
+    @staticmethod
+    def _tenant_filter(tenant: Optional[str]) -> str:
+        if tenant is None:
+            return ""
+        return f"{TENANT_FIELD} == {json.dumps(tenant, ensure_ascii=False)}"
+
 
     def generate_embedding(self, data: str, **kwargs) -> List[float]:
         return self.embedding_function.encode_documents(data).tolist()
 
+    def generate_embeddings(self, data: List[str], **kwargs) -> List[List[float]]:
+        return [embedding.tolist() for embedding in self.embedding_function.encode_documents(data)]
+
 
     def _create_sql_collection(self, name: str):
         if not self.milvus_client.has_collection(collection_name=name):
@@ -69,6 +122,7 @@ class Milvus_VectorStore(VannaBase):
             vannasql_schema.add_field(field_name="text", datatype=DataType.VARCHAR, max_length=65535)
             vannasql_schema.add_field(field_name="sql", datatype=DataType.VARCHAR, max_length=65535)
             vannasql_schema.add_field(field_name="vector", datatype=DataType.FLOAT_VECTOR, dim=self._embedding_dim)
+            self._add_tenant_field(vannasql_schema)
 
             vannasql_index_params = self.milvus_client.prepare_index_params()
             vannasql_index_params.add_index(
@@ -77,12 +131,7 @@ class Milvus_VectorStore(VannaBase):
                 index_type="AUTOINDEX",
                 metric_type="L2",
             )
-            self.milvus_client.create_collection(
-                collection_name=name,
-                schema=vannasql_schema,
-                index_params=vannasql_index_params,
-                consistency_level="Strong"
-            )
+            self._create_collection(name, vannasql_schema, vannasql_index_params)
 
     def _create_ddl_collection(self, name: str):
         if not self.milvus_client.has_collection(collection_name=name):
@@ -93,6 +142,7 @@ class Milvus_VectorStore(VannaBase):
             vannaddl_schema.add_field(field_name="id", datatype=DataType.VARCHAR, max_length=65535, is_primary=True)
             vannaddl_schema.add_field(field_name="ddl", datatype=DataType.VARCHAR, max_length=65535)
             vannaddl_schema.add_field(field_name="vector", datatype=DataType.FLOAT_VECTOR, dim=self._embedding_dim)
+            self._add_tenant_field(vannaddl_schema)
 
             vannaddl_index_params = self.milvus_client.prepare_index_params()
             vannaddl_index_params.add_index(
@@ -101,12 +151,7 @@ class Milvus_VectorStore(VannaBase):
                 index_type="AUTOINDEX",
                 metric_type="L2",
             )
-            self.milvus_client.create_collection(
-                collection_name=name,
-                schema=vannaddl_schema,
-                index_params=vannaddl_index_params,
-                consistency_level="Strong"
-            )
+            self._create_collection(name, vannaddl_schema, vannaddl_index_params)
 
     def _create_doc_collection(self, name: str):
         if not self.milvus_client.has_collection(collection_name=name):
@@ -117,6 +162,7 @@ class Milvus_VectorStore(VannaBase):
             vannadoc_schema.add_field(field_name="id", datatype=DataType.VARCHAR, max_length=65535, is_primary=True)
             vannadoc_schema.add_field(field_name="doc", datatype=DataType.VARCHAR, max_length=65535)
             vannadoc_schema.add_field(field_name="vector", datatype=DataType.FLOAT_VECTOR, dim=self._embedding_dim)
+            self._add_tenant_field(vannadoc_schema)
 
             vannadoc_index_params = self.milvus_client.prepare_index_params()
             vannadoc_index_params.add_index(
@@ -125,62 +171,74 @@ class Milvus_VectorStore(VannaBase):
                 index_type="AUTOINDEX",
                 metric_type="L2",
             )
-            self.milvus_client.create_collection(
-                collection_name=name,
-                schema=vannadoc_schema,
-                index_params=vannadoc_index_params,
-                consistency_level="Strong"
-            )
+            self._create_collection(name, vannadoc_schema, vannadoc_index_params)
 
+    # Single additions go through the batch path, so both tag rows with the tenant the same way
     def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
-        if len(question) == 0 or len(sql) == 0:
-            raise Exception("pair of question and sql can not be null")
-        _id = str(uuid.uuid4()) + "-sql"
-        embedding = self.embedding_function.encode_documents([question])[0]
-        self.milvus_client.insert(
-            collection_name="vannasql",
-            data={
-                "id": _id,
-                "text": question,
-                "sql": sql,
-                "vector": embedding
-            }
-        )
-        return _id
+        return self.add_question_sql_batch([{"question": question, "sql": sql}], **kwargs)[0]
 
     def add_ddl(self, ddl: str, **kwargs) -> str:
-        if len(ddl) == 0:
-            raise Exception("ddl can not be null")
-        _id = str(uuid.uuid4()) + "-ddl"
-        embedding = self.embedding_function.encode_documents([ddl])[0]
-        self.milvus_client.insert(
-            collection_name="vannaddl",
-            data={
-                "id": _id,
-                "ddl": ddl,
-                "vector": embedding
-            }
-        )
-        return _id
+        return self.add_ddl_batch([ddl], **kwargs)[0]
 
     def add_documentation(self, documentation: str, **kwargs) -> str:
-        if len(documentation) == 0:
+        return self.add_documentation_batch([documentation], **kwargs)[0]
+
+    def _insert_batch(
+        self, collection_name: str, rows: List[dict], embed_field: str, item_type: str, ids=None, embeddings=None, metadatas=None, **kwargs
+    ) -> List[str]:
+        if metadatas is not None:
+            raise ValueError("Milvus collections have no metadata field, so metadatas can't be stored")
+        tenant = self._tenant(kwargs)
+        if tenant is not None:
+            rows = [{**row, TENANT_FIELD: tenant} for row in rows]
+        # Imported training data keeps its id, and is upserted so importing it again doesn't duplicate it
+        if ids is not None:
+            rows = [{**row, "id": id} for row, id in zip(rows, ids)]
+        write = self.milvus_client.insert if ids is None else self.milvus_client.upsert
+
+        added = []
+        items = list(zip(rows, embeddings or [None] * len(rows)))
+        for batch in self._iter_training_batches(items, **kwargs):
+            if embeddings is None:
+                batch_embeddings = self.embedding_function.encode_documents([row[embed_field] for row, _ in batch])
+            else:
+                batch_embeddings = [embedding for _, embedding in batch]
+            write(
+                collection_name=collection_name,
+                data=[{**row, "vector": embedding} for (row, _), embedding in zip(batch, batch_embeddings)],
+            )
+            added += [row["id"] for row, _ in batch]
+            self._log_training_progress(item_type, len(added), len(rows))
+
+        return added
+
+    def add_question_sql_batch(self, question_sql_list: List[dict], **kwargs) -> List[str]:
+        for item in question_sql_list:
+            if len(item["question"]) == 0 or len(item["sql"]) == 0:
+                raise Exception("pair of question and sql can not be null")
+        rows = [
+            {"id": str(uuid.uuid4()) + "-sql", "text": item["question"], "sql": item["sql"]}
+            for item in question_sql_list
+        ]
+        return self._insert_batch("vannasql", rows, "text", "question-SQL pairs", **kwargs)
+
+    def add_ddl_batch(self, ddl_list: List[str], **kwargs) -> List[str]:
+        if any(len(ddl) == 0 for ddl in ddl_list):
+            raise Exception("ddl can not be null")
+        rows = [{"id": str(uuid.uuid4()) + "-ddl", "ddl": ddl} for ddl in ddl_list]
+        return self._insert_batch("vannaddl", rows, "ddl", "DDL statements", **kwargs)
+
+    def add_documentation_batch(self, documentation_list: List[str], **kwargs) -> List[str]:
+        if any(len(documentation) == 0 for documentation in documentation_list):
             raise Exception("documentation can not be null")
-        _id = str(uuid.uuid4()) + "-doc"
-        embedding = self.embedding_function.encode_documents([documentation])[0]
-        self.milvus_client.insert(
-            collection_name="vannadoc",
-            data={
-                "id": _id,
-                "doc": documentation,
-                "vector": embedding
-            }
-        )
-        return _id
+        rows = [{"id": str(uuid.uuid4()) + "-doc", "doc": documentation} for documentation in documentation_list]
+        return self._insert_batch("vannadoc", rows, "doc", "documentation entries", **kwargs)
 
     def get_training_data(self, **kwargs) -> pd.DataFrame:
+        tenant_filter = self._tenant_filter(self._tenant(kwargs))
         sql_data = self.milvus_client.query(
             collection_name="vannasql",
+            filter=tenant_filter,
             output_fields=["*"],
             limit=MAX_LIMIT_SIZE,
         )
@@ -196,6 +254,7 @@ class Milvus_VectorStore(VannaBase):
 
         ddl_data = self.milvus_client.query(
             collection_name="vannaddl",
+            filter=tenant_filter,
             output_fields=["*"],
             limit=MAX_LIMIT_SIZE,
         )
@@ -211,6 +270,7 @@ class Milvus_VectorStore(VannaBase):
 
         doc_data = self.milvus_client.query(
             collection_name="vannadoc",
+            filter=tenant_filter,
             output_fields=["*"],
             limit=MAX_LIMIT_SIZE,
         )
@@ -225,6 +285,23 @@ class Milvus_VectorStore(VannaBase):
         df = pd.concat([df, df_doc])
         return df
 
+    def count_training_data(self, training_data_type: str = None, search: str = None, **kwargs) -> int:
+        if search is not None:
+            return super().count_training_data(training_data_type, search, **kwargs)
+
+        # Counted by the server, only in the tenant's partition when partitioned
+        tenant_filter = self._tenant_filter(self._tenant(kwargs))
+        collections = {"sql": "vannasql", "ddl": "vannaddl", "documentation": "vannadoc"}
+        return sum(
+            self.milvus_client.query(
+                collection_name=collection_name,
+                filter=tenant_filter,
+                output_fields=["count(*)"],
+            )[0]["count(*)"]
+            for name, collection_name in collections.items()
+            if training_data_type in (None, name)
+        )
+
     def get_similar_question_sql(self, question: str, **kwargs) -> list:
         search_params = {
             "metric_type": "L2",
@@ -235,6 +312,7 @@ class Milvus_VectorStore(VannaBase):
             collection_name="vannasql",
             anns_field="vector",
             data=embeddings,
+            filter=self._tenant_filter(self._tenant(kwargs)),
             limit=self.n_results,
             output_fields=["text", "sql"],
             search_params=search_params
@@ -259,6 +337,7 @@ class Milvus_VectorStore(VannaBase):
             collection_name="vannaddl",
             anns_field="vector",
             data=embeddings,
+            filter=self._tenant_filter(self._tenant(kwargs)),
             limit=self.n_results,
             output_fields=["ddl"],
             search_params=search_params
@@ -280,6 +359,7 @@ class Milvus_VectorStore(VannaBase):
             collection_name="vannadoc",
             anns_field="vector",
             data=embeddings,
+            filter=self._tenant_filter(self._tenant(kwargs)),
             limit=self.n_results,
             output_fields=["doc"],
             search_params=search_params
@@ -292,14 +372,39 @@ class Milvus_VectorStore(VannaBase):
         return list_doc
 
     def remove_training_data(self, id: str, **kwargs) -> bool:
-        if id.endswith("-sql"):
-            self.milvus_client.delete(collection_name="vannasql", ids=[id])
-            return True
-        elif id.endswith("-ddl"):
-            self.milvus_client.delete(collection_name="vannaddl", ids=[id])
-            return True
-        elif id.endswith("-doc"):
-            self.milvus_client.delete(collection_name="vannadoc", ids=[id])
-            return True
-        else:
+        collections = {"-sql": "vannasql", "-ddl": "vannaddl", "-doc": "vannadoc"}
+        for suffix, collection_name in collections.items():
+            if id.endswith(suffix):
+                tenant = self._tenant(kwargs)
+                if tenant is None:
+                    self.milvus_client.delete(collection_name=collection_name, ids=[id])
+                else:
+                    # Only removes the row if it belongs to the tenant
+                    tenant_id_filter = f"id == {json.dumps(id, ensure_ascii=False)} and {self._tenant_filter(tenant)}"
+                    count = self.milvus_client.query(
+                        collection_name=collection_name,
+                        filter=tenant_id_filter,
+                        output_fields=["count(*)"],
+                    )[0]["count(*)"]
+                    if count == 0:
+                        return False
+                    self.milvus_client.delete(collection_name=collection_name, filter=tenant_id_filter)
+                return True
+        return False
+
+    def remove_tenant_training_data(self, tenant: str, **kwargs) -> bool:
+        """
+        Removes all the training data of a tenant.
+
+        Args:
+            tenant (str): The tenant to remove.
+
+        Returns:
+            bool: True if the training data was removed, False if the store isn't partitioned by tenant
+        """
+        if not self.tenant_partitioning:
             return False
+
+        for collection_name in ("vannasql", "vannaddl", "vannadoc"):
+            self.milvus_client.delete(collection_name=collection_name, filter=self._tenant_filter(tenant))
+        return True
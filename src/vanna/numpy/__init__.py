@@ -0,0 +1 @@
+from .numpy_vector import NumPy_VectorStore
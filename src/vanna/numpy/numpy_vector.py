@@ -0,0 +1,850 @@
+import os
+import copy
+import contextlib
+import json
+import time
+import atexit
+import base64
+import weakref
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..base import VannaBase
+from ..embeddings import get_embedding_model
+from ..utils import atomic_write, deterministic_uuid, file_lock, file_version, read_journal
+
+# Persistent stores still open in this process, flushed on exit without being kept alive by the exit handler
+_persistent_stores = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_persistent_stores() -> None:
+    for store in list(_persistent_stores):
+        store.flush()
+
+# Number of set bits in every byte value, for NumPy versions without np.bitwise_count
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(codes: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(codes)
+    return _POPCOUNT[codes]
+
+
+def _quantize(vectors: np.ndarray, quantization: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Encodes float32 vectors as int8 codes with one scale per vector (4x smaller) or as their sign bits packed
+    eight to a byte (32x smaller).
+    """
+    if quantization == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return np.packbits(vectors > 0, axis=1), None
+
+
+def _top(rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    # The k best of each column, best first
+    k = min(k, scores.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=0)[:k]
+    top = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=0), axis=0, kind="stable"), axis=0)
+    return np.take_along_axis(rows, top, axis=0), np.take_along_axis(scores, top, axis=0)
+
+
+class _Collection:
+    """
+    One collection of training data: a contiguous float32 matrix of vectors, their cached L2 norms and the
+    metadata of each row. Rows are appended into spare capacity and deleted rows are tombstoned until the
+    collection is compacted.
+
+    A quantized collection also keeps int8 or binary codes of every vector in memory. Searches rank the codes
+    and only read the float vectors of the best `rerank_depth` candidates, so the float matrix can stay on disk.
+    """
+
+    def __init__(self, dim: Optional[int] = None, quantization: Optional[str] = None):
+        self.dim = dim
+        self.quantization = quantization
+        self.vectors = np.zeros((0, dim or 0), dtype=np.float32)
+        self.norms = np.zeros(0, dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.codes = None
+        self.scales = None
+        self.entries: List[Optional[Dict[str, Any]]] = []
+        self.positions: Dict[str, int] = {}
+        self.size = 0
+        self.mmapped = False
+        if dim is not None:
+            self._reset_codes()
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def tombstones(self) -> int:
+        return self.size - len(self.positions)
+
+    @property
+    def bytes_per_vector(self) -> int:
+        if self.quantization == "int8":
+            return self.dim + 4
+        if self.quantization == "binary":
+            return (self.dim + 7) // 8
+        return 4 * self.dim
+
+    def _reset_codes(self) -> None:
+        if self.quantization is None:
+            return
+
+        # Codes are computed a block at a time so a memory-mapped matrix is never copied whole
+        empty = _quantize(np.zeros((0, self.dim), dtype=np.float32), self.quantization)
+        blocks = [
+            _quantize(np.asarray(self.vectors[start:start + 65536], dtype=np.float32), self.quantization)
+            for start in range(0, self.size, 65536)
+        ] or [empty]
+        self.codes = np.concatenate([codes for codes, _ in blocks])
+        self.scales = np.concatenate([scales for _, scales in blocks]) if self.quantization == "int8" else None
+
+    def with_quantization(self, quantization: Optional[str]) -> "_Collection":
+        """
+        Returns a view of this collection that searches with a different quantization.
+        """
+        if quantization == self.quantization:
+            return self
+
+        view = copy.copy(self)
+        view.quantization = quantization
+        view._reset_codes()
+        return view
+
+    def _reserve(self, rows: int) -> None:
+        capacity = self.vectors.shape[0]
+        if not self.mmapped and self.size + rows <= capacity:
+            return
+
+        # Capacity doubles so appends stay amortized O(1); a memory-mapped matrix is copied into memory
+        # the first time it's written to
+        capacity = max(self.size + rows, 2 * self.size, 64)
+        arrays = {"vectors": np.float32, "norms": np.float32, "alive": bool, "codes": None, "scales": np.float32}
+        for name, dtype in arrays.items():
+            array = getattr(self, name)
+            if array is None:
+                continue
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=dtype or array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, name, grown)
+        self.mmapped = False
+
+    def upsert(self, entries: List[Dict[str, Any]], vectors: np.ndarray) -> None:
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+            self._reset_codes()
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension mismatch: expected {self.dim}, got {vectors.shape[1]}")
+
+        # Existing ids are overwritten in place, new ids are appended after the last row
+        rows = []
+        new_rows = sum(1 for entry in entries if entry["id"] not in self.positions)
+        self._reserve(new_rows)
+        for entry in entries:
+            row = self.positions.get(entry["id"])
+            if row is None:
+                row = self.size
+                self.size += 1
+                self.positions[entry["id"]] = row
+                self.entries.append(entry)
+            else:
+                self.entries[row] = entry
+            rows.append(row)
+
+        rows = np.array(rows, dtype=np.int64)
+        self.vectors[rows] = vectors
+        self.norms[rows] = np.linalg.norm(vectors, axis=1)
+        self.alive[rows] = True
+        if self.quantization is not None:
+            codes, scales = _quantize(vectors, self.quantization)
+            self.codes[rows] = codes
+            if scales is not None:
+                self.scales[rows] = scales
+
+    def remove(self, id: str) -> bool:
+        row = self.positions.pop(id, None)
+        if row is None:
+            return False
+
+        self.alive[row] = False
+        self.entries[row] = None
+        return True
+
+    def compact(self) -> None:
+        keep = np.flatnonzero(self.alive[:self.size])
+        for name in ("vectors", "norms", "codes", "scales"):
+            if getattr(self, name) is not None:
+                setattr(self, name, np.ascontiguousarray(getattr(self, name)[keep]))
+        self.alive = np.ones(len(keep), dtype=bool)
+        self.entries = [self.entries[row] for row in keep.tolist()]
+        self.positions = {entry["id"]: row for row, entry in enumerate(self.entries)}
+        self.size = len(keep)
+        self.mmapped = False
+
+    @staticmethod
+    def _metric_scores(scores: np.ndarray, norms: np.ndarray, metric: str) -> np.ndarray:
+        # Turns inner products with the (unit, for cosine) queries into scores where higher is better
+        if metric == "cosine":
+            return scores / np.where(norms == 0, 1, norms)
+        if metric == "l2":
+            # Ranking by -|v - q|^2 only needs 2 v.q - |v|^2, since |q|^2 is the same for every row
+            return 2 * scores - np.square(norms)
+        return scores
+
+    def _block_scores(self, start: int, stop: int, queries: np.ndarray, metric: str) -> np.ndarray:
+        if self.quantization == "binary":
+            # Fewer differing sign bits ranks higher
+            codes = self.codes[start:stop]
+            scores = np.empty((stop - start, len(queries)), dtype=np.float32)
+            for i, query_code in enumerate(np.packbits(queries > 0, axis=1)):
+                scores[:, i] = -_popcount(codes ^ query_code).sum(axis=1, dtype=np.int32)
+        elif self.quantization == "int8":
+            scores = (self.codes[start:stop].astype(np.float32) @ queries.T) * self.scales[start:stop, None]
+            scores = self._metric_scores(scores, self.norms[start:stop, None], metric)
+        else:
+            scores = self._metric_scores(self.vectors[start:stop] @ queries.T, self.norms[start:stop, None], metric)
+
+        scores[~self.alive[start:stop]] = -np.inf
+        return scores
+
+    def search(self, queries: np.ndarray, k: int, metric: str, batch_size: int, rerank_depth: int = 0) -> List[List[int]]:
+        """
+        Returns the rows of the k best matches for each query. Scores are computed one block of rows at a
+        time so the score matrix stays bounded, and each block only keeps its own best candidates via
+        argpartition. A quantized collection ranks its codes and then rescores the best `rerank_depth`
+        candidates with the float vectors.
+        """
+        k = min(k, len(self.positions))
+        if k == 0 or self.size == 0:
+            return [[] for _ in range(len(queries))]
+
+        if metric == "cosine":
+            query_norms = np.linalg.norm(queries, axis=1)
+            queries = queries / np.where(query_norms == 0, 1, query_norms)[:, None]
+
+        rerank = self.quantization is not None and rerank_depth > 0
+        depth = min(max(k, rerank_depth), len(self.positions)) if rerank else k
+
+        # int8 codes are widened to float32 a block at a time, so those blocks are kept smaller
+        if self.quantization == "int8":
+            batch_size = min(batch_size, 8192)
+
+        candidate_rows, candidate_scores = [], []
+        for start in range(0, self.size, batch_size):
+            stop = min(start + batch_size, self.size)
+            scores = self._block_scores(start, stop, queries, metric)
+            rows = np.broadcast_to(np.arange(start, stop)[:, None], scores.shape)
+            rows, scores = _top(rows, scores, depth)
+            candidate_rows.append(rows)
+            candidate_scores.append(scores)
+
+        rows, scores = _top(np.concatenate(candidate_rows), np.concatenate(candidate_scores), depth)
+
+        if rerank:
+            # Only the candidates' float vectors are read, so a memory-mapped matrix is mostly left on disk
+            vectors = self.vectors[rows.ravel()].reshape(rows.shape + (self.dim,))
+            exact = self._metric_scores(np.einsum("dqk,qk->dq", vectors, queries), self.norms[rows], metric)
+            exact[scores == -np.inf] = -np.inf
+            rows, scores = _top(rows, exact, k)
+        else:
+            rows, scores = rows[:k], scores[:k]
+
+        return [
+            [row for row, score in zip(rows[:, i].tolist(), scores[:, i].tolist()) if score != -np.inf]
+            for i in range(rows.shape[1])
+        ]
+
+
+class NumPy_VectorStore(VannaBase):
+    """
+    Vector store that ranks training data with NumPy only, for deployments that don't want a FAISS, Chroma or
+    Qdrant dependency to search up to a few hundred thousand items. Search is exact.
+
+    Persistent collections are stored in `path` as `{collection}_vectors.npy`, `{collection}_norms.npy` and
+    `{collection}_metadata.jsonl` (one compact JSON line per entry), and the .npy files are memory-mapped read-only
+    when loaded. Adds and removes are appended to `{collection}_journal.jsonl` and the collection files are only
+    rewritten every `flush_every` journaled changes or `flush_interval` seconds, so training stays linear in the
+    number of items. The journal is replayed on startup after a crash. Processes sharing a path share the journal:
+    before writing, each one applies the changes the others journaled and reloads the collections they saved, so a
+    save never drops another process's changes, and searches see them after the next write or flush.
+
+    With `quantization` set to "int8" or "binary", the int8 codes or sign bits of every vector are kept in memory
+    (and saved as `{collection}_codes.npy`) and searched first, then the best `rerank_depth` candidates are
+    rescored with their float vectors. For persistent collections the float vectors stay memory-mapped, so
+    resident memory drops roughly 4x for int8 and 32x for binary. `quantization_recall_report` measures the
+    recall cost on the stored training data.
+    """
+
+    def __init__(self, config=None):
+        if config is None:
+            config = {}
+
+        VannaBase.__init__(self, config=config)
+
+        self.path = config.get("path", ".")
+        self.curr_client = config.get("client", "persistent")
+        if self.curr_client not in ("persistent", "in-memory"):
+            raise ValueError(f"Unsupported client was set in config: {self.curr_client}")
+        self.metric = config.get("metric", "cosine")
+        if self.metric not in ("cosine", "ip", "l2"):
+            raise ValueError(f"Unsupported metric was set in config: {self.metric}")
+        self.embedding_dim = config.get("embedding_dim", None)
+        self.n_results_sql = config.get("n_results_sql", config.get("n_results", 10))
+        self.n_results_ddl = config.get("n_results_ddl", config.get("n_results", 10))
+        self.n_results_documentation = config.get("n_results_documentation", config.get("n_results", 10))
+        # Number of rows scored per matrix product during a search
+        self.search_batch_size = config.get("search_batch_size", 65536)
+        # Deleted rows stay in the matrix until this fraction of a collection is deleted
+        self.compaction_ratio = config.get("compaction_ratio", 0.2)
+        # Write-behind persistence: changes go to an append-only journal and collections are saved after
+        # `flush_every` journaled items, `flush_interval` seconds, or an explicit flush()
+        self.flush_every = config.get("flush_every", 1000)
+        self.flush_interval = config.get("flush_interval", 5.0)
+        self.journal_fsync = config.get("journal_fsync", False)
+        # Saves persistent collections after every add or remove instead
+        self.autosave = config.get("autosave", False)
+        self.quantization = config.get("quantization", None)
+        if self.quantization not in (None, "int8", "binary"):
+            raise ValueError(f"Unsupported quantization was set in config: {self.quantization}")
+        # Number of quantized candidates rescored with the float vectors; 0 ranks by the codes alone
+        self.rerank_depth = config.get("rerank_depth", 100)
+
+        # A callable that embeds a list of strings; defaults to a shared SentenceTransformer model
+        self.embedding_function: Optional[Callable] = config.get("embedding_function", None)
+        self.embedding_model_name = config.get("embedding_model", "all-MiniLM-L6-v2")
+
+        self._lock = threading.RLock()
+        self._dirty = set()
+        self._flush_timer = None
+        self._pending = 0
+        # How far into each journal this process has applied, and the version of each saved collection it last
+        # read or wrote
+        self._journal_offsets = {}
+        self._saved_versions = {}
+        self.collections: Dict[str, _Collection] = {}
+        if self.curr_client == "persistent":
+            os.makedirs(self.path, exist_ok=True)
+            # Another process may be saving a collection and truncating its journal at the same time
+            with self._file_lock():
+                for prefix in ("sql", "ddl", "doc"):
+                    self.collections[prefix] = self._load_collection(prefix)
+                    self._saved_versions[prefix] = file_version(self._files(prefix)["metadata"])
+                    replayed = self._replay_journal(prefix)
+                    if replayed > 0:
+                        self.log(title="NumPy Journal", message=f"Replayed {replayed} journaled changes to the {prefix} collection")
+                        self._dirty.add(prefix)
+            self.flush()
+            _persistent_stores.add(self)
+        else:
+            for prefix in ("sql", "ddl", "doc"):
+                self.collections[prefix] = _Collection(self.embedding_dim, self.quantization)
+
+    @property
+    def embedding_model(self):
+        return get_embedding_model("sentence_transformers", self.embedding_model_name)
+
+    def generate_embedding(self, data: str, **kwargs) -> List[float]:
+        return self.generate_embeddings([data], **kwargs)[0]
+
+    def generate_embeddings(self, data: List[str], **kwargs) -> List[List[float]]:
+        if self.embedding_function is not None:
+            embeddings = self.embedding_function(data)
+        else:
+            embeddings = self.embedding_model.encode(data)
+        return np.asarray(embeddings, dtype=np.float32).tolist()
+
+    @staticmethod
+    def _embedding_text(entry: Dict[str, str]) -> str:
+        if "sql" in entry:
+            return entry["question"] + " " + entry["sql"]
+        if "ddl" in entry:
+            return entry["ddl"]
+        return entry["documentation"]
+
+    def _files(self, prefix: str) -> Dict[str, str]:
+        return {
+            name: os.path.join(self.path, f"{prefix}_{name}.{extension}")
+            for name, extension in (
+                ("vectors", "npy"), ("norms", "npy"), ("codes", "npy"), ("scales", "npy"), ("metadata", "jsonl"),
+                ("journal", "jsonl"),
+            )
+        }
+
+    def _map_vectors(self, prefix: str, collection: _Collection) -> None:
+        # Saved collections are compacted, so every row is live
+        files = self._files(prefix)
+        if collection.size > 0:
+            collection.vectors = np.load(files["vectors"], mmap_mode="r")
+            collection.norms = np.load(files["norms"], mmap_mode="r")
+            collection.mmapped = True
+        else:
+            collection.vectors = np.zeros((0, collection.dim or 0), dtype=np.float32)
+            collection.norms = np.zeros(0, dtype=np.float32)
+        collection.alive = np.ones(collection.size, dtype=bool)
+
+    def _load_collection(self, prefix: str) -> _Collection:
+        files = self._files(prefix)
+        legacy_metadata = os.path.join(self.path, f"{prefix}_metadata.json")
+        collection = _Collection(self.embedding_dim, self.quantization)
+        if os.path.exists(files["metadata"]):
+            with open(files["metadata"], "r") as f:
+                metadata = json.loads(next(f))
+                metadata["entries"] = [json.loads(line) for line in f]
+        elif os.path.exists(legacy_metadata):
+            # Earlier versions kept the metadata in one JSON document; it's rewritten as JSON lines on the next save
+            with open(legacy_metadata, "r") as f:
+                metadata = json.load(f)
+            self._dirty.add(prefix)
+        else:
+            return collection
+
+        collection.entries = metadata["entries"]
+        collection.positions = {entry["id"]: row for row, entry in enumerate(collection.entries)}
+        collection.size = len(collection.entries)
+        collection.dim = metadata["dim"]
+        self._map_vectors(prefix, collection)
+
+        # Codes are read into memory; they're recomputed if the collection was saved with another quantization
+        if self.quantization is not None and collection.dim is not None:
+            if metadata.get("quantization") == self.quantization and collection.size > 0:
+                collection.codes = np.load(files["codes"])
+                collection.scales = np.load(files["scales"]) if self.quantization == "int8" else None
+            else:
+                collection._reset_codes()
+        return collection
+
+    def _save_collection(self, prefix: str) -> None:
+        collection = self.collections[prefix]
+        if collection.tombstones:
+            collection.compact()
+
+        os.makedirs(self.path, exist_ok=True)
+        files = self._files(prefix)
+        arrays = {"vectors": collection.vectors, "norms": collection.norms}
+        if collection.quantization is not None and collection.codes is not None:
+            arrays["codes"] = collection.codes
+            if collection.scales is not None:
+                arrays["scales"] = collection.scales
+        for name, array in arrays.items():
+            # Written next to the target and renamed over it, so readers never see a partial file and
+            # existing memory maps keep the previous version
+            with atomic_write(files[name]) as tmp_path, open(tmp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(array[:collection.size]))
+
+        with atomic_write(files["metadata"]) as tmp_path, open(tmp_path, "w") as f:
+            f.write(json.dumps({"dim": collection.dim, "metric": self.metric, "quantization": collection.quantization}) + "\n")
+            for entry in collection.entries:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        legacy_metadata = os.path.join(self.path, f"{prefix}_metadata.json")
+        if os.path.exists(legacy_metadata):
+            os.remove(legacy_metadata)
+
+        # Searches read the saved vectors through the memory map from now on instead of keeping a copy in memory
+        self._map_vectors(prefix, collection)
+        if collection.codes is not None:
+            collection.codes = collection.codes[:collection.size].copy()
+            collection.scales = collection.scales[:collection.size].copy() if collection.scales is not None else None
+
+    def _retrieval_state(self) -> Tuple[dict, Dict[str, np.ndarray]]:
+        # Persistent collections are already memory-mapped from their own files
+        if self.curr_client != "in-memory":
+            return {}, {}
+
+        state = {"quantization": self.quantization, "collections": {}}
+        arrays = {}
+        with self._lock:
+            for prefix, collection in self.collections.items():
+                if collection.tombstones:
+                    collection.compact()
+                state["collections"][prefix] = {"dim": collection.dim, "entries": collection.entries}
+                if collection.dim is None:
+                    continue
+                arrays[f"{prefix}_vectors"] = collection.vectors[:collection.size]
+                arrays[f"{prefix}_norms"] = collection.norms[:collection.size]
+                if collection.codes is not None:
+                    arrays[f"{prefix}_codes"] = collection.codes[:collection.size]
+                if collection.scales is not None:
+                    arrays[f"{prefix}_scales"] = collection.scales[:collection.size]
+        return state, arrays
+
+    def _restore_retrieval_state(self, state: dict, arrays: Dict[str, np.ndarray]) -> None:
+        if self.curr_client != "in-memory" or not state:
+            return
+
+        with self._lock:
+            for prefix, saved in state["collections"].items():
+                collection = _Collection(saved["dim"], self.quantization)
+                if saved["dim"] is not None:
+                    collection.entries = saved["entries"]
+                    collection.positions = {entry["id"]: row for row, entry in enumerate(collection.entries)}
+                    collection.size = len(collection.entries)
+                    # The vectors stay mapped from the snapshot until the collection is first written to
+                    collection.vectors = arrays[f"{prefix}_vectors"]
+                    collection.norms = arrays[f"{prefix}_norms"]
+                    collection.alive = np.ones(collection.size, dtype=bool)
+                    collection.mmapped = True
+                    if self.quantization is not None:
+                        if state["quantization"] == self.quantization and f"{prefix}_codes" in arrays:
+                            collection.codes = np.array(arrays[f"{prefix}_codes"])
+                            collection.scales = np.array(arrays[f"{prefix}_scales"]) if self.quantization == "int8" else None
+                        else:
+                            collection._reset_codes()
+                self.collections[prefix] = collection
+
+    def _file_lock(self):
+        # Serializes writes and saves with the other processes using the same path
+        if self.curr_client != "persistent":
+            return contextlib.nullcontext()
+        return file_lock(os.path.join(self.path, "numpy.lock"))
+
+    def _journal(self, prefix: str, records: List[Dict[str, Any]]) -> None:
+        # Called with the file lock held, once the journal has been caught up with
+        with open(self._files(prefix)["journal"], "a") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            if self.journal_fsync:
+                os.fsync(f.fileno())
+            self._journal_offsets[prefix] = f.tell()
+        self._pending += len(records)
+
+    def _replay_journal(self, prefix: str) -> int:
+        """
+        Applies the journaled changes after the point this process last read the journal to: on startup, the
+        changes the last save doesn't hold, e.g. after a crash, and later the changes other processes journaled.
+        Replaying is idempotent, so changes that were saved but not yet truncated from the journal are harmless.
+        """
+        records, self._journal_offsets[prefix] = read_journal(
+            self._files(prefix)["journal"], self._journal_offsets.get(prefix, 0)
+        )
+        for record in records:
+            collection = self.collections[prefix]
+            if record["op"] == "add":
+                vector = np.frombuffer(base64.b64decode(record["vector"]), dtype=np.float32)
+                collection.upsert([record["entry"]], vector.reshape(1, -1))
+            elif record["op"] == "remove":
+                collection.remove(record["id"])
+            elif record["op"] == "clear":
+                self.collections[prefix] = _Collection(self.embedding_dim, self.quantization)
+        return len(records)
+
+    def _catch_up(self, prefix: str) -> None:
+        # Called with the file lock held, before this process changes the collection or writes to its journal
+        if self.curr_client != "persistent":
+            return
+
+        version = file_version(self._files(prefix)["metadata"])
+        if version is not None and version != self._saved_versions.get(prefix):
+            # Another process saved the collection, with everything journaled before it, and truncated the journal
+            self.collections[prefix] = self._load_collection(prefix)
+            self._journal_offsets[prefix] = 0
+            self._saved_versions[prefix] = version
+        self._replay_journal(prefix)
+
+    def _schedule_flush(self) -> None:
+        if self.curr_client != "persistent":
+            return
+
+        if self.autosave:
+            self.flush()
+        elif self.flush_every is not None and self._pending >= self.flush_every:
+            self.flush()
+        elif self.flush_interval is not None and self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _training_data_fingerprint(self) -> Optional[str]:
+        # An in-memory store's training data comes from the snapshot itself
+        if self.curr_client == "in-memory":
+            return None
+        if self.curr_client != "persistent" or self.retrieval_snapshot_fingerprint != "count":
+            return super()._training_data_fingerprint()
+
+        # Every change by any process replaces a saved collection or appends to its journal. Pending changes
+        # are saved first, so saving them later doesn't make the snapshot look stale
+        self.flush()
+        with self._file_lock():
+            versions = [
+                [file_version(self._files(prefix)[name]) for name in ("metadata", "journal")]
+                for prefix in sorted(self.collections)
+            ]
+        return deterministic_uuid(json.dumps(versions))
+
+    def flush(self) -> None:
+        """
+        Saves every persistent collection that changed since it was last saved and truncates its journal.
+        """
+        if self.curr_client != "persistent":
+            return
+
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+            if self._dirty:
+                with self._file_lock():
+                    for prefix in sorted(self._dirty):
+                        # Other processes' saves and journaled changes are applied first, so the saved collection
+                        # holds them too. The journal is only dropped once the collection is saved
+                        self._catch_up(prefix)
+                        self._save_collection(prefix)
+                        open(self._files(prefix)["journal"], "w").close()
+                        self._journal_offsets[prefix] = 0
+                        self._saved_versions[prefix] = file_version(self._files(prefix)["metadata"])
+
+            self._dirty.clear()
+            self._pending = 0
+
+    def _changed(self, prefix: str, records: List[Dict[str, Any]]) -> None:
+        # Called with the file lock held
+        collection = self.collections[prefix]
+        if collection.tombstones > self.compaction_ratio * collection.size:
+            collection.compact()
+
+        if self.curr_client != "persistent":
+            return
+
+        self._journal(prefix, records)
+        self._dirty.add(prefix)
+
+    def _upsert(self, prefix: str, entries: List[Dict[str, Any]], embeddings: List[List[float]], reduce: bool = True) -> None:
+        vectors = self.reduce_embeddings(embeddings) if reduce else np.asarray(embeddings, dtype=np.float32)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(entries), -1)
+        with self._lock:
+            with self._file_lock():
+                self._catch_up(prefix)
+                self.collections[prefix].upsert(entries, vectors)
+                self._changed(prefix, [
+                    {"op": "add", "entry": entry, "vector": base64.b64encode(vector.tobytes()).decode("ascii")}
+                    for entry, vector in zip(entries, vectors)
+                ])
+            self._schedule_flush()
+
+    def _add_batch_to_collection(
+        self, prefix, texts, extra_metadata_list, item_type, suffix, ids=None, embeddings=None, metadatas=None, **kwargs
+    ) -> List[str]:
+        if ids is None:
+            ids = [deterministic_uuid(text) + suffix for text in texts]
+        if metadatas is not None:
+            extra_metadata_list = [
+                {**extra_metadata, "metadata": metadata} if metadata else extra_metadata
+                for extra_metadata, metadata in zip(extra_metadata_list, metadatas)
+            ]
+
+        entry_ids = []
+        items = list(zip(ids, texts, extra_metadata_list, embeddings or [None] * len(texts)))
+        for batch in self._iter_training_batches(items, **kwargs):
+            # Identical items in one batch collapse to a single entry
+            unique = {entry_id: (text, extra_metadata, embedding) for entry_id, text, extra_metadata, embedding in batch}
+            entries = [{"id": entry_id, **extra_metadata} for entry_id, (_, extra_metadata, _) in unique.items()]
+            if embeddings is None:
+                self._upsert(prefix, entries, self.generate_embeddings([text for text, _, _ in unique.values()]))
+            else:
+                self._upsert(prefix, entries, [embedding for _, _, embedding in unique.values()], reduce=False)
+            entry_ids += [entry_id for entry_id, _, _, _ in batch]
+            self._log_training_progress(item_type, len(entry_ids), len(items))
+
+        return entry_ids
+
+    def add_question_sql_batch(self, question_sql_list: List[Dict[str, str]], **kwargs) -> List[str]:
+        return self._add_batch_to_collection(
+            "sql",
+            [item["question"] + " " + item["sql"] for item in question_sql_list],
+            [{"question": item["question"], "sql": item["sql"]} for item in question_sql_list],
+            "question-SQL pairs", "-sql", **kwargs
+        )
+
+    def add_ddl_batch(self, ddl_list: List[str], **kwargs) -> List[str]:
+        return self._add_batch_to_collection(
+            "ddl", ddl_list, [{"ddl": ddl} for ddl in ddl_list], "DDL statements", "-ddl", **kwargs
+        )
+
+    def add_documentation_batch(self, documentation_list: List[str], **kwargs) -> List[str]:
+        return self._add_batch_to_collection(
+            "doc", documentation_list, [{"documentation": documentation} for documentation in documentation_list],
+            "documentation entries", "-doc", **kwargs
+        )
+
+    def _add_to_collection(self, prefix, text, extra_metadata, suffix) -> str:
+        entry_id = deterministic_uuid(text) + suffix
+        self._upsert(prefix, [{"id": entry_id, **extra_metadata}], [self.generate_embedding(text)])
+        return entry_id
+
+    def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
+        return self._add_to_collection("sql", question + " " + sql, {"question": question, "sql": sql}, "-sql")
+
+    def add_ddl(self, ddl: str, **kwargs) -> str:
+        return self._add_to_collection("ddl", ddl, {"ddl": ddl}, "-ddl")
+
+    def add_documentation(self, documentation: str, **kwargs) -> str:
+        return self._add_to_collection("doc", documentation, {"documentation": documentation}, "-doc")
+
+    def _get_similar(self, prefix: str, question: str, n_results: int, item: Callable[[dict], Any]) -> list:
+        collection = self.collections[prefix]
+        if len(collection) == 0:
+            return []
+
+        query = self.reduce_embeddings([self.generate_embedding(question)])
+        with self._lock:
+            rows = collection.search(query, n_results, self.metric, self.search_batch_size, self.rerank_depth)[0]
+            items = [item(collection.entries[row]) for row in rows]
+            # Context selection compares these instead of embedding the context again
+            vectors = collection.vectors[rows] if rows and self.context_similarity == "embedding" else None
+        if vectors is not None:
+            self._remember_context_vectors(question, query[0], items, vectors)
+        return items
+
+    def get_similar_question_sql(self, question: str, **kwargs) -> list:
+        return self._get_similar(
+            "sql", question, self.n_results_sql, lambda entry: {"question": entry["question"], "sql": entry["sql"]}
+        )
+
+    def get_related_ddl(self, question: str, **kwargs) -> list:
+        return self._get_similar("ddl", question, self.n_results_ddl, lambda entry: entry["ddl"])
+
+    def get_related_documentation(self, question: str, **kwargs) -> list:
+        return self._get_similar("doc", question, self.n_results_documentation, lambda entry: entry["documentation"])
+
+    def get_training_data(self, **kwargs) -> pd.DataFrame:
+        rows = []
+        with self._lock:
+            for prefix, training_data_type in (("sql", "sql"), ("ddl", "ddl"), ("doc", "documentation")):
+                for entry in self.collections[prefix].entries:
+                    if entry is None:
+                        continue
+                    rows.append({
+                        "id": entry["id"],
+                        "question": entry.get("question"),
+                        "content": entry.get("sql", entry.get("ddl", entry.get("documentation"))),
+                        "training_data_type": training_data_type,
+                    })
+
+        return pd.DataFrame(rows, columns=["id", "question", "content", "training_data_type"])
+
+    def get_training_data_metadata(self, training_data_type: str, key: str, **kwargs) -> Dict[str, dict]:
+        prefix = {"sql": "sql", "ddl": "ddl", "documentation": "doc"}[training_data_type]
+        with self._lock:
+            return {
+                entry["id"]: entry["metadata"]
+                for entry in self.collections[prefix].entries
+                if entry is not None and key in entry.get("metadata", {})
+            }
+
+    def get_training_data_vectors(self, ids: List[str]) -> Dict[str, List[float]]:
+        prefixes = {"-sql": "sql", "-ddl": "ddl", "-doc": "doc"}
+        vectors = {}
+        with self._lock:
+            for id in ids:
+                collection = self.collections.get(prefixes.get(id[-4:]))
+                row = collection.positions.get(id) if collection is not None else None
+                if row is not None:
+                    vectors[id] = collection.vectors[row].tolist()
+        return vectors
+
+    def remove_training_data(self, id: str, **kwargs) -> bool:
+        prefixes = {"-sql": "sql", "-ddl": "ddl", "-doc": "doc"}
+        prefix = prefixes.get(id[-4:])
+        if prefix is None:
+            return False
+
+        with self._lock:
+            with self._file_lock():
+                self._catch_up(prefix)
+                if not self.collections[prefix].remove(id):
+                    return False
+                self._changed(prefix, [{"op": "remove", "id": id}])
+            self._schedule_flush()
+        return True
+
+    def remove_collection(self, collection_name: str) -> bool:
+        """
+        This function can reset the collection to empty state.
+
+        Args:
+            collection_name (str): sql or ddl or documentation
+
+        Returns:
+            bool: True if collection is deleted, False otherwise
+        """
+        prefixes = {"sql": "sql", "ddl": "ddl", "documentation": "doc"}
+        if collection_name not in prefixes:
+            return False
+
+        with self._lock:
+            with self._file_lock():
+                self._catch_up(prefixes[collection_name])
+                self.collections[prefixes[collection_name]] = _Collection(self.embedding_dim, self.quantization)
+                self._changed(prefixes[collection_name], [{"op": "clear"}])
+            self._schedule_flush()
+        return True
+
+    def quantization_recall_report(
+        self,
+        collection_name: str = "sql",
+        queries: List[str] = None,
+        k: int = 10,
+        n_queries: int = 100,
+        rerank_depths: List[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Measures recall and latency of int8 and binary quantization against exact float32 search on the current corpus.
+
+        Args:
+            collection_name (str): sql or ddl or documentation
+            queries (List[str]): The questions to search with. Defaults to a sample of the stored training data.
+            k (int): The number of results to compare.
+            n_queries (int): The number of training data items to sample when no queries are given.
+            rerank_depths (List[int]): The rerank depths to sweep. Defaults to 0, k, 4k and 10k.
+
+        Returns:
+            pd.DataFrame: One row per quantization and rerank depth with the memory per vector in bytes, the recall@k
+            and the mean latency per query in milliseconds.
+        """
+        prefixes = {"sql": "sql", "ddl": "ddl", "documentation": "doc"}
+        if collection_name not in prefixes:
+            raise ValueError(f"Unknown collection: {collection_name}")
+
+        collection = self.collections[prefixes[collection_name]]
+        columns = ["quantization", "rerank_depth", "bytes_per_vector", "recall_at_k", "latency_ms"]
+        if len(collection) == 0:
+            return pd.DataFrame(columns=columns)
+
+        if queries is None:
+            entries = [entry for entry in collection.entries if entry is not None]
+            sample = np.random.default_rng(0).choice(len(entries), min(n_queries, len(entries)), replace=False)
+            queries = [entries[i].get("question") or self._embedding_text(entries[i]) for i in sample]
+        query_vectors = self.reduce_embeddings(self.generate_embeddings(queries))
+        k = min(k, len(collection))
+        if rerank_depths is None:
+            rerank_depths = [0, k, 4 * k, 10 * k]
+
+        rows = []
+        with self._lock:
+            exact = collection.with_quantization(None)
+            start = time.perf_counter()
+            truth = exact.search(query_vectors, k, self.metric, self.search_batch_size)
+            rows.append([None, None, exact.bytes_per_vector, 1.0, (time.perf_counter() - start) * 1000 / len(queries)])
+            truth = [set(row) for row in truth]
+
+            for quantization in ("int8", "binary"):
+                view = collection.with_quantization(quantization)
+                for rerank_depth in rerank_depths:
+                    start = time.perf_counter()
+                    found = view.search(query_vectors, k, self.metric, self.search_batch_size, rerank_depth)
+                    latency = (time.perf_counter() - start) * 1000 / len(queries)
+                    recall = float(np.mean([len(truth_rows & set(row)) / k for truth_rows, row in zip(truth, found)]))
+                    rows.append([quantization, rerank_depth, view.bytes_per_vector, recall, latency])
+
+        return pd.DataFrame(rows, columns=columns)
@@ -1,11 +1,12 @@
 import base64
 import uuid
-from typing import List
+from typing import List, Optional
 
 import pandas as pd
-from opensearchpy import OpenSearch
+from opensearchpy import OpenSearch, helpers
 
 from ..base import VannaBase
+from ..embeddings import get_embedding_model
 
 
 class OpenSearch_VectorStore(VannaBase):
@@ -24,66 +25,51 @@ class OpenSearch_VectorStore(VannaBase):
     self.document_index = document_index
     self.ddl_index = ddl_index
     self.question_sql_index = question_sql_index
-    print("OpenSearch_VectorStore initialized with document_index: ",
-          document_index, " ddl_index: ", ddl_index, " question_sql_index: ",
-          question_sql_index)
-
-    document_index_settings = {
-      "settings": {
-        "index": {
-          "number_of_shards": 6,
-          "number_of_replicas": 2
-        }
-      },
-      "mappings": {
-        "properties": {
-          "question": {
-            "type": "text",
-          },
-          "doc": {
-            "type": "text",
-          }
-        }
-      }
-    }
 
-    ddl_index_settings = {
-      "settings": {
-        "index": {
-          "number_of_shards": 6,
-          "number_of_replicas": 2
-        }
-      },
-      "mappings": {
-        "properties": {
-          "ddl": {
-            "type": "text",
-          },
-          "doc": {
-            "type": "text",
-          }
-        }
+    if config is None:
+      config = {}
+    self.n_results_sql = config.get("n_results_sql", config.get("n_results", 10))
+    self.n_results_ddl = config.get("n_results_ddl", config.get("n_results", 10))
+    self.n_results_documentation = config.get("n_results_documentation", config.get("n_results", 10))
+
+    # With es_knn, every document also gets an "embedding" knn_vector field. Searches rank by vector similarity,
+    # or with es_hybrid by a weighted sum of the min-max normalized BM25 and vector scores, es_hybrid_weight
+    # being the weight of the vector score
+    self.knn = config.get("es_knn", False)
+    self.hybrid = config.get("es_hybrid", False)
+    if self.hybrid and not self.knn:
+      raise ValueError("es_hybrid requires es_knn")
+    self.hybrid_weight = config.get("es_hybrid_weight", 0.5)
+    if not 0 <= self.hybrid_weight <= 1:
+      raise ValueError("es_hybrid_weight must be between 0 and 1")
+    self.embedding_function = config.get("embedding_function", None)
+    self.embedding_model_name = config.get("embedding_model", "all-MiniLM-L6-v2")
+    self.embedding_dim = config.get("embedding_dim", None)
+    if self.knn and self.embedding_dim is None:
+      self.embedding_dim = len(self.generate_embedding("vanna"))
+
+    def index_settings(text_fields: List[str]) -> dict:
+      properties = {field: {"type": "text"} for field in text_fields}
+      index = {
+        "number_of_shards": config.get("es_number_of_shards", 6),
+        "number_of_replicas": config.get("es_number_of_replicas", 2),
       }
-    }
-
-    question_sql_index_settings = {
-      "settings": {
-        "index": {
-          "number_of_shards": 6,
-          "number_of_replicas": 2
-        }
-      },
-      "mappings": {
-        "properties": {
-          "question": {
-            "type": "text",
+      if self.knn:
+        index["knn"] = True
+        properties["embedding"] = {
+          "type": "knn_vector",
+          "dimension": self.embedding_dim,
+          "method": {
+            "name": "hnsw",
+            "space_type": config.get("es_knn_space_type", "cosinesimil"),
+            "engine": config.get("es_knn_engine", "lucene"),
           },
-          "sql": {
-            "type": "text",
-          }
         }
-      }
-    }
+      return {"settings": {"index": index}, "mappings": {"properties": properties}}
+
+    document_index_settings = index_settings(["question", "doc"])
+    ddl_index_settings = index_settings(["ddl", "doc"])
+    question_sql_index_settings = index_settings(["question", "sql"])
 
     if config is not None and "es_document_index_settings" in config:
       document_index_settings = config["es_document_index_settings"]
@@ -160,9 +146,6 @@ class OpenSearch_VectorStore(VannaBase):
     else:
       es_http_compress = False
 
-    print("OpenSearch_VectorStore initialized with es_urls: ", es_urls,
-          " host: ", host, " port: ", port, " ssl: ", ssl, " verify_certs: ",
-          verify_certs, " timeout: ", timeout, " max_retries: ", max_retries)
     if es_urls is not None:
       # Initialize the OpenSearch client by passing a list of URLs
       self.client = OpenSearch(
@@ -190,121 +173,206 @@ class OpenSearch_VectorStore(VannaBase):
         headers=headers
       )
 
-      print("OpenSearch_VectorStore initialized with client over ")
-
-    # 执行一个简单的查询来检查连接
-    try:
-      print('Connected to OpenSearch cluster:')
-      info = self.client.info()
-      print('OpenSearch cluster info:', info)
-    except Exception as e:
-      print('Error connecting to OpenSearch cluster:', e)
-
     # Create the indices if they don't exist
     self.create_index_if_not_exists(self.document_index,
                                     self.document_index_settings)
     self.create_index_if_not_exists(self.ddl_index, self.ddl_index_settings)
     self.create_index_if_not_exists(self.question_sql_index,
                                     self.question_sql_index_settings)
+    if self.knn:
+      for index in [self.document_index, self.ddl_index, self.question_sql_index]:
+        self._check_knn_mapping(index)
 
   def create_index(self):
-    for index in [self.document_index, self.ddl_index,
-                  self.question_sql_index]:
-      try:
-        self.client.indices.create(index)
-      except Exception as e:
-        print("Error creating index: ", e)
-        print(f"opensearch index {index} already exists")
-        pass
+    for index, settings in [(self.document_index, self.document_index_settings),
+                            (self.ddl_index, self.ddl_index_settings),
+                            (self.question_sql_index, self.question_sql_index_settings)]:
+      self.create_index_if_not_exists(index, settings)
 
   def create_index_if_not_exists(self, index_name: str,
                                  index_settings: dict) -> bool:
     try:
       if not self.client.indices.exists(index_name):
-        print(f"Index {index_name} does not exist. Creating...")
         self.client.indices.create(index=index_name, body=index_settings)
         return True
       else:
-        print(f"Index {index_name} already exists.")
         return False
     except Exception as e:
-      print(f"Error creating index: {index_name} ", e)
+      self.log(title="OpenSearch Error", message=f"Error creating index {index_name}: {e}")
       return False
 
+  def _check_knn_mapping(self, index_name: str):
+    # An index created before es_knn was turned on has no knn_vector field to search
+    try:
+      mappings = self.client.indices.get_mapping(index=index_name)
+    except Exception as e:
+      self.log(title="OpenSearch Error", message=f"Error reading the mapping of index {index_name}: {e}")
+      return
+    for mapping in mappings.values():
+      embedding = mapping.get("mappings", {}).get("properties", {}).get("embedding", {})
+      if embedding.get("type") != "knn_vector":
+        raise ValueError(
+          f"Index {index_name} has no knn_vector embedding field. es_knn needs an index created with it: "
+          f"reindex the training data or use a new index name"
+        )
+      if embedding.get("dimension") != self.embedding_dim:
+        raise ValueError(
+          f"Index {index_name} stores {embedding.get('dimension')}-dimensional embeddings, "
+          f"but the embedding model returns {self.embedding_dim}"
+        )
+
+  @property
+  def embedding_model(self):
+    return get_embedding_model("sentence_transformers", self.embedding_model_name)
+
+  def generate_embeddings(self, data: List[str], **kwargs) -> List[List[float]]:
+    if self.embedding_function is not None:
+      embeddings = self.embedding_function(data)
+    else:
+      embeddings = self.embedding_model.encode(data)
+    return [list(map(float, embedding)) for embedding in embeddings]
+
+  def generate_embedding(self, data: str, **kwargs) -> List[float]:
+    if not self.knn and self.embedding_function is None:
+      # BM25 search doesn't need embeddings
+      return None
+    return self.generate_embeddings([data])[0]
+
+  # Single additions go through the bulk path too, so both embed and write the same way
   def add_ddl(self, ddl: str, **kwargs) -> str:
-    # Assuming that you have a DDL index in your OpenSearch
-    id = str(uuid.uuid4()) + "-ddl"
-    ddl_dict = {
-      "ddl": ddl
-    }
-    response = self.client.index(index=self.ddl_index, body=ddl_dict, id=id,
-                                 **kwargs)
-    return response['_id']
+    return self.add_ddl_batch([ddl], **kwargs)[0]
 
   def add_documentation(self, doc: str, **kwargs) -> str:
-    # Assuming you have a documentation index in your OpenSearch
-    id = str(uuid.uuid4()) + "-doc"
-    doc_dict = {
-      "doc": doc
-    }
-    response = self.client.index(index=self.document_index, id=id,
-                                 body=doc_dict, **kwargs)
-    return response['_id']
+    return self.add_documentation_batch([doc], **kwargs)[0]
 
   def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
-    # Assuming you have a Questions and SQL index in your OpenSearch
-    id = str(uuid.uuid4()) + "-sql"
-    question_sql_dict = {
-      "question": question,
-      "sql": sql
+    return self.add_question_sql_batch([{"question": question, "sql": sql}],
+                                       **kwargs)[0]
+
+  def _bulk_index(self, index: str, documents: List[dict], texts: List[str],
+                  suffix: str, item_type: str, ids=None, embeddings=None,
+                  metadatas=None, **kwargs) -> List[str]:
+    if metadatas is not None:
+      raise ValueError(
+        "OpenSearch training data can't be read back by metadata, so metadatas can't be stored")
+    # Imported training data keeps its id, so importing it again overwrites the same documents
+    if ids is None:
+      ids = [str(uuid.uuid4()) + suffix for _ in documents]
+
+    added = []
+    items = list(zip(ids, documents, texts, embeddings or [None] * len(texts)))
+    for batch in self._iter_training_batches(items, **kwargs):
+      sources = [dict(document) for _, document, _, _ in batch]
+      if self.knn:
+        if embeddings is None:
+          batch_embeddings = self.generate_embeddings([text for _, _, text, _ in batch])
+        else:
+          batch_embeddings = [embedding for _, _, _, embedding in batch]
+        for source, embedding in zip(sources, batch_embeddings):
+          source["embedding"] = embedding
+      actions = [
+        {"_index": index, "_id": id, "_source": source}
+        for (id, _, _, _), source in zip(batch, sources)
+      ]
+      helpers.bulk(self.client, actions)
+      added += [action["_id"] for action in actions]
+      self._log_training_progress(item_type, len(added), len(items))
+    return added
+
+  def add_ddl_batch(self, ddl_list: List[str], **kwargs) -> List[str]:
+    return self._bulk_index(self.ddl_index, [{"ddl": ddl} for ddl in ddl_list],
+                            ddl_list, "-ddl", "DDL statements", **kwargs)
+
+  def add_documentation_batch(self, documentation_list: List[str],
+                              **kwargs) -> List[str]:
+    return self._bulk_index(self.document_index,
+                            [{"doc": doc} for doc in documentation_list],
+                            documentation_list, "-doc",
+                            "documentation entries", **kwargs)
+
+  def add_question_sql_batch(self, question_sql_list: List[dict],
+                             **kwargs) -> List[str]:
+    return self._bulk_index(self.question_sql_index,
+                            [{"question": item["question"], "sql": item["sql"]}
+                             for item in question_sql_list],
+                            [item["question"] + " " + item["sql"]
+                             for item in question_sql_list],
+                            "-sql", "question-SQL pairs", **kwargs)
+
+  def _search_queries(self, text_field: str, size: int, question: str,
+                      embedding: Optional[List[float]]) -> List[dict]:
+    match = {"match": {text_field: question}}
+    if embedding is None:
+      return [match]
+    knn = {"knn": {"embedding": {"vector": embedding, "k": size}}}
+    return [match, knn] if self.hybrid else [knn]
+
+  def _combine_hits(self, hit_lists: List[List[dict]], size: int) -> List[dict]:
+    if len(hit_lists) == 1:
+      return [hit["_source"] for hit in hit_lists[0]]
+
+    # BM25 scores are unbounded while vector similarities aren't, so each list is min-max normalized to [0, 1]
+    # before the weighted sum, like OpenSearch's normalization processor does
+    scores = {}
+    sources = {}
+    for weight, hits in zip([1 - self.hybrid_weight, self.hybrid_weight], hit_lists):
+      if not hits:
+        continue
+      low = min(hit["_score"] for hit in hits)
+      high = max(hit["_score"] for hit in hits)
+      for hit in hits:
+        normalized = (hit["_score"] - low) / (high - low) if high > low else 1.0
+        scores[hit["_id"]] = scores.get(hit["_id"], 0.0) + weight * normalized
+        sources[hit["_id"]] = hit["_source"]
+    ranked = sorted(scores, key=scores.get, reverse=True)[:size]
+    return [sources[id] for id in ranked]
+
+  def _related_training_data(self, question: str) -> dict:
+    return self._shared_related_training_data(
+      question, lambda: self._query_related_training_data(question))
+
+  def _query_related_training_data(self, question: str) -> dict:
+    # The three searches go to the cluster in one _msearch request, returning only the fields in use
+    embedding = self.generate_embedding(question) if self.knn else None
+    searches = [
+      (self.question_sql_index, "question", ["question", "sql"], self.n_results_sql),
+      (self.ddl_index, "ddl", ["ddl"], self.n_results_ddl),
+      (self.document_index, "doc", ["doc"], self.n_results_documentation),
+    ]
+    body = []
+    query_counts = []
+    for index, text_field, source, size in searches:
+      queries = self._search_queries(text_field, size, question, embedding)
+      for query in queries:
+        body += [{"index": index}, {"query": query, "size": size, "_source": source}]
+      query_counts.append(len(queries))
+    responses = iter(self.client.msearch(body=body)["responses"])
+
+    hits = []
+    for (index, _, _, size), query_count in zip(searches, query_counts):
+      hit_lists = []
+      for response in [next(responses) for _ in range(query_count)]:
+        if "error" in response:
+          self.log(title="OpenSearch Error", message=f"Search of {index} failed: {response['error']}")
+          hit_lists.append([])
+        else:
+          hit_lists.append(response["hits"]["hits"])
+      hits.append(self._combine_hits(hit_lists, size))
+
+    return {
+      "sql": [{"question": hit["question"], "sql": hit["sql"]} for hit in hits[0]],
+      "ddl": [hit["ddl"] for hit in hits[1]],
+      "documentation": [hit["doc"] for hit in hits[2]],
     }
-    response = self.client.index(index=self.question_sql_index,
-                                 body=question_sql_dict, id=id,
-                                 **kwargs)
-    return response['_id']
 
   def get_related_ddl(self, question: str, **kwargs) -> List[str]:
-    # Assume you have some vector search mechanism associated with your data
-    query = {
-      "query": {
-        "match": {
-          "ddl": question
-        }
-      }
-    }
-    print(query)
-    response = self.client.search(index=self.ddl_index, body=query,
-                                  **kwargs)
-    return [hit['_source']['ddl'] for hit in response['hits']['hits']]
+    return self._related_training_data(question)["ddl"]
 
   def get_related_documentation(self, question: str, **kwargs) -> List[str]:
-    query = {
-      "query": {
-        "match": {
-          "doc": question
-        }
-      }
-    }
-    print(query)
-    response = self.client.search(index=self.document_index,
-                                  body=query,
-                                  **kwargs)
-    return [hit['_source']['doc'] for hit in response['hits']['hits']]
-
-  def get_similar_question_sql(self, question: str, **kwargs) -> List[str]:
-    query = {
-      "query": {
-        "match": {
-          "question": question
-        }
-      }
-    }
-    print(query)
-    response = self.client.search(index=self.question_sql_index,
-                                  body=query,
-                                  **kwargs)
-    return [(hit['_source']['question'], hit['_source']['sql']) for hit in
-            response['hits']['hits']]
+    return self._related_training_data(question)["documentation"]
+
+  def get_similar_question_sql(self, question: str, **kwargs) -> List[dict]:
+    return self._related_training_data(question)["sql"]
 
   def get_training_data(self, **kwargs) -> pd.DataFrame:
     # This will be a simple example pulling all data from an index
@@ -312,10 +380,9 @@ class OpenSearch_VectorStore(VannaBase):
     data = []
     response = self.client.search(
       index=self.document_index,
-      body={"query": {"match_all": {}}},
+      body={"query": {"match_all": {}}, "_source": ["doc"]},
       size=1000
     )
-    print(query)
     # records = [hit['_source'] for hit in response['hits']['hits']]
     for hit in response['hits']['hits']:
       data.append(
@@ -329,7 +396,7 @@ class OpenSearch_VectorStore(VannaBase):
 
     response = self.client.search(
       index=self.question_sql_index,
-      body={"query": {"match_all": {}}},
+      body={"query": {"match_all": {}}, "_source": ["question", "sql"]},
       size=1000
     )
     # records = [hit['_source'] for hit in response['hits']['hits']]
@@ -345,7 +412,7 @@ class OpenSearch_VectorStore(VannaBase):
 
     response = self.client.search(
       index=self.ddl_index,
-      body={"query": {"match_all": {}}},
+      body={"query": {"match_all": {}}, "_source": ["ddl"]},
       size=1000
     )
     # records = [hit['_source'] for hit in response['hits']['hits']]
@@ -375,13 +442,9 @@ class OpenSearch_VectorStore(VannaBase):
       else:
         return False
     except Exception as e:
-      print("Error deleting training dataError deleting training data: ", e)
+      self.log(title="OpenSearch Error", message=f"Error deleting training data: {e}")
       return False
 
-  def generate_embedding(self, data: str, **kwargs) -> list[float]:
-    # opensearch doesn't need to generate embeddings
-    pass
-
 # OpenSearch_VectorStore.__init__(self, config={'es_urls':
 # "https://opensearch-node.test.com:9200", 'es_encoded_base64': True, 'es_user':
 # "admin", 'es_password': "admin", 'es_verify_certs': True})
@@ -4,6 +4,7 @@ import pandas as pd
 from langchain_community.vectorstores import OpenSearchVectorSearch
 
 from ..base import VannaBase
+from ..embeddings import get_embedding_model
 from ..utils import deterministic_uuid
 
 
@@ -16,8 +17,7 @@ class OpenSearch_Semantic_VectorStore(VannaBase):
     if "embedding_function" in config:
       self.embedding_function = config.get("embedding_function")
     else:
-      from langchain_huggingface import HuggingFaceEmbeddings
-      self.embedding_function = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+      self.embedding_function = get_embedding_model("huggingface", "all-MiniLM-L6-v2")
 
     self.n_results_sql = config.get("n_results_sql", config.get("n_results", 10))
     self.n_results_documentation = config.get("n_results_documentation", config.get("n_results", 10))
@@ -4,11 +4,9 @@ from typing import List, Optional, Tuple
 
 import oracledb
 import pandas as pd
-from chromadb.utils import embedding_functions
 
 from ..base import VannaBase
-
-default_ef = embedding_functions.DefaultEmbeddingFunction()
+from ..embeddings import get_embedding_model
 
 
 class Oracle_VectorStore(VannaBase):
@@ -16,18 +14,18 @@ class Oracle_VectorStore(VannaBase):
     VannaBase.__init__(self, config=config)
 
     if config is not None:
-      self.embedding_function = config.get(
-        "embedding_function",
-        default_ef
-      )
+      self.embedding_function = config.get("embedding_function")
       self.pre_delete_collection = config.get("pre_delete_collection",
                                               False)
       self.cmetadata = config.get("cmetadata", {"created_by": "oracle"})
     else:
-      self.embedding_function = default_ef
+      self.embedding_function = None
       self.pre_delete_collection = False
       self.cmetadata = {"created_by": "oracle"}
 
+    if self.embedding_function is None:
+      self.embedding_function = get_embedding_model("chromadb_default")
+
     self.oracle_conn = oracledb.connect(dsn=config.get("dsn"))
     self.oracle_conn.call_timeout = 30000
     self.documentation_collection = "documentation"
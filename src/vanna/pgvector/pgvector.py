@@ -1,4 +1,3 @@
-import ast
 import json
 import logging
 import uuid
@@ -10,6 +9,7 @@ from sqlalchemy import create_engine, text
 
 from .. import ValidationError
 from ..base import VannaBase
+from ..embeddings import get_embedding_model
 from ..types import TrainingPlan, TrainingPlanItem
 
 
@@ -25,28 +25,128 @@ class PG_VectorStore(VannaBase):
             self.connection_string = config.get("connection_string")
             self.n_results = config.get("n_results", 10)
 
+        # One pooled engine is shared by the langchain collections and the native queries below
+        self.engine = create_engine(
+            self.connection_string,
+            pool_size=config.get("pool_size", 5),
+            pool_pre_ping=True,
+        )
+        # "hnsw", "ivfflat" or None to skip creating a vector index
+        self.vector_index = config.get("vector_index", "hnsw")
+        self.embedding_dim = config.get("embedding_dim")
+        self.hnsw_m = config.get("hnsw_m", 16)
+        self.hnsw_ef_construction = config.get("hnsw_ef_construction", 64)
+        self.hnsw_ef_search = config.get("hnsw_ef_search")
+        self.ivfflat_lists = config.get("ivfflat_lists", 100)
+        self.ivfflat_probes = config.get("ivfflat_probes")
+
         if config and "embedding_function" in config:
             self.embedding_function = config.get("embedding_function")
         else:
-            from langchain_huggingface import HuggingFaceEmbeddings
-            self.embedding_function = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+            self.embedding_function = get_embedding_model("huggingface", "all-MiniLM-L6-v2")
 
         self.sql_collection = PGVector(
             embeddings=self.embedding_function,
             collection_name="sql",
-            connection=self.connection_string,
+            connection=self.engine,
         )
         self.ddl_collection = PGVector(
             embeddings=self.embedding_function,
             collection_name="ddl",
-            connection=self.connection_string,
+            connection=self.engine,
         )
         self.documentation_collection = PGVector(
             embeddings=self.embedding_function,
             collection_name="documentation",
-            connection=self.connection_string,
+            connection=self.engine,
         )
 
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                text(
+                    "SELECT name, uuid FROM langchain_pg_collection "
+                    "WHERE name IN ('sql', 'ddl', 'documentation')"
+                )
+            ).fetchall()
+        self.collection_ids = {name: str(collection_id) for name, collection_id in rows}
+
+        self._create_indexes()
+
+    def _vector_expression(self) -> str:
+        # langchain creates the embedding column without a dimension, which pgvector indexes require
+        return f"(embedding::vector({int(self.embedding_dim)}))"
+
+    def _create_indexes(self):
+        statements = [
+            # Deletes and lookups filter on the training data id stored in the metadata
+            "CREATE INDEX IF NOT EXISTS langchain_pg_embedding_vanna_id_idx "
+            "ON langchain_pg_embedding ((cmetadata->>'id'))"
+        ]
+
+        if self.vector_index is not None:
+            if self.vector_index not in ("hnsw", "ivfflat"):
+                raise ValueError(f"Unsupported vector_index was set in config: {self.vector_index}")
+
+            if self.embedding_dim is None:
+                self.embedding_dim = len(self.embedding_function.embed_query("vanna"))
+
+            if self.vector_index == "hnsw":
+                options = f"WITH (m = {int(self.hnsw_m)}, ef_construction = {int(self.hnsw_ef_construction)})"
+            else:
+                options = f"WITH (lists = {int(self.ivfflat_lists)})"
+
+            # One partial index per collection, so filtering on the collection doesn't cut the nearest neighbours short
+            for name, collection_id in self.collection_ids.items():
+                statements.append(
+                    f"CREATE INDEX IF NOT EXISTS langchain_pg_embedding_vanna_{name}_{self.vector_index}_idx "
+                    f"ON langchain_pg_embedding USING {self.vector_index} "
+                    f"({self._vector_expression()} vector_cosine_ops) {options} "
+                    f"WHERE collection_id = '{collection_id}'"
+                )
+
+        for statement in statements:
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(text(statement))
+            except Exception as e:
+                logging.error(f"Could not create index: {e}")
+
+    def _related_training_data(self, question: str) -> dict:
+        return self._shared_related_training_data(question, lambda: self._query_related_training_data(question))
+
+    def _query_related_training_data(self, question: str) -> dict:
+        embedding = self.embedding_function.embed_query(question)
+        vector_type = f"vector({len(embedding)})"
+
+        # Top-k for all three collections in one round trip, each ranked by cosine distance like PGVector
+        subqueries = [
+            f"(SELECT '{name}' AS training_data_type, document "
+            f"FROM langchain_pg_embedding WHERE collection_id = '{collection_id}' "
+            f"ORDER BY embedding::{vector_type} <=> CAST(:embedding AS {vector_type}) LIMIT :k)"
+            for name, collection_id in self.collection_ids.items()
+        ]
+
+        related = {"sql": [], "ddl": [], "documentation": []}
+        with self.engine.begin() as connection:
+            if self.hnsw_ef_search is not None:
+                connection.execute(
+                    text("SELECT set_config('hnsw.ef_search', :value, true)"), {"value": str(self.hnsw_ef_search)}
+                )
+            if self.ivfflat_probes is not None:
+                connection.execute(
+                    text("SELECT set_config('ivfflat.probes', :value, true)"), {"value": str(self.ivfflat_probes)}
+                )
+
+            rows = connection.execute(
+                text(" UNION ALL ".join(subqueries)),
+                {"embedding": "[" + ",".join(str(float(value)) for value in embedding) + "]", "k": self.n_results},
+            ).fetchall()
+
+        for training_data_type, document in rows:
+            related[training_data_type].append(document)
+        related["sql"] = [json.loads(document) for document in related["sql"]]
+        return related
+
     def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
         question_sql_json = json.dumps(
             {
@@ -83,6 +183,97 @@ class PG_VectorStore(VannaBase):
         self.documentation_collection.add_documents([doc], ids=[doc.metadata["id"]])
         return _id
 
+    def _add_documents_batch(self, collection, documents: list, item_type: str, embeddings=None, metadatas=None, **kwargs) -> list:
+        # PGVector.add_documents embeds the whole batch with one embed_documents call and writes it in one insert
+        for doc, metadata in zip(documents, metadatas or []):
+            if metadata:
+                doc.metadata["metadata"] = metadata
+
+        ids = []
+        items = list(zip(documents, embeddings or [None] * len(documents)))
+        for batch in self._iter_training_batches(items, **kwargs):
+            batch_documents = [doc for doc, _ in batch]
+            batch_ids = [doc.metadata["id"] for doc in batch_documents]
+            if embeddings is None:
+                collection.add_documents(batch_documents, ids=batch_ids)
+            else:
+                collection.add_embeddings(
+                    texts=[doc.page_content for doc in batch_documents],
+                    embeddings=[embedding for _, embedding in batch],
+                    metadatas=[doc.metadata for doc in batch_documents],
+                    ids=batch_ids,
+                )
+            ids += batch_ids
+            self._log_training_progress(item_type, len(ids), len(documents))
+
+        return ids
+
+    def add_question_sql_batch(self, question_sql_list: list, ids: list = None, **kwargs) -> list:
+        if ids is None:
+            ids = [str(uuid.uuid4()) + "-sql" for _ in question_sql_list]
+
+        documents = []
+        for id, item in zip(ids, question_sql_list):
+            question_sql_json = json.dumps(
+                {
+                    "question": item["question"],
+                    "sql": item["sql"],
+                },
+                ensure_ascii=False,
+            )
+            documents.append(
+                Document(
+                    page_content=question_sql_json,
+                    metadata={"id": id, "createdat": item.get("createdat")},
+                )
+            )
+        return self._add_documents_batch(self.sql_collection, documents, "question-SQL pairs", **kwargs)
+
+    def add_ddl_batch(self, ddl_list: list, ids: list = None, **kwargs) -> list:
+        if ids is None:
+            ids = [str(uuid.uuid4()) + "-ddl" for _ in ddl_list]
+
+        documents = [Document(page_content=ddl, metadata={"id": id}) for id, ddl in zip(ids, ddl_list)]
+        return self._add_documents_batch(self.ddl_collection, documents, "DDL statements", **kwargs)
+
+    def add_documentation_batch(self, documentation_list: list, ids: list = None, **kwargs) -> list:
+        if ids is None:
+            ids = [str(uuid.uuid4()) + "-doc" for _ in documentation_list]
+
+        documents = [
+            Document(page_content=documentation, metadata={"id": id})
+            for id, documentation in zip(ids, documentation_list)
+        ]
+        return self._add_documents_batch(
+            self.documentation_collection, documents, "documentation entries", **kwargs
+        )
+
+    def get_training_data_vectors(self, ids: list) -> dict:
+        if not ids:
+            return {}
+
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                text(
+                    "SELECT cmetadata->>'id', embedding::text FROM langchain_pg_embedding "
+                    "WHERE cmetadata->>'id' = ANY(:ids)"
+                ),
+                {"ids": list(ids)},
+            ).fetchall()
+        return {id: json.loads(embedding) for id, embedding in rows}
+
+    def get_training_data_metadata(self, training_data_type: str, key: str, **kwargs) -> dict:
+        suffix = {"sql": "-sql", "ddl": "-ddl", "documentation": "-doc"}[training_data_type]
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                text(
+                    "SELECT cmetadata->>'id', cmetadata->'metadata' FROM langchain_pg_embedding "
+                    "WHERE cmetadata->>'id' LIKE :suffix AND cmetadata->'metadata'->:key IS NOT NULL"
+                ),
+                {"suffix": f"%{suffix}", "key": key},
+            ).fetchall()
+        return {id: metadata for id, metadata in rows}
+
     def get_collection(self, collection_name):
         match collection_name:
             case "sql":
@@ -94,17 +285,15 @@ class PG_VectorStore(VannaBase):
             case _:
                 raise ValueError("Specified collection does not exist.")
 
-    def get_similar_question_sql(self, question: str) -> list:
-        documents = self.sql_collection.similarity_search(query=question, k=self.n_results)
-        return [ast.literal_eval(document.page_content) for document in documents]
+    # The three lookups for a question share one embedding and one query
+    def get_similar_question_sql(self, question: str, **kwargs) -> list:
+        return self._related_training_data(question)["sql"]
 
     def get_related_ddl(self, question: str, **kwargs) -> list:
-        documents = self.ddl_collection.similarity_search(query=question, k=self.n_results)
-        return [document.page_content for document in documents]
+        return self._related_training_data(question)["ddl"]
 
     def get_related_documentation(self, question: str, **kwargs) -> list:
-        documents = self.documentation_collection.similarity_search(query=question, k=self.n_results)
-        return [document.page_content for document in documents]
+        return self._related_training_data(question)["documentation"]
 
     def train(
         self,
@@ -130,21 +319,30 @@ class PG_VectorStore(VannaBase):
             return self.add_ddl(ddl)
 
         if plan:
-            for item in plan._plan:
-                if item.item_type == TrainingPlanItem.ITEM_TYPE_DDL:
-                    self.add_ddl(item.item_value)
-                elif item.item_type == TrainingPlanItem.ITEM_TYPE_IS:
-                    self.add_documentation(item.item_value)
-                elif item.item_type == TrainingPlanItem.ITEM_TYPE_SQL and item.item_name:
-                    self.add_question_sql(question=item.item_name, sql=item.item_value)
+            ddl_list = [
+                item.item_value for item in plan._plan
+                if item.item_type == TrainingPlanItem.ITEM_TYPE_DDL
+            ]
+            documentation_list = [
+                item.item_value for item in plan._plan
+                if item.item_type == TrainingPlanItem.ITEM_TYPE_IS
+            ]
+            question_sql_list = [
+                {"question": item.item_name, "sql": item.item_value} for item in plan._plan
+                if item.item_type == TrainingPlanItem.ITEM_TYPE_SQL and item.item_name
+            ]
+
+            if ddl_list:
+                self.add_ddl_batch(ddl_list)
+            if documentation_list:
+                self.add_documentation_batch(documentation_list)
+            if question_sql_list:
+                self.add_question_sql_batch(question_sql_list)
 
     def get_training_data(self, **kwargs) -> pd.DataFrame:
-        # Establishing the connection
-        engine = create_engine(self.connection_string)
-
         # Querying the 'langchain_pg_embedding' table
         query_embedding = "SELECT cmetadata, document FROM langchain_pg_embedding"
-        df_embedding = pd.read_sql(query_embedding, engine)
+        df_embedding = pd.read_sql(query_embedding, self.engine)
 
         # List to accumulate the processed rows
         processed_rows = []
@@ -158,10 +356,10 @@ class PG_VectorStore(VannaBase):
             if training_data_type == "sql":
                 # Convert the document string to a dictionary
                 try:
-                    doc_dict = ast.literal_eval(document)
+                    doc_dict = json.loads(document)
                     question = doc_dict.get("question")
                     content = doc_dict.get("sql")
-                except (ValueError, SyntaxError):
+                except ValueError:
                     logging.info(f"Skipping row with custom_id {custom_id} due to parsing error.")
                     continue
             elif training_data_type in ["documentation", "ddl"]:
@@ -183,9 +381,6 @@ class PG_VectorStore(VannaBase):
         return df_processed
 
     def remove_training_data(self, id: str, **kwargs) -> bool:
-        # Create the database engine
-        engine = create_engine(self.connection_string)
-
         # SQL DELETE statement
         delete_statement = text(
             """
@@ -195,7 +390,7 @@ class PG_VectorStore(VannaBase):
         )
 
         # Connect to the database and execute the delete statement
-        with engine.connect() as connection:
+        with self.engine.connect() as connection:
             # Start a transaction
             with connection.begin() as transaction:
                 try:
@@ -211,8 +406,6 @@ class PG_VectorStore(VannaBase):
                     return False
 
     def remove_collection(self, collection_name: str) -> bool:
-        engine = create_engine(self.connection_string)
-
         # Determine the suffix to look for based on the collection name
         suffix_map = {"ddl": "ddl", "sql": "sql", "documentation": "doc"}
         suffix = suffix_map.get(collection_name)
@@ -230,7 +423,7 @@ class PG_VectorStore(VannaBase):
         )
 
         # Execute the deletion within a transaction block
-        with engine.connect() as connection:
+        with self.engine.connect() as connection:
             with connection.begin() as transaction:
                 try:
                     result = connection.execute(query)
@@ -249,5 +442,8 @@ class PG_VectorStore(VannaBase):
                     transaction.rollback()  # Rollback in case of error
                     return False
 
-    def generate_embedding(self, *args, **kwargs):
-        pass
+    def generate_embedding(self, data: str, **kwargs) -> list:
+        return self.embedding_function.embed_query(data)
+
+    def generate_embeddings(self, data: list, **kwargs) -> list:
+        return self.embedding_function.embed_documents(data)
@@ -1,13 +1,13 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
 from pinecone import Pinecone, PodSpec, ServerlessSpec
 import pandas as pd
 from ..base import VannaBase
+from ..embeddings import get_embedding_model
 from ..utils import deterministic_uuid
 
-from fastembed import TextEmbedding
-
 
 class PineconeDB_VectorStore(VannaBase):
     """
@@ -109,40 +109,7 @@ class PineconeDB_VectorStore(VannaBase):
     def _get_indexes(self) -> list:
         return [index["name"] for index in self._client.list_indexes()]
 
-    def _check_if_embedding_exists(self, id: str, namespace: str) -> bool:
-        fetch_response = self.Index.fetch(ids=[id], namespace=namespace)
-        if fetch_response.vectors == {}:
-            return False
-        return True
-
-    def add_ddl(self, ddl: str, **kwargs) -> str:
-        id = deterministic_uuid(ddl) + "-ddl"
-        if self._check_if_embedding_exists(id=id, namespace=self.ddl_namespace):
-            print(f"DDL with id: {id} already exists in the index. Skipping...")
-            return id
-        self.Index.upsert(
-            vectors=[(id, self.generate_embedding(ddl), {"ddl": ddl})],
-            namespace=self.ddl_namespace,
-        )
-        return id
-
-    def add_documentation(self, doc: str, **kwargs) -> str:
-        id = deterministic_uuid(doc) + "-doc"
-
-        if self._check_if_embedding_exists(
-            id=id, namespace=self.documentation_namespace
-        ):
-            print(
-                f"Documentation with id: {id} already exists in the index. Skipping..."
-            )
-            return id
-        self.Index.upsert(
-            vectors=[(id, self.generate_embedding(doc), {"documentation": doc})],
-            namespace=self.documentation_namespace,
-        )
-        return id
-
-    def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
+    def _question_sql_vector(self, question: str, sql: str) -> tuple:
         question_sql_json = json.dumps(
             {
                 "question": question,
@@ -150,67 +117,106 @@ class PineconeDB_VectorStore(VannaBase):
             },
             ensure_ascii=False,
         )
-        id = deterministic_uuid(question_sql_json) + "-sql"
-        if self._check_if_embedding_exists(id=id, namespace=self.sql_namespace):
-            print(
-                f"Question-SQL with id: {id} already exists in the index. Skipping..."
+        return deterministic_uuid(question_sql_json) + "-sql", question_sql_json, {"sql": question_sql_json}
+
+    # Upserts are idempotent on the deterministic ids, so existing training data isn't fetched first
+    def add_ddl(self, ddl: str, **kwargs) -> str:
+        return self.add_ddl_batch([ddl], **kwargs)[0]
+
+    def add_documentation(self, doc: str, **kwargs) -> str:
+        return self.add_documentation_batch([doc], **kwargs)[0]
+
+    def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
+        return self.add_question_sql_batch([{"question": question, "sql": sql}], **kwargs)[0]
+
+    def _upsert_batch(
+        self, namespace: str, vectors: List[tuple], item_type: str, ids=None, embeddings=None, metadatas=None, **kwargs
+    ) -> List[str]:
+        # vectors are (id, text to embed, metadata) tuples
+        if metadatas is not None:
+            raise ValueError("Pinecone training data can't be read back by metadata, so metadatas can't be stored")
+        if ids is not None:
+            vectors = [(id, text, metadata) for id, (_, text, metadata) in zip(ids, vectors)]
+
+        added = []
+        items = list(zip(vectors, embeddings or [None] * len(vectors)))
+        for batch in self._iter_training_batches(items, **kwargs):
+            # Identical items in one batch collapse to a single vector
+            unique = {id: (text, metadata, embedding) for (id, text, metadata), embedding in batch}
+            if embeddings is None:
+                batch_embeddings = self.generate_embeddings([text for text, _, _ in unique.values()])
+            else:
+                batch_embeddings = [embedding for _, _, embedding in unique.values()]
+            self.Index.upsert(
+                vectors=[
+                    (id, embedding, metadata)
+                    for (id, (_, metadata, _)), embedding in zip(unique.items(), batch_embeddings)
+                ],
+                namespace=namespace,
             )
-            return id
-        self.Index.upsert(
-            vectors=[
-                (
-                    id,
-                    self.generate_embedding(question_sql_json),
-                    {"sql": question_sql_json},
-                )
-            ],
-            namespace=self.sql_namespace,
+            added += [id for (id, _, _), _ in batch]
+            self._log_training_progress(item_type, len(added), len(vectors))
+
+        return added
+
+    def add_ddl_batch(self, ddl_list: List[str], **kwargs) -> List[str]:
+        vectors = [
+            (deterministic_uuid(ddl) + "-ddl", ddl, {"ddl": ddl}) for ddl in ddl_list
+        ]
+        return self._upsert_batch(self.ddl_namespace, vectors, "DDL statements", **kwargs)
+
+    def add_documentation_batch(self, documentation_list: List[str], **kwargs) -> List[str]:
+        vectors = [
+            (deterministic_uuid(doc) + "-doc", doc, {"documentation": doc})
+            for doc in documentation_list
+        ]
+        return self._upsert_batch(
+            self.documentation_namespace, vectors, "documentation entries", **kwargs
         )
-        return id
+
+    def add_question_sql_batch(self, question_sql_list: List[dict], **kwargs) -> List[str]:
+        vectors = [self._question_sql_vector(item["question"], item["sql"]) for item in question_sql_list]
+        return self._upsert_batch(self.sql_namespace, vectors, "question-SQL pairs", **kwargs)
+
+    def _related_training_data(self, question: str) -> dict:
+        return self._shared_related_training_data(question, lambda: self._query_related_training_data(question))
+
+    def _query_related_training_data(self, question: str) -> dict:
+        # Embed the question once and query the three namespaces concurrently, returning metadata but no vectors
+        embedding = self.generate_embedding(question)
+        namespaces = {
+            "sql": self.sql_namespace,
+            "ddl": self.ddl_namespace,
+            "documentation": self.documentation_namespace,
+        }
+
+        def query(namespace):
+            res = self.Index.query(
+                namespace=namespace,
+                vector=embedding,
+                top_k=self.n_results,
+                include_values=False,
+                include_metadata=True,
+            )
+            return res["matches"] if res else []
+
+        with ThreadPoolExecutor(max_workers=len(namespaces)) as executor:
+            sql_matches, ddl_matches, documentation_matches = executor.map(query, namespaces.values())
+
+        return {
+            "sql": [json.loads(match["metadata"]["sql"]) for match in sql_matches],
+            "ddl": [match["metadata"]["ddl"] for match in ddl_matches],
+            "documentation": [match["metadata"]["documentation"] for match in documentation_matches],
+        }
 
     def get_related_ddl(self, question: str, **kwargs) -> list:
-        res = self.Index.query(
-            namespace=self.ddl_namespace,
-            vector=self.generate_embedding(question),
-            top_k=self.n_results,
-            include_values=True,
-            include_metadata=True,
-        )
-        return [match["metadata"]["ddl"] for match in res["matches"]] if res else []
+        return self._related_training_data(question)["ddl"]
 
     def get_related_documentation(self, question: str, **kwargs) -> list:
-        res = self.Index.query(
-            namespace=self.documentation_namespace,
-            vector=self.generate_embedding(question),
-            top_k=self.n_results,
-            include_values=True,
-            include_metadata=True,
-        )
-        return (
-            [match["metadata"]["documentation"] for match in res["matches"]]
-            if res
-            else []
-        )
+        return self._related_training_data(question)["documentation"]
 
     def get_similar_question_sql(self, question: str, **kwargs) -> list:
-        res = self.Index.query(
-            namespace=self.sql_namespace,
-            vector=self.generate_embedding(question),
-            top_k=self.n_results,
-            include_values=True,
-            include_metadata=True,
-        )
-        return (
-            [
-                {
-                    key: value
-                    for key, value in json.loads(match["metadata"]["sql"]).items()
-                }
-                for match in res["matches"]
-            ]
-            if res
-            else []
-        )
+        return self._related_training_data(question)["sql"]
 
     def get_training_data(self, **kwargs) -> pd.DataFrame:
         # Pinecone does not support getting all vectors in a namespace, so we have to query for the top_k vectors with a dummy vector
@@ -225,7 +231,7 @@ class PineconeDB_VectorStore(VannaBase):
             data = self.Index.query(
                 top_k=10000,  # max results that pinecone allows
                 namespace=namespace,
-                include_values=True,
+                include_values=False,
                 include_metadata=True,
                 vector=[0.0] * self.dimensions,
             )
@@ -270,6 +276,10 @@ class PineconeDB_VectorStore(VannaBase):
             return False
 
     def generate_embedding(self, data: str, **kwargs) -> List[float]:
-        embedding_model = TextEmbedding(model_name=self.fastembed_model)
+        embedding_model = get_embedding_model("fastembed", self.fastembed_model)
         embedding = next(embedding_model.embed(data))
         return embedding.tolist()
+
+    def generate_embeddings(self, data: List[str], **kwargs) -> List[List[float]]:
+        embedding_model = get_embedding_model("fastembed", self.fastembed_model)
+        return [embedding.tolist() for embedding in embedding_model.embed(data)]
@@ -1,13 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
 from functools import cached_property
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 from qdrant_client import QdrantClient, grpc, models
 
 from ..base import VannaBase
+from ..embeddings import get_embedding_model
 from ..utils import deterministic_uuid
 
 SCROLL_SIZE = 1000
+TENANT_FIELD = "tenant"
 
 
 class Qdrant_VectorStore(VannaBase):
@@ -20,6 +23,7 @@ class Qdrant_VectorStore(VannaBase):
             - location: If `":memory:"` - use in-memory Qdrant instance. If `str` - use it as a `url` parameter.
             - url: Either host or str of "Optional[scheme], host, Optional[port], Optional[prefix]". Eg. `"http://localhost:6333"`.
             - prefer_grpc: If `true` - use gPRC interface whenever possible in custom methods.
+            - grpc_port: Port of the gRPC interface. Defaults to 6334.
             - https: If `true` - use HTTPS(SSL) protocol. Default: `None`
             - api_key: API key for authentication in Qdrant Cloud. Default: `None`
             - timeout: Timeout for REST and gRPC API requests. Defaults to 5 seconds for REST and unlimited for gRPC.
@@ -33,6 +37,15 @@ class Qdrant_VectorStore(VannaBase):
             - documentation_collection_name: Name of the collection to store documentation. Defaults to `"documentation"`.
             - ddl_collection_name: Name of the collection to store DDL. Defaults to `"ddl"`.
             - sql_collection_name: Name of the collection to store SQL. Defaults to `"sql"`.
+            - on_disk: If `true` - keep the vectors of new collections on disk instead of in RAM. Defaults to `False`.
+            - on_disk_payload: If `true` - keep the payloads of new collections on disk. Defaults to `False`.
+            - quantization: `"scalar"`, `"binary"`, `"product"` or a `qdrant_client.models.QuantizationConfig` to quantize the vectors of new collections. Defaults to `None`.
+            - quantization_rescore: If `true` - rescore quantized results with the original vectors. Defaults to `True`.
+            - quantization_oversampling: How many more candidates to fetch before rescoring quantized results. Defaults to `None`.
+            - hnsw_ef: Size of the HNSW candidate list at search time. Defaults to the collection's setting.
+            - tenant_partitioning: `"payload"` to keep each tenant's points under a tenant payload index, or `"shard"` to give each tenant its own shard key
+              (needs a distributed Qdrant deployment). Add, retrieval, count and remove calls then take a `tenant=` argument. Defaults to `None`.
+            - default_tenant: The tenant of calls that don't pass one when `tenant_partitioning` is set. Defaults to `"default"`.
 
     Raises:
         TypeError: If config["client"] is not a `qdrant_client.QdrantClient` instance
@@ -50,6 +63,7 @@ class Qdrant_VectorStore(VannaBase):
                 location=config.get("location", None),
                 url=config.get("url", None),
                 prefer_grpc=config.get("prefer_grpc", False),
+                grpc_port=config.get("grpc_port", 6334),
                 https=config.get("https", None),
                 api_key=config.get("api_key", None),
                 timeout=config.get("timeout", None),
@@ -78,6 +92,18 @@ class Qdrant_VectorStore(VannaBase):
             "sql_collection_name", "sql"
         )
 
+        self.on_disk = config.get("on_disk", False)
+        self.on_disk_payload = config.get("on_disk_payload", False)
+        self.quantization = config.get("quantization", None)
+        self.quantization_rescore = config.get("quantization_rescore", True)
+        self.quantization_oversampling = config.get("quantization_oversampling", None)
+        self.hnsw_ef = config.get("hnsw_ef", None)
+        self.tenant_partitioning = config.get("tenant_partitioning", None)
+        if self.tenant_partitioning not in (None, "payload", "shard"):
+            raise ValueError(f"Unsupported tenant_partitioning was set in config: {self.tenant_partitioning}")
+        self.default_tenant = config.get("default_tenant", "default")
+        self._tenant_shard_keys = set()
+
         self.id_suffixes = {
             self.ddl_collection_name: "ddl",
             self.documentation_collection_name: "doc",
@@ -86,64 +112,93 @@ class Qdrant_VectorStore(VannaBase):
 
         self._setup_collections()
 
+    # Single additions go through the batch path, so both place points with the tenant the same way
     def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
-        question_answer = "Question: {0}\n\nSQL: {1}".format(question, sql)
-        id = deterministic_uuid(question_answer)
+        return self.add_question_sql_batch([{"question": question, "sql": sql}], **kwargs)[0]
+
+    def add_ddl(self, ddl: str, **kwargs) -> str:
+        return self.add_ddl_batch([ddl], **kwargs)[0]
+
+    def add_documentation(self, documentation: str, **kwargs) -> str:
+        return self.add_documentation_batch([documentation], **kwargs)[0]
+
+    def _upsert_batch(
+        self, collection_name: str, texts: List[str], payloads: List[dict], item_type: str, ids=None, embeddings=None, metadatas=None, **kwargs
+    ) -> List[str]:
+        if metadatas is not None:
+            payloads = [
+                {**payload, "metadata": metadata} if metadata else payload
+                for payload, metadata in zip(payloads, metadatas)
+            ]
+        tenant = self._tenant(kwargs)
+        if tenant is not None:
+            payloads = [{**payload, TENANT_FIELD: tenant} for payload in payloads]
+            self._ensure_tenant_shard_key(collection_name, tenant)
+
+        # Imported training data keeps its id; the point id is its uuid part. The same text trained for two
+        # tenants is two points
+        if ids is None:
+            point_ids = [deterministic_uuid(text if tenant is None else f"{tenant}\n{text}") for text in texts]
+        else:
+            point_ids = [id.rsplit("-", 1)[0] for id in ids]
+
+        added = []
+        items = list(zip(point_ids, texts, payloads, embeddings or [None] * len(texts)))
+        for batch in self._iter_training_batches(items, **kwargs):
+            if embeddings is None:
+                batch_embeddings = self._embed([text for _, text, _, _ in batch])
+            else:
+                batch_embeddings = [embedding for _, _, _, embedding in batch]
+
+            self._client.upsert(
+                collection_name,
+                points=[
+                    models.PointStruct(id=id, vector=embedding, payload=payload)
+                    for (id, _, payload, _), embedding in zip(batch, batch_embeddings)
+                ],
+                shard_key_selector=self._shard_key(tenant),
+            )
+
+            added += [self._format_point_id(id, collection_name) for id, _, _, _ in batch]
+            self._log_training_progress(item_type, len(added), len(items))
 
-        self._client.upsert(
+        return added
+
+    def add_question_sql_batch(self, question_sql_list: List[dict], **kwargs) -> List[str]:
+        return self._upsert_batch(
             self.sql_collection_name,
-            points=[
-                models.PointStruct(
-                    id=id,
-                    vector=self.generate_embedding(question_answer),
-                    payload={
-                        "question": question,
-                        "sql": sql,
-                    },
-                )
+            [
+                "Question: {0}\n\nSQL: {1}".format(item["question"], item["sql"])
+                for item in question_sql_list
             ],
+            [{"question": item["question"], "sql": item["sql"]} for item in question_sql_list],
+            "question-SQL pairs",
+            **kwargs,
         )
 
-        return self._format_point_id(id, self.sql_collection_name)
-
-    def add_ddl(self, ddl: str, **kwargs) -> str:
-        id = deterministic_uuid(ddl)
-        self._client.upsert(
+    def add_ddl_batch(self, ddl_list: List[str], **kwargs) -> List[str]:
+        return self._upsert_batch(
             self.ddl_collection_name,
-            points=[
-                models.PointStruct(
-                    id=id,
-                    vector=self.generate_embedding(ddl),
-                    payload={
-                        "ddl": ddl,
-                    },
-                )
-            ],
+            ddl_list,
+            [{"ddl": ddl} for ddl in ddl_list],
+            "DDL statements",
+            **kwargs,
         )
-        return self._format_point_id(id, self.ddl_collection_name)
 
-    def add_documentation(self, documentation: str, **kwargs) -> str:
-        id = deterministic_uuid(documentation)
-
-        self._client.upsert(
+    def add_documentation_batch(self, documentation_list: List[str], **kwargs) -> List[str]:
+        return self._upsert_batch(
             self.documentation_collection_name,
-            points=[
-                models.PointStruct(
-                    id=id,
-                    vector=self.generate_embedding(documentation),
-                    payload={
-                        "documentation": documentation,
-                    },
-                )
-            ],
+            documentation_list,
+            [{"documentation": documentation} for documentation in documentation_list],
+            "documentation entries",
+            **kwargs,
         )
 
-        return self._format_point_id(id, self.documentation_collection_name)
-
     def get_training_data(self, **kwargs) -> pd.DataFrame:
+        tenant = self._tenant(kwargs)
         df = pd.DataFrame()
 
-        if sql_data := self._get_all_points(self.sql_collection_name):
+        if sql_data := self._get_all_points(self.sql_collection_name, tenant):
             question_list = [data.payload["question"] for data in sql_data]
             sql_list = [data.payload["sql"] for data in sql_data]
             id_list = [
@@ -163,7 +218,7 @@ class Qdrant_VectorStore(VannaBase):
 
             df = pd.concat([df, df_sql])
 
-        if ddl_data := self._get_all_points(self.ddl_collection_name):
+        if ddl_data := self._get_all_points(self.ddl_collection_name, tenant):
             ddl_list = [data.payload["ddl"] for data in ddl_data]
             id_list = [
                 self._format_point_id(data.id, self.ddl_collection_name)
@@ -182,7 +237,7 @@ class Qdrant_VectorStore(VannaBase):
 
             df = pd.concat([df, df_ddl])
 
-        if doc_data := self._get_all_points(self.documentation_collection_name):
+        if doc_data := self._get_all_points(self.documentation_collection_name, tenant):
             document_list = [data.payload["documentation"] for data in doc_data]
             id_list = [
                 self._format_point_id(data.id, self.documentation_collection_name)
@@ -203,14 +258,111 @@ class Qdrant_VectorStore(VannaBase):
 
         return df
 
+    def count_training_data(self, training_data_type: str = None, search: str = None, **kwargs) -> int:
+        if search is not None:
+            return super().count_training_data(training_data_type, search, **kwargs)
+
+        # Counted by the server, through the tenant index when partitioned
+        tenant = self._tenant(kwargs)
+        collections = {
+            "sql": self.sql_collection_name,
+            "ddl": self.ddl_collection_name,
+            "documentation": self.documentation_collection_name,
+        }
+        return sum(
+            self._client.count(
+                collection_name,
+                count_filter=self._tenant_filter(tenant),
+                exact=True,
+                shard_key_selector=self._shard_key(tenant),
+            ).count
+            for name, collection_name in collections.items()
+            if training_data_type in (None, name)
+        )
+
+    def get_training_data_metadata(self, training_data_type: str, key: str, **kwargs) -> Dict[str, dict]:
+        collection_name = {
+            "sql": self.sql_collection_name,
+            "ddl": self.ddl_collection_name,
+            "documentation": self.documentation_collection_name,
+        }[training_data_type]
+        records = self._get_all_points(
+            collection_name,
+            self._tenant(kwargs),
+            must_not=[models.IsEmptyCondition(is_empty=models.PayloadField(key=f"metadata.{key}"))],
+            with_payload=["metadata"],
+        )
+        return {self._format_point_id(record.id, collection_name): record.payload["metadata"] for record in records}
+
+    def get_training_data_vectors(self, ids: List[str]) -> Dict[str, List[float]]:
+        point_ids = {}
+        for id in ids:
+            try:
+                point_id, collection_name = self._parse_point_id(id)
+            except ValueError:
+                continue
+            point_ids.setdefault(collection_name, []).append(point_id)
+
+        vectors = {}
+        for collection_name, collection_point_ids in point_ids.items():
+            points = self._client.retrieve(
+                collection_name, ids=collection_point_ids, with_payload=False, with_vectors=True
+            )
+            vectors.update({self._format_point_id(point.id, collection_name): point.vector for point in points})
+        return vectors
+
     def remove_training_data(self, id: str, **kwargs) -> bool:
         try:
             id, collection_name = self._parse_point_id(id)
-            res = self._client.delete(collection_name, points_selector=[id])
+            tenant = self._tenant(kwargs)
+            if tenant is None:
+                points_selector = [id]
+            else:
+                # Only removes the point if it belongs to the tenant
+                tenant_point = models.Filter(must=[models.HasIdCondition(has_id=[id]), *self._tenant_filter(tenant).must])
+                if self.tenant_partitioning == "shard" and not (
+                    (collection_name, tenant) in self._tenant_shard_keys
+                    or self._tenant_shard_key_exists(collection_name, tenant)
+                ):
+                    return False
+                owned = self._client.count(
+                    collection_name, count_filter=tenant_point, exact=True, shard_key_selector=self._shard_key(tenant)
+                ).count
+                if not owned:
+                    return False
+                points_selector = models.FilterSelector(filter=tenant_point)
+            self._client.delete(
+                collection_name, points_selector=points_selector, shard_key_selector=self._shard_key(tenant)
+            )
             return True
         except ValueError:
             return False
 
+    def remove_tenant_training_data(self, tenant: str, **kwargs) -> bool:
+        """
+        Removes all the training data of a tenant.
+
+        Args:
+            tenant (str): The tenant to remove.
+
+        Returns:
+            bool: True if the training data was removed, False if the store isn't partitioned by tenant
+        """
+        if self.tenant_partitioning is None:
+            return False
+
+        for collection_name in self.id_suffixes:
+            if self.tenant_partitioning == "shard":
+                # Dropping the tenant's shard doesn't touch any other tenant's points
+                if (collection_name, tenant) in self._tenant_shard_keys or self._tenant_shard_key_exists(collection_name, tenant):
+                    self._client.delete_shard_key(collection_name, shard_key=tenant)
+                self._tenant_shard_keys.discard((collection_name, tenant))
+            else:
+                self._client.delete(
+                    collection_name, points_selector=models.FilterSelector(filter=self._tenant_filter(tenant))
+                )
+        return True
+
     def remove_collection(self, collection_name: str) -> bool:
         """
         This function can reset the collection to empty state.
@@ -230,47 +382,113 @@ class Qdrant_VectorStore(VannaBase):
 
     @cached_property
     def embeddings_dimension(self):
+        if self.embedding_reducer is not None:
+            return self.embedding_reduction_dim
         return len(self.generate_embedding("ABCDEF"))
 
-    def get_similar_question_sql(self, question: str, **kwargs) -> list:
-        results = self._client.query_points(
-            self.sql_collection_name,
-            query=self.generate_embedding(question),
-            limit=self.n_results,
-            with_payload=True,
-        ).points
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        # Points and queries both go through the configured embedding reduction
+        return self.reduce_embeddings(self.generate_embeddings(texts)).tolist()
 
-        return [dict(result.payload) for result in results]
+    def _search_params(self):
+        quantization = None
+        if self.quantization is not None:
+            quantization = models.QuantizationSearchParams(
+                rescore=self.quantization_rescore,
+                oversampling=self.quantization_oversampling,
+            )
+        if quantization is None and self.hnsw_ef is None:
+            return None
+        return models.SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+    def _tenant(self, kwargs: dict) -> Optional[str]:
+        tenant = kwargs.get("tenant")
+        if self.tenant_partitioning is None:
+            if tenant is not None:
+                raise ValueError("Training data can only be scoped to a tenant with tenant_partitioning set in config")
+            return None
+        return self.default_tenant if tenant is None else tenant
+
+    @staticmethod
+    def _tenant_filter(tenant: Optional[str]) -> Optional[models.Filter]:
+        if tenant is None:
+            return None
+        return models.Filter(must=[models.FieldCondition(key=TENANT_FIELD, match=models.MatchValue(value=tenant))])
+
+    def _shard_key(self, tenant: Optional[str]) -> Optional[str]:
+        return tenant if self.tenant_partitioning == "shard" else None
+
+    def _tenant_shard_key_exists(self, collection_name: str, tenant: str) -> bool:
+        shard_keys = self._client.list_shard_keys(collection_name).shard_keys or []
+        return any(shard_key.key == tenant for shard_key in shard_keys)
+
+    def _ensure_tenant_shard_key(self, collection_name: str, tenant: str):
+        if self.tenant_partitioning != "shard" or (collection_name, tenant) in self._tenant_shard_keys:
+            return
+        if not self._tenant_shard_key_exists(collection_name, tenant):
+            self._client.create_shard_key(collection_name, shard_key=tenant)
+        self._tenant_shard_keys.add((collection_name, tenant))
+
+    def _related_training_data(self, question: str, tenant: Optional[str] = None) -> dict:
+        return self._shared_related_training_data(
+            question, lambda: self._query_related_training_data(question, tenant), tenant=tenant
+        )
 
-    def get_related_ddl(self, question: str, **kwargs) -> list:
-        results = self._client.query_points(
-            self.ddl_collection_name,
-            query=self.generate_embedding(question),
-            limit=self.n_results,
-            with_payload=True,
-        ).points
+    def _query_related_training_data(self, question: str, tenant: Optional[str] = None) -> dict:
+        # Embed the question once and search the three collections concurrently, fetching only the payload fields in use
+        embedding = self._embed([question])[0]
+        search_params = self._search_params()
+        payload_fields = {
+            self.sql_collection_name: ["question", "sql"],
+            self.ddl_collection_name: ["ddl"],
+            self.documentation_collection_name: ["documentation"],
+        }
 
-        return [result.payload["ddl"] for result in results]
+        def query(collection_name):
+            return self._client.query_points(
+                collection_name,
+                query=embedding,
+                limit=self.n_results,
+                with_payload=payload_fields[collection_name],
+                with_vectors=False,
+                search_params=search_params,
+                query_filter=self._tenant_filter(tenant),
+                shard_key_selector=self._shard_key(tenant),
+            ).points
+
+        with ThreadPoolExecutor(max_workers=len(payload_fields)) as executor:
+            sql_results, ddl_results, documentation_results = executor.map(query, payload_fields)
+
+        return {
+            "sql": [dict(result.payload) for result in sql_results],
+            "ddl": [result.payload["ddl"] for result in ddl_results],
+            "documentation": [result.payload["documentation"] for result in documentation_results],
+        }
+
+    def get_similar_question_sql(self, question: str, **kwargs) -> list:
+        return self._related_training_data(question, self._tenant(kwargs))["sql"]
+
+    def get_related_ddl(self, question: str, **kwargs) -> list:
+        return self._related_training_data(question, self._tenant(kwargs))["ddl"]
 
     def get_related_documentation(self, question: str, **kwargs) -> list:
-        results = self._client.query_points(
-            self.documentation_collection_name,
-            query=self.generate_embedding(question),
-            limit=self.n_results,
-            with_payload=True,
-        ).points
+        return self._related_training_data(question, self._tenant(kwargs))["documentation"]
 
-        return [result.payload["documentation"] for result in results]
+    @property
+    def embedding_model(self):
+        return get_embedding_model("fastembed", self.fastembed_model)
 
     def generate_embedding(self, data: str, **kwargs) -> List[float]:
-        embedding_model = self._client._get_or_init_model(
-            model_name=self.fastembed_model
-        )
-        embedding = next(embedding_model.embed(data))
+        return self.generate_embeddings([data])[0]
 
-        return embedding.tolist()
+    def generate_embeddings(self, data: List[str], **kwargs) -> List[List[float]]:
+        return [embedding.tolist() for embedding in self.embedding_model.embed(data)]
+
+    def _get_all_points(self, collection_name: str, tenant: Optional[str] = None, must_not: list = None, with_payload=True):
+        scroll_filter = self._tenant_filter(tenant)
+        if must_not is not None:
+            scroll_filter = models.Filter(must=scroll_filter.must if scroll_filter is not None else None, must_not=must_not)
 
-    def _get_all_points(self, collection_name: str):
         results: List[models.Record] = []
         next_offset = None
         stop_scrolling = False
@@ -279,8 +497,10 @@ class Qdrant_VectorStore(VannaBase):
                 collection_name,
                 limit=SCROLL_SIZE,
                 offset=next_offset,
-                with_payload=True,
+                with_payload=with_payload,
                 with_vectors=False,
+                scroll_filter=scroll_filter,
+                shard_key_selector=self._shard_key(tenant),
             )
             stop_scrolling = next_offset is None or (
                 isinstance(next_offset, grpc.PointId)
@@ -292,35 +512,54 @@ class Qdrant_VectorStore(VannaBase):
 
         return results
 
-    def _setup_collections(self):
-        if not self._client.collection_exists(self.sql_collection_name):
-            self._client.create_collection(
-                collection_name=self.sql_collection_name,
-                vectors_config=models.VectorParams(
-                    size=self.embeddings_dimension,
-                    distance=self.distance_metric,
-                ),
-                **self.collection_params,
-            )
-
-        if not self._client.collection_exists(self.ddl_collection_name):
-            self._client.create_collection(
-                collection_name=self.ddl_collection_name,
-                vectors_config=models.VectorParams(
-                    size=self.embeddings_dimension,
-                    distance=self.distance_metric,
-                ),
-                **self.collection_params,
+    def _quantization_config(self):
+        if self.quantization is None or not isinstance(self.quantization, str):
+            return self.quantization
+        if self.quantization == "scalar":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, always_ram=True)
             )
-        if not self._client.collection_exists(self.documentation_collection_name):
-            self._client.create_collection(
-                collection_name=self.documentation_collection_name,
-                vectors_config=models.VectorParams(
-                    size=self.embeddings_dimension,
-                    distance=self.distance_metric,
-                ),
-                **self.collection_params,
+        if self.quantization == "binary":
+            return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+        if self.quantization == "product":
+            return models.ProductQuantization(
+                product=models.ProductQuantizationConfig(compression=models.CompressionRatio.X16, always_ram=True)
             )
+        raise ValueError(f"Unsupported quantization was set in config: {self.quantization}")
+
+    def _setup_collections(self):
+        collection_params = {
+            "on_disk_payload": self.on_disk_payload,
+            "quantization_config": self._quantization_config(),
+        }
+        if self.tenant_partitioning == "payload":
+            # Per-tenant HNSW graphs instead of one global graph, as every search filters by tenant
+            collection_params["hnsw_config"] = models.HnswConfigDiff(payload_m=16, m=0)
+        elif self.tenant_partitioning == "shard":
+            collection_params["sharding_method"] = models.ShardingMethod.CUSTOM
+        collection_params.update(self.collection_params)
+
+        for collection_name in [
+            self.sql_collection_name,
+            self.ddl_collection_name,
+            self.documentation_collection_name,
+        ]:
+            if not self._client.collection_exists(collection_name):
+                self._client.create_collection(
+                    collection_name=collection_name,
+                    vectors_config=models.VectorParams(
+                        size=self.embeddings_dimension,
+                        distance=self.distance_metric,
+                        on_disk=self.on_disk,
+                    ),
+                    **collection_params,
+                )
+            if self.tenant_partitioning == "payload":
+                self._client.create_payload_index(
+                    collection_name,
+                    field_name=TENANT_FIELD,
+                    field_schema=models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True),
+                )
 
     def _format_point_id(self, id: str, collection_name: str) -> str:
         return "{0}-{1}".format(id, self.id_suffixes[collection_name])
@@ -0,0 +1,81 @@
+import json
+import os
+import struct
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .utils import atomic_write
+
+# A snapshot file is the magic bytes, the length of a JSON header, the header, and then every array at a
+# 64-byte aligned offset so it can be memory-mapped in place
+SNAPSHOT_MAGIC = b"VANNASNP"
+SNAPSHOT_VERSION = 1
+_ALIGNMENT = 64
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def write_snapshot(path: str, header: dict, arrays: Dict[str, np.ndarray]) -> None:
+    """
+    Writes `header` and `arrays` to a single snapshot file. The file is written next to `path` and renamed over
+    it, so readers never see a partial snapshot.
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        if array.dtype.hasobject:
+            raise ValueError(f"Snapshot array {name} has dtype object, which can't be memory-mapped")
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _aligned(offset + array.nbytes)
+
+    encoded = json.dumps({**header, "version": SNAPSHOT_VERSION, "arrays": layout}, ensure_ascii=False).encode("utf-8")
+    data_start = _aligned(len(SNAPSHOT_MAGIC) + 8 + len(encoded))
+
+    with atomic_write(path) as tmp_path, open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC + struct.pack("<Q", len(encoded)) + encoded)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+
+
+def _read_header(f) -> Tuple[dict, int]:
+    if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        raise ValueError("Not a Vanna snapshot")
+    (length,) = struct.unpack("<Q", f.read(8))
+    header = json.loads(f.read(length).decode("utf-8"))
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {header.get('version')}, expected {SNAPSHOT_VERSION}")
+    return header, _aligned(len(SNAPSHOT_MAGIC) + 8 + length)
+
+
+def read_snapshot_header(path: str) -> Optional[dict]:
+    """
+    Returns the header of the snapshot at `path`, or None if there isn't one.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return _read_header(f)[0]
+
+
+def read_snapshot(path: str) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """
+    Reads the snapshot at `path`. The arrays are read-only memory maps of the file.
+    """
+    with open(path, "rb") as f:
+        header, data_start = _read_header(f)
+
+    arrays = {}
+    for name, layout in header.pop("arrays").items():
+        dtype, shape = np.dtype(layout["dtype"]), tuple(layout["shape"])
+        if int(np.prod(shape)) == 0:
+            # Empty arrays can't be mapped
+            arrays[name] = np.zeros(shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=data_start + layout["offset"], shape=shape)
+    return header, arrays
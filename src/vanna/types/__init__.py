@@ -211,6 +211,24 @@ class TrainingData:
     documentation: List[str]
 
 
+@dataclass
+class SQLCostEstimate:
+    dialect: str
+    estimated_rows: float | None
+    estimated_cost: float | None
+    estimated_bytes: int | None
+    cartesian_join: bool
+    plan: str
+
+
+@dataclass
+class SchemaSyncDiff:
+    added: List[str]
+    changed: List[str]
+    removed: List[str]
+    unchanged: int
+
+
 @dataclass
 class TrainingPlanItem:
     item_type: str
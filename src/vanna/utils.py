@@ -1,11 +1,25 @@
 import hashlib
+import json
 import os
 import re
+import tempfile
+import threading
 import uuid
-from typing import Union
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from .exceptions import ImproperlyConfigured, ValidationError
 
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where file_lock doesn't lock
+    fcntl = None
+
 
 def validate_config_path(path):
     if not os.path.exists(path):
@@ -75,3 +89,136 @@ def deterministic_uuid(content: Union[str, bytes]) -> str:
     content_uuid = str(uuid.uuid5(namespace, hash_hex))
 
     return content_uuid
+
+
+@contextmanager
+def atomic_write(path: str) -> Iterator[str]:
+    """Yields a temporary path to write the new contents of `path` to, and renames it over `path` when the block
+    exits without an error. Readers never see a partial file and concurrent writers never share a temporary file.
+
+    Args:
+        path: The file to replace.
+
+    Returns:
+        The temporary path, in the same directory as `path`.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Holds an exclusive advisory lock on the file at `path`, creating it if needed, to serialize writers in
+    different processes. The lock isn't reentrant.
+
+    Args:
+        path: The lock file.
+    """
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def file_version(path: str) -> Optional[Tuple[int, int, int]]:
+    """Returns the inode, size and modification time of a file. They change whenever the file is replaced through
+    `atomic_write`, so another process's write can be told apart from the version this process read.
+
+    Args:
+        path: The file.
+
+    Returns:
+        The version, or None if the file doesn't exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def read_journal(path: str, offset: int = 0) -> Tuple[List[dict], int]:
+    """Reads the JSON lines records appended to a journal file after `offset`.
+
+    Lines that aren't valid JSON, such as one torn by a crash mid-write, are skipped. A journal shorter than
+    `offset` was truncated since it was last read, so it's read from the start.
+
+    Args:
+        path: The journal file.
+        offset: The byte offset to read from, as returned by the previous call.
+
+    Returns:
+        The records, and the byte offset to pass to the next call.
+    """
+    if not os.path.exists(path):
+        return [], 0
+
+    records = []
+    with open(path, "rb") as f:
+        if offset > os.fstat(f.fileno()).st_size:
+            offset = 0
+        f.seek(offset)
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records, f.tell()
+
+
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+
+def get_http_session(retries: int = 3, backoff_factor: float = 0.5, pool_maxsize: int = 10) -> requests.Session:
+    """Returns a `requests.Session` shared by every caller in the process with the same settings.
+
+    The session keeps connections alive in a pool of `pool_maxsize` per host, asks for gzip-compressed
+    responses and retries connection errors and 429/503 responses with exponential backoff. Those responses
+    mean the server didn't process the request, so retrying is safe for any method. A request that reached the
+    server and failed while reading the response, or got a 502/504 from a gateway, isn't retried, since RPC
+    calls aren't idempotent and the server may have processed it.
+
+    Args:
+        retries: The maximum number of retries per request.
+        backoff_factor: The delay before the first retry, in seconds; it doubles on every retry.
+        pool_maxsize: The maximum number of pooled connections per host.
+
+    Returns:
+        The shared session.
+    """
+    key = (retries, backoff_factor, pool_maxsize)
+    with _http_sessions_lock:
+        session = _http_sessions.get(key)
+        if session is None:
+            retry = Retry(
+                total=retries,
+                connect=retries,
+                read=0,
+                status=retries,
+                status_forcelist=(429, 503),
+                allowed_methods=None,
+                backoff_factor=backoff_factor,
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Accept-Encoding"] = "gzip, deflate"
+            _http_sessions[key] = session
+        return session
@@ -1,9 +1,11 @@
 import dataclasses
 import json
+import threading
+import time
+from collections import OrderedDict
 from io import StringIO
 
 import pandas as pd
-import requests
 
 from ..advanced import VannaAdvanced
 from ..base import VannaBase
@@ -18,7 +20,7 @@ from ..types import (
   StringData,
   TrainingData,
 )
-from ..utils import sanitize_model_name
+from ..utils import get_http_session, sanitize_model_name
 
 
 class VannaDB_VectorStore(VannaBase, VannaAdvanced):
@@ -33,7 +35,20 @@ class VannaDB_VectorStore(VannaBase, VannaAdvanced):
             if config is None or "endpoint" not in config
             else config["endpoint"]
         )
-        self.related_training_data = {}
+        # Related training data fetched with one RPC per question, shared by the three retrieval methods. At most
+        # `related_training_data_cache_size` questions are kept, each for `retrieval_cache_ttl` seconds
+        self.related_training_data = OrderedDict()
+        self.related_training_data_cache_size = self.config.get("related_training_data_cache_size", 128)
+        self._related_training_data_lock = threading.Lock()
+
+        # Every instance in the process shares one pooled keep-alive session. `timeout` is the (connect, read)
+        # timeout in seconds of every request
+        self._timeout = self.config.get("timeout", (10, 120))
+        self._session = get_http_session(
+            retries=self.config.get("max_retries", 3),
+            backoff_factor=self.config.get("retry_backoff_factor", 0.5),
+            pool_maxsize=self.config.get("pool_maxsize", 10),
+        )
         self._graphql_endpoint = "https://functionrag.com/query"
         self._graphql_headers = {
             "Content-Type": "application/json",
@@ -60,7 +75,7 @@ class VannaDB_VectorStore(VannaBase, VannaAdvanced):
             "params": [self._dataclass_to_dict(obj) for obj in params],
         }
 
-        response = requests.post(self._endpoint, headers=headers, data=json.dumps(data))
+        response = self._session.post(self._endpoint, headers=headers, data=json.dumps(data), timeout=self._timeout)
         return response.json()
 
     def _dataclass_to_dict(self, obj):
@@ -85,7 +100,7 @@ class VannaDB_VectorStore(VannaBase, VannaAdvanced):
             }
         """
 
-        response = requests.post(self._graphql_endpoint, headers=self._graphql_headers, json={'query': query})
+        response = self._session.post(self._graphql_endpoint, headers=self._graphql_headers, json={'query': query}, timeout=self._timeout)
         response_json = response.json()
         if response.status_code == 200 and 'data' in response_json and 'get_all_sql_functions' in response_json['data']:
             self.log(response_json['data']['get_all_sql_functions'])
@@ -123,7 +138,7 @@ class VannaDB_VectorStore(VannaBase, VannaAdvanced):
         """
         static_function_arguments = [{"name": key, "value": str(value)} for key, value in additional_data.items()]
         variables = {"question": question, "staticFunctionArguments": static_function_arguments}
-        response = requests.post(self._graphql_endpoint, headers=self._graphql_headers, json={'query': query, 'variables': variables})
+        response = self._session.post(self._graphql_endpoint, headers=self._graphql_headers, json={'query': query, 'variables': variables}, timeout=self._timeout)
         response_json = response.json()
         if response.status_code == 200 and 'data' in response_json and 'get_and_instantiate_function' in response_json['data']:
             self.log(response_json['data']['get_and_instantiate_function'])
@@ -153,7 +168,7 @@ class VannaDB_VectorStore(VannaBase, VannaAdvanced):
         }
         """
         variables = {"question": question, "sql": sql, "plotly_code": plotly_code}
-        response = requests.post(self._graphql_endpoint, headers=self._graphql_headers, json={'query': query, 'variables': variables})
+        response = self._session.post(self._graphql_endpoint, headers=self._graphql_headers, json={'query': query, 'variables': variables}, timeout=self._timeout)
         response_json = response.json()
         if response.status_code == 200 and 'data' in response_json and response_json['data'] is not None and 'generate_and_create_sql_function' in response_json['data']:
             resp = response_json['data']['generate_and_create_sql_function']
@@ -216,7 +231,7 @@ class VannaDB_VectorStore(VannaBase, VannaAdvanced):
 
         print("variables", variables)
 
-        response = requests.post(self._graphql_endpoint, headers=self._graphql_headers, json={'query': mutation, 'variables': variables})
+        response = self._session.post(self._graphql_endpoint, headers=self._graphql_headers, json={'query': mutation, 'variables': variables}, timeout=self._timeout)
         response_json = response.json()
         if response.status_code == 200 and 'data' in response_json and response_json['data'] is not None and 'update_sql_function' in response_json['data']:
             return response_json['data']['update_sql_function']
@@ -230,7 +245,7 @@ class VannaDB_VectorStore(VannaBase, VannaAdvanced):
         }
         """
         variables = {"function_name": function_name}
-        response = requests.post(self._graphql_endpoint, headers=self._graphql_headers, json={'query': mutation, 'variables': variables})
+        response = self._session.post(self._graphql_endpoint, headers=self._graphql_headers, json={'query': mutation, 'variables': variables}, timeout=self._timeout)
         response_json = response.json()
         if response.status_code == 200 and 'data' in response_json and response_json['data'] is not None and 'delete_sql_function' in response_json['data']:
             return response_json['data']['delete_sql_function']
@@ -359,7 +374,24 @@ class VannaDB_VectorStore(VannaBase, VannaAdvanced):
 
         return status.success
 
+    def invalidate_retrieval_cache(self) -> None:
+        super().invalidate_retrieval_cache()
+        with self._related_training_data_lock:
+            self.related_training_data.clear()
+
     def get_related_training_data_cached(self, question: str) -> TrainingData:
+        key = " ".join(question.split()).casefold()
+        with self._related_training_data_lock:
+            entry = self.related_training_data.get(key)
+            if entry is not None:
+                created, training_data = entry
+                ttl = self.retrieval_cache_ttl
+                if ttl is None or time.monotonic() - created <= ttl:
+                    self.related_training_data.move_to_end(key)
+                    return training_data
+                del self.related_training_data[key]
+
+        generation = self.training_data_generation
         params = [Question(question=question)]
 
         d = self._rpc_call(method="get_related_training_data", params=params)
@@ -370,30 +402,21 @@ class VannaDB_VectorStore(VannaBase, VannaAdvanced):
         # Load the result into a dataclass
         training_data = TrainingData(**d["result"])
 
-        self.related_training_data[question] = training_data
+        with self._related_training_data_lock:
+            # Training data added or removed during the call may not be reflected in the result
+            if generation == self.training_data_generation and self.related_training_data_cache_size > 0:
+                self.related_training_data[key] = (time.monotonic(), training_data)
+                self.related_training_data.move_to_end(key)
+                while len(self.related_training_data) > self.related_training_data_cache_size:
+                    self.related_training_data.popitem(last=False)
 
         return training_data
 
     def get_similar_question_sql(self, question: str, **kwargs) -> list:
-        if question in self.related_training_data:
-            training_data = self.related_training_data[question]
-        else:
-            training_data = self.get_related_training_data_cached(question)
-
-        return training_data.questions
+        return self.get_related_training_data_cached(question).questions
 
     def get_related_ddl(self, question: str, **kwargs) -> list:
-        if question in self.related_training_data:
-            training_data = self.related_training_data[question]
-        else:
-            training_data = self.get_related_training_data_cached(question)
-
-        return training_data.ddl
+        return self.get_related_training_data_cached(question).ddl
 
     def get_related_documentation(self, question: str, **kwargs) -> list:
-        if question in self.related_training_data:
-            training_data = self.related_training_data[question]
-        else:
-            training_data = self.get_related_training_data_cached(question)
-
-        return training_data.documentation
+        return self.get_related_training_data_cached(question).documentation
@@ -1,8 +1,10 @@
+import uuid
+
 import weaviate
 import weaviate.classes as wvc
-from fastembed import TextEmbedding
-
 from vanna.base import VannaBase
+from vanna.embeddings import get_embedding_model
+from vanna.exceptions import APIError
 
 
 class WeaviateDatabase(VannaBase):
@@ -21,7 +23,7 @@ class WeaviateDatabase(VannaBase):
         fastembed_model (str): Fastembed model name for text embeddings. BAAI/bge-small-en-v1.5 by default.
 
         """
-        super().__init__(config=config)
+        VannaBase.__init__(self, config=config)
 
         if config is None:
             raise ValueError("config is required")
@@ -37,7 +39,6 @@ class WeaviateDatabase(VannaBase):
             raise ValueError("Add proper credentials to connect to weaviate")
 
         self.weaviate_client = self._initialize_weaviate_client()
-        self.embeddings = TextEmbedding(model_name=self.fastembed_model)
 
         self.training_data_cluster = {
             "sql": "SQLTrainingDataEntry",
@@ -47,6 +48,11 @@ class WeaviateDatabase(VannaBase):
 
         self._create_collections_if_not_exist()
 
+    @property
+    def embeddings(self):
+        # Shared with every other store using the same fastembed model in this process
+        return get_embedding_model("fastembed", self.fastembed_model)
+
     def _create_collections_if_not_exist(self):
         properties_dict = {
             self.training_data_cluster['ddl']: [
@@ -85,19 +91,19 @@ class WeaviateDatabase(VannaBase):
             )
 
     def generate_embedding(self, data: str, **kwargs):
-            embedding_model = TextEmbedding(model_name=self.fastembed_model)
-            embedding = next(embedding_model.embed(data))
+            embedding = next(self.embeddings.embed(data))
             return embedding.tolist()
 
 
     def _insert_data(self, cluster_key: str, data_object: dict, vector: list) -> str:
         self.weaviate_client.connect()
-        response = self.weaviate_client.collections.get(self.training_data_cluster[cluster_key]).data.insert(
-            properties=data_object,
-            vector=vector
-        )
-        self.weaviate_client.close()
-        return response
+        try:
+            return self.weaviate_client.collections.get(self.training_data_cluster[cluster_key]).data.insert(
+                properties=data_object,
+                vector=vector
+            )
+        finally:
+            self.weaviate_client.close()
 
     def add_ddl(self, ddl: str, **kwargs) -> str:
         data_object = {
@@ -121,17 +127,83 @@ class WeaviateDatabase(VannaBase):
         response = self._insert_data('sql', data_object, self.generate_embedding(question))
         return f'{response}-sql'
 
+    def generate_embeddings(self, data: list, **kwargs) -> list:
+        return [embedding.tolist() for embedding in self.embeddings.embed(data)]
+
+    @staticmethod
+    def _object_uuid(id: str) -> str:
+        # Imported training data keeps the uuid part of its id; ids that don't have one get a uuid derived from them
+        object_uuid = id.rsplit("-", 1)[0]
+        try:
+            return str(uuid.UUID(object_uuid))
+        except ValueError:
+            return str(weaviate.util.generate_uuid5(id))
+
+    def _insert_data_batch(
+        self, cluster_key: str, data_objects: list, texts: list, item_type: str, ids=None, embeddings=None, metadatas=None, **kwargs
+    ) -> list:
+        if metadatas is not None:
+            raise ValueError("Weaviate collections have no metadata property, so metadatas can't be stored")
+        object_uuids = [None] * len(texts) if ids is None else [self._object_uuid(id) for id in ids]
+
+        added = []
+        failed = 0
+        items = list(zip(data_objects, texts, object_uuids, embeddings or [None] * len(texts)))
+        self.weaviate_client.connect()
+        try:
+            collection = self.weaviate_client.collections.get(self.training_data_cluster[cluster_key])
+            for batch in self._iter_training_batches(items, **kwargs):
+                if embeddings is None:
+                    vectors = self.generate_embeddings([text for _, text, _, _ in batch])
+                else:
+                    vectors = [embedding for _, _, _, embedding in batch]
+                response = collection.data.insert_many(
+                    [
+                        wvc.data.DataObject(properties=data_object, uuid=object_uuid, vector=vector)
+                        for (data_object, _, object_uuid, _), vector in zip(batch, vectors)
+                    ]
+                )
+                # Objects Weaviate rejected have an error instead of a uuid
+                for i, error in sorted(response.errors.items()):
+                    self.log(title="Weaviate Error", message=f"Failed to add {batch[i][1][:100]!r}: {error.message}")
+                failed += len(response.errors)
+                added += [f'{response.uuids[i]}-{cluster_key}' for i in sorted(response.uuids)]
+                self._log_training_progress(item_type, len(added), len(items))
+        finally:
+            self.weaviate_client.close()
+
+        if failed:
+            raise APIError(f"Weaviate rejected {failed} of {len(items)} {item_type}; the other {len(added)} were added")
+        return added
+
+    def add_ddl_batch(self, ddl_list: list, **kwargs) -> list:
+        data_objects = [{"description": ddl} for ddl in ddl_list]
+        return self._insert_data_batch('ddl', data_objects, ddl_list, "DDL statements", **kwargs)
+
+    def add_documentation_batch(self, documentation_list: list, **kwargs) -> list:
+        data_objects = [{"description": doc} for doc in documentation_list]
+        return self._insert_data_batch('doc', data_objects, documentation_list, "documentation entries", **kwargs)
+
+    def add_question_sql_batch(self, question_sql_list: list, **kwargs) -> list:
+        data_objects = [
+            {"sql": item["sql"], "natural_language_question": item["question"]}
+            for item in question_sql_list
+        ]
+        questions = [item["question"] for item in question_sql_list]
+        return self._insert_data_batch('sql', data_objects, questions, "question-SQL pairs", **kwargs)
+
     def _query_collection(self, cluster_key: str, vector_input: list, return_properties: list) -> list:
         self.weaviate_client.connect()
-        collection = self.weaviate_client.collections.get(self.training_data_cluster[cluster_key])
-        response = collection.query.near_vector(
-            near_vector=vector_input,
-            limit=self.n_results,
-            return_properties=return_properties
-        )
-        response_list = [item.properties for item in response.objects]
-        self.weaviate_client.close()
-        return response_list
+        try:
+            collection = self.weaviate_client.collections.get(self.training_data_cluster[cluster_key])
+            response = collection.query.near_vector(
+                near_vector=vector_input,
+                limit=self.n_results,
+                return_properties=return_properties
+            )
+            return [item.properties for item in response.objects]
+        finally:
+            self.weaviate_client.close()
 
     def get_related_ddl(self, question: str, **kwargs) -> list:
         vector_input = self.generate_embedding(question)
@@ -151,12 +223,14 @@ class WeaviateDatabase(VannaBase):
     def get_training_data(self, **kwargs) -> list:
         self.weaviate_client.connect()
         combined_response_list = []
-        for collection_name in self.training_data_cluster.values():
-            if self.weaviate_client.collections.exists(collection_name):
-                collection = self.weaviate_client.collections.get(collection_name)
-                response_list = [item.properties for item in collection.iterator()]
-                combined_response_list.extend(response_list)
-        self.weaviate_client.close()
+        try:
+            for collection_name in self.training_data_cluster.values():
+                if self.weaviate_client.collections.exists(collection_name):
+                    collection = self.weaviate_client.collections.get(collection_name)
+                    response_list = [item.properties for item in collection.iterator()]
+                    combined_response_list.extend(response_list)
+        finally:
+            self.weaviate_client.close()
         return combined_response_list
 
     def remove_training_data(self, id: str, **kwargs) -> bool:
@@ -0,0 +1,165 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.cloud.bigquery")
+pytest.importorskip("vertexai")
+
+import pandas as pd
+
+from vanna.google import bigquery_vector
+from vanna.google.bigquery_vector import BigQuery_VectorStore
+from vanna.mock import MockLLM
+
+
+class FakeJob:
+    def __init__(self, df):
+        self.df = df
+
+    def result(self):
+        return self
+
+    def to_dataframe(self):
+        return self.df
+
+
+class FakeClient:
+    def __init__(self, project=None):
+        self.queries = []
+        self.inserts = []
+        self.result = pd.DataFrame(columns=["id", "question", "training_data_type", "content", "distance"])
+
+    def get_dataset(self, dataset_id):
+        return dataset_id
+
+    def get_table(self, table_id):
+        return table_id
+
+    def query(self, query, job_config=None):
+        self.queries.append((query, job_config))
+        return FakeJob(self.result)
+
+    def insert_rows_json(self, table_id, rows, **kwargs):
+        self.inserts.append((rows, kwargs))
+        return []
+
+
+class BigQueryVanna(BigQuery_VectorStore, MockLLM):
+    def __init__(self, config=None):
+        BigQuery_VectorStore.__init__(self, config=config)
+        MockLLM.__init__(self, config=config)
+
+    def log(self, message: str, title: str = "Info"):
+        pass
+
+
+@pytest.fixture
+def vn(monkeypatch):
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    monkeypatch.setattr(bigquery_vector.bigquery, "Client", FakeClient)
+    return BigQueryVanna(config={"project_id": "project"})
+
+
+def test_bigquery_batch_adds_keep_imported_ids_and_embeddings(vn, monkeypatch):
+    def embed(data, **kwargs):
+        raise AssertionError("imported embeddings are stored as they are")
+
+    monkeypatch.setattr(vn, "generate_embeddings", embed)
+    ids = vn.add_ddl_batch(["CREATE TABLE a (x INT)"], ids=["1-ddl"], embeddings=[[0.0, 1.0]])
+
+    assert ids == ["1-ddl"]
+    [(rows, kwargs)] = vn.conn.inserts
+    assert [(row["id"], row["training_data_type"], row["content"], row["embedding"]) for row in rows] == [
+        ("1-ddl", "ddl", "CREATE TABLE a (x INT)", [0.0, 1.0])
+    ]
+    assert kwargs == {"row_ids": ["1-ddl"]}
+
+    with pytest.raises(ValueError, match="metadatas"):
+        vn.add_documentation_batch(["doc"], metadatas=[{"schema_table": "[]"}])
+
+
+def test_bigquery_creates_the_vector_index_with_its_options(monkeypatch):
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    monkeypatch.setattr(bigquery_vector.bigquery, "Client", FakeClient)
+    vn = BigQueryVanna(config={"project_id": "project", "vector_index_options": {"num_lists": 100}})
+
+    [(query, _)] = vn.conn.queries
+    assert "CREATE VECTOR INDEX IF NOT EXISTS `training_data_embedding_index`" in query
+    assert "ON `project.vanna_managed.training_data`(embedding)" in query
+    assert "STORING(training_data_type, question, content)" in query
+    assert """OPTIONS(distance_type='COSINE', index_type='IVF', ivf_options='{"num_lists": 100}')""" in query
+
+
+def test_bigquery_related_training_data_is_one_union_all_vector_search(vn, monkeypatch):
+    embedded = []
+
+    def embed(data, **kwargs):
+        embedded.append(data)
+        return [0.5, 0.5]
+
+    monkeypatch.setattr(vn, "generate_question_embedding", embed)
+    vn.conn.result = pd.DataFrame(
+        {
+            "id": ["1", "2", "3"],
+            "question": ["How many?", "", ""],
+            "training_data_type": ["sql", "ddl", "documentation"],
+            "content": ["SELECT COUNT(*) FROM a", "CREATE TABLE a (x INT)", "Orders are in the a table"],
+            "distance": [0.1, 0.2, 0.3],
+        }
+    )
+    vn.conn.queries.clear()
+
+    assert vn.get_similar_question_sql("How many?") == [{"question": "How many?", "sql": "SELECT COUNT(*) FROM a"}]
+    assert vn.get_related_ddl("How many?") == ["CREATE TABLE a (x INT)"]
+    assert vn.get_related_documentation("How many?") == ["Orders are in the a table"]
+
+    assert embedded == ["How many?"]
+    [(query, job_config)] = vn.conn.queries
+    assert query.count("VECTOR_SEARCH(") == 3 and query.count(" UNION ALL ") == 2
+    for training_data_type in ("sql", "ddl", "documentation"):
+        assert f"WHERE training_data_type = '{training_data_type}'" in query
+    assert query.count("(SELECT @embedding AS embedding)") == 3
+    assert query.rstrip().endswith("ORDER BY training_data_type, distance")
+    [parameter] = job_config.query_parameters
+    assert (parameter.name, parameter.array_type, parameter.values) == ("embedding", "FLOAT64", [0.5, 0.5])
+
+
+def test_bigquery_batch_adds_embed_and_insert_once_per_batch(vn, monkeypatch):
+    embedded = []
+
+    def embed(data, **kwargs):
+        embedded.append(data)
+        return [[1.0, 0.0] for _ in data]
+
+    monkeypatch.setattr(vn, "generate_embeddings", embed)
+    ids = vn.add_documentation_batch(["a", "b", "c"], batch_size=2)
+
+    assert len(ids) == 3
+    assert embedded == [["a", "b"], ["c"]]
+    assert [[row["content"] for row in rows] for rows, _ in vn.conn.inserts] == [["a", "b"], ["c"]]
+    assert all(row["training_data_type"] == "documentation" for rows, _ in vn.conn.inserts for row in rows)
+
+
+def test_bigquery_embeddings_are_requested_in_chunks(vn, monkeypatch):
+    requests = []
+
+    class FakeGenAI:
+        def embed_content(self, model, content, task_type):
+            requests.append(len(content))
+            return {"embedding": [[1.0] for _ in content]}
+
+    vn.type = "GEMINI"
+    vn.genai = FakeGenAI()
+    assert len(vn.generate_embeddings([str(i) for i in range(250)])) == 250
+    assert requests == [100, 100, 50]
+
+    class FakeVertexModel:
+        def get_embeddings(self, inputs):
+            requests.append(len(inputs))
+            return [SimpleNamespace(values=[1.0]) for _ in inputs]
+
+    requests.clear()
+    vn.type = "VERTEX_AI"
+    monkeypatch.setattr(bigquery_vector, "get_embedding_model", lambda provider, name: FakeVertexModel())
+    assert len(vn.generate_embeddings([str(i) for i in range(300)])) == 300
+    assert requests == [250, 50]
@@ -0,0 +1,43 @@
+from vanna.base import VannaBase
+from vanna.mock import MockEmbedding, MockLLM, MockVectorDB
+
+
+class ContextVanna(MockVectorDB, MockEmbedding, MockLLM):
+    def __init__(self, config=None):
+        VannaBase.__init__(self, config=config)
+
+
+def test_select_context_drops_exact_duplicates_by_default():
+    vn = ContextVanna()
+    ddl = ["CREATE TABLE a (id INT)", "CREATE TABLE a (id INT)", "CREATE TABLE b (id INT)"]
+    _, ddl_list, _ = vn.select_context("question", [], ddl, [])
+    assert ddl_list == ["CREATE TABLE a (id INT)", "CREATE TABLE b (id INT)"]
+
+
+def test_select_context_mmr_collapses_near_duplicates_within_budget():
+    vn = ContextVanna(config={"context_selection": "mmr", "context_duplicate_threshold": 0.8, "context_token_budget": 50})
+    question_sql_list = [
+        {"question": "Top customers by sales", "sql": "SELECT name FROM customers ORDER BY sales DESC LIMIT 10"},
+        {"question": "Top customers by sales?", "sql": "SELECT name FROM customers ORDER BY sales DESC LIMIT 10"},
+        {"question": "Invoices per month", "sql": "SELECT month, COUNT(*) FROM invoices GROUP BY month"},
+    ]
+    doc_list = ["Sales are in USD.", "x" * 200]
+
+    question_sql, ddl, docs = vn.select_context("Who are the top customers?", question_sql_list, [], doc_list)
+
+    assert question_sql == [question_sql_list[0], question_sql_list[2]]
+    assert ddl == []
+    assert docs == ["Sales are in USD."]
+
+
+def test_select_context_embedding_similarity_falls_back_to_lexical():
+    vn = ContextVanna(config={"context_selection": "mmr", "context_similarity": "embedding", "context_duplicate_threshold": 0.8})
+
+    def generate_embeddings(data, **kwargs):
+        raise AssertionError("the context isn't embedded again")
+
+    vn.generate_embeddings = generate_embeddings
+    # The mock vector store doesn't hand back the vectors it retrieved
+    doc_list = ["Sales are in USD.", "Sales are in USD!", "Invoices are monthly."]
+    _, _, docs = vn.select_context("What currency are sales in?", [], [], doc_list)
+    assert docs == ["Sales are in USD.", "Invoices are monthly."]
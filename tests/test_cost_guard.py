@@ -0,0 +1,123 @@
+import sqlite3
+
+import pytest
+
+from vanna.base import VannaBase
+from vanna.exceptions import SQLCostError
+from vanna.mock import MockEmbedding, MockLLM, MockVectorDB
+
+
+class VannaCostGuard(MockEmbedding, MockVectorDB, MockLLM):
+    def __init__(self, config=None):
+        VannaBase.__init__(self, config=config)
+
+    def log(self, message: str, title: str = "Info"):
+        pass
+
+
+def create_sqlite_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE a (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.execute("CREATE TABLE b (id INTEGER PRIMARY KEY, a_id INTEGER)")
+    conn.commit()
+    conn.close()
+
+
+def test_cost_guard_disabled_by_default(tmp_path):
+    path = str(tmp_path / "guard.sqlite")
+    create_sqlite_database(path)
+
+    vn = VannaCostGuard()
+    vn.connect_to_sqlite(path)
+
+    assert vn.check_sql_cost("SELECT * FROM a, b") is None
+
+
+def test_cost_guard_sqlite_cartesian_join(tmp_path):
+    path = str(tmp_path / "guard.sqlite")
+    create_sqlite_database(path)
+
+    vn = VannaCostGuard(config={"cost_guard": "reject"})
+    vn.connect_to_sqlite(path)
+
+    estimate = vn.check_sql_cost("SELECT * FROM a JOIN b ON a.id = b.id")
+    assert estimate.cartesian_join is False
+
+    with pytest.raises(SQLCostError):
+        vn.check_sql_cost("SELECT * FROM a, b")
+
+    vn_warn = VannaCostGuard(config={"cost_guard": "warn"})
+    vn_warn.connect_to_sqlite(path)
+    assert vn_warn.check_sql_cost("SELECT * FROM a, b").cartesian_join is True
+
+
+def test_cost_guard_duckdb():
+    pytest.importorskip("duckdb")
+
+    vn = VannaCostGuard(config={"cost_guard": "reject", "cost_guard_max_rows": 500})
+    vn.connect_to_duckdb(":memory:", init_sql="CREATE TABLE a AS SELECT range AS id FROM range(1000)")
+
+    assert vn.check_sql_cost("SELECT * FROM a WHERE id < 10").estimated_rows <= 500
+
+    with pytest.raises(SQLCostError):
+        vn.check_sql_cost("SELECT * FROM a")
+
+    with pytest.raises(SQLCostError):
+        vn.check_sql_cost("SELECT * FROM a, a AS b LIMIT 10")
+
+
+def test_cost_guard_postgres_plan_cartesian_join():
+    vn = VannaCostGuard()
+
+    def nested_loop(inner, **node):
+        return {
+            "Node Type": "Nested Loop",
+            "Plans": [{"Node Type": "Seq Scan", "Relation Name": "a"}, inner],
+            **node,
+        }
+
+    cross_join = nested_loop({"Node Type": "Materialize", "Plans": [{"Node Type": "Seq Scan", "Relation Name": "b"}]})
+    assert vn._postgres_plan_has_cartesian_join(cross_join) is True
+    # Nested below a Limit
+    assert vn._postgres_plan_has_cartesian_join({"Node Type": "Limit", "Plans": [cross_join]}) is True
+
+    index_lookup = nested_loop({"Node Type": "Index Scan", "Relation Name": "b", "Index Cond": "(b.id = a.id)"})
+    assert vn._postgres_plan_has_cartesian_join(index_lookup) is False
+
+    join_filter = nested_loop({"Node Type": "Seq Scan", "Relation Name": "b"}, **{"Join Filter": "(a.id < b.id)"})
+    assert vn._postgres_plan_has_cartesian_join(join_filter) is False
+
+    hash_join = {
+        "Node Type": "Hash Join",
+        "Hash Cond": "(a.id = b.a_id)",
+        "Plans": [
+            {"Node Type": "Seq Scan", "Relation Name": "a"},
+            {"Node Type": "Hash", "Plans": [{"Node Type": "Seq Scan", "Relation Name": "b"}]},
+        ],
+    }
+    assert vn._postgres_plan_has_cartesian_join(hash_join) is False
+
+
+def test_cost_guard_mysql_plan_cartesian_join():
+    vn = VannaCostGuard()
+
+    def plan(*tables):
+        return {"query_block": {"select_id": 1, "nested_loop": [{"table": table} for table in tables]}}
+
+    a = {"table_name": "a", "access_type": "ALL", "rows_produced_per_join": "1000"}
+    cross_join = plan(a, {"table_name": "b", "access_type": "ALL", "using_join_buffer": "Block Nested Loop"})
+    assert vn._mysql_plan_has_cartesian_join(cross_join) is True
+
+    ref_join = plan(a, {"table_name": "b", "access_type": "eq_ref", "key": "PRIMARY", "ref": ["db.a.id"]})
+    assert vn._mysql_plan_has_cartesian_join(ref_join) is False
+
+    # A single table is never joined
+    assert vn._mysql_plan_has_cartesian_join({"query_block": {"select_id": 1, "table": a}}) is False
+
+    derived = {
+        "query_block": {
+            "select_id": 1,
+            "table": {"table_name": "d", "access_type": "ALL", "materialized_from_subquery": cross_join},
+        }
+    }
+    assert vn._mysql_plan_has_cartesian_join(derived) is True
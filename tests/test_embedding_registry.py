@@ -0,0 +1,45 @@
+import threading
+
+import numpy as np
+
+from vanna.embeddings import EmbeddingModelRegistry, EmbeddingReducer, reduction_overlap_report
+
+
+def test_embedding_model_registry_loads_once():
+    loads = []
+
+    def loader(model_name, **options):
+        loads.append((model_name, options))
+        return object()
+
+    registry = EmbeddingModelRegistry()
+    registry.register_loader("test", loader)
+
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(registry.get("test", "a"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert all(model is models[0] for model in models)
+
+    registry.preload([("test", "a"), ("test", "a", {"device": "cpu"})])
+    assert loads == [("a", {}), ("a", {"device": "cpu"})]
+    assert set(registry.memory_usage()) == set(registry.loaded())
+
+
+def test_embedding_reducer_pca_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50, 4)) @ rng.standard_normal((4, 32))
+
+    reducer = EmbeddingReducer("pca", 4).fit(vectors)
+    reducer.save(str(tmp_path / "reduction.npz"))
+    loaded = EmbeddingReducer.load(str(tmp_path / "reduction.npz"))
+
+    assert np.allclose(loaded.transform(vectors), reducer.transform(vectors), atol=1e-5)
+    assert loaded.transform(vectors).shape == (50, 4)
+
+    report = reduction_overlap_report(vectors, vectors[:10], dims=[4], k=5)
+    assert report.loc[report["method"] == "pca", "overlap_at_k"].item() == 1.0
@@ -0,0 +1,115 @@
+import zlib
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+
+from vanna.faiss import FAISS
+from vanna.mock import MockLLM
+
+
+class FAISSVanna(FAISS, MockLLM):
+    def __init__(self, config=None):
+        FAISS.__init__(self, config=config)
+        MockLLM.__init__(self, config=config)
+
+    def generate_embedding(self, data, **kwargs):
+        return self.generate_embeddings([data])[0]
+
+    def generate_embeddings(self, data, **kwargs):
+        return [np.random.default_rng(zlib.crc32(text.encode())).standard_normal(8).tolist() for text in data]
+
+
+def open_store(path):
+    # Nothing is snapshotted unless flush() is called, so dropping the store simulates a crash
+    return FAISSVanna(config={"path": str(path), "embedding_dim": 8, "flush_every": None, "flush_interval": None})
+
+
+def test_faiss_replays_journal_after_crash(tmp_path):
+    vn = open_store(tmp_path)
+    kept_ids = vn.add_documentation_batch([f"Table {i} is refreshed hourly" for i in range(10)])
+    removed_id = vn.add_documentation("Refunds take a week")
+    vn.flush()
+
+    # Journaled after the last snapshot: the removed vector is still in the index file
+    assert vn.remove_training_data(removed_id)
+    added_id = vn.add_documentation("Invoices are sent monthly")
+
+    vn = open_store(tmp_path)
+    assert vn.doc_index.ntotal == 11
+    assert set(vn.get_training_data()["id"]) == {*kept_ids, added_id}
+    assert "Refunds take a week" not in vn.get_related_documentation("Refunds take a week")
+    assert not vn.remove_training_data(removed_id)
+
+
+def test_faiss_flush_keeps_changes_other_processes_journaled(tmp_path):
+    # Two stores on one path stand in for two processes
+    a = open_store(tmp_path)
+    b = open_store(tmp_path)
+    a_id = a.add_documentation("Refunds take a week")
+    b_id = b.add_documentation("Invoices are sent monthly")
+    b.flush()
+
+    vn = open_store(tmp_path)
+    assert vn.doc_index.ntotal == 2
+    assert set(vn.get_training_data()["id"]) == {a_id, b_id}
+    assert b.get_related_documentation("Refunds take a week")[0] == "Refunds take a week"
+
+
+def test_faiss_flush_keeps_snapshots_other_processes_wrote(tmp_path):
+    a = open_store(tmp_path)
+    b = open_store(tmp_path)
+    a_id = a.add_documentation("Refunds take a week")
+    a.flush()
+    b_id = b.add_documentation("Invoices are sent monthly")
+    b.flush()
+
+    vn = open_store(tmp_path)
+    assert vn.doc_index.ntotal == 2
+    assert set(vn.get_training_data()["id"]) == {a_id, b_id}
+
+    assert a.remove_collection("documentation")
+    b.add_documentation("Orders ship daily")
+    b.flush()
+    assert open_store(tmp_path).get_training_data()["documentation"].tolist() == ["Orders ship daily"]
+
+
+def test_faiss_retrieval_snapshot_checks_the_files_not_the_training_data(tmp_path, monkeypatch):
+    path = str(tmp_path / "retrieval.snapshot")
+    vn = open_store(tmp_path)
+    vn.add_documentation("Refunds take a week")
+
+    def get_training_data(**kwargs):
+        raise AssertionError("the fingerprint doesn't fetch the training data")
+
+    monkeypatch.setattr(FAISSVanna, "get_training_data", get_training_data)
+    # Saving the snapshot writes the pending changes first, so they don't make it stale
+    vn.save_retrieval_snapshot(path)
+    assert not vn.retrieval_snapshot_is_stale(path)
+    assert open_store(tmp_path).load_retrieval_snapshot(path)
+
+    open_store(tmp_path).add_documentation("Invoices are sent monthly")
+    assert not open_store(tmp_path).load_retrieval_snapshot(path)
+
+
+def test_faiss_retrieval_snapshot_restores_in_memory_indexes(tmp_path):
+    path = str(tmp_path / "retrieval.snapshot")
+    config = {"client": "in-memory", "embedding_dim": 8}
+    vn = FAISSVanna(config=config)
+    vn.add_documentation_batch([f"Table {i} is refreshed hourly" for i in range(10)])
+    vn.save_retrieval_snapshot(path)
+
+    worker = FAISSVanna(config=config)
+    assert worker.load_retrieval_snapshot(path)
+    assert worker.doc_index.ntotal == 10
+    assert worker.get_related_documentation("Table 4 is refreshed hourly")[0] == "Table 4 is refreshed hourly"
+
+
+def test_faiss_remembers_the_retrieved_vectors_for_context_selection():
+    vn = FAISSVanna(config={"client": "in-memory", "embedding_dim": 8, "context_similarity": "embedding"})
+    vn.add_documentation_batch(["Sales are in USD.", "Invoices are monthly."])
+
+    docs = vn.get_related_documentation("What currency are sales in?")
+    assert vn._remembered_context_vectors("What currency are sales in?", docs).shape == (3, 8)
@@ -14,6 +14,7 @@ def test_regular_imports():
     from vanna.marqo.marqo import Marqo_VectorStore
     from vanna.milvus.milvus_vector import Milvus_VectorStore
     from vanna.mistral.mistral import Mistral
+    from vanna.numpy.numpy_vector import NumPy_VectorStore
     from vanna.ollama.ollama import Ollama
     from vanna.openai.openai_chat import OpenAI_Chat
     from vanna.openai.openai_embeddings import OpenAI_Embeddings
@@ -46,6 +47,7 @@ def test_shortcut_imports():
     from vanna.marqo import Marqo_VectorStore
     from vanna.milvus import Milvus_VectorStore
     from vanna.mistral import Mistral
+    from vanna.numpy import NumPy_VectorStore
     from vanna.ollama import Ollama
     from vanna.openai import OpenAI_Chat, OpenAI_Embeddings
     from vanna.opensearch import (
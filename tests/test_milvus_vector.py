@@ -0,0 +1,113 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pymilvus")
+
+from vanna.milvus import Milvus_VectorStore
+from vanna.mock import MockLLM
+
+
+class FakeEmbeddingFunction:
+    def __init__(self):
+        self.calls = []
+
+    def encode_documents(self, data):
+        self.calls.append(list(data))
+        return [np.ones(3) for _ in data]
+
+
+class FakeMilvusClient:
+    def __init__(self):
+        self.writes = []
+        self.rows = {}
+
+    def has_collection(self, collection_name):
+        return True
+
+    def describe_collection(self, collection_name):
+        return {"fields": [{"name": "id"}, {"name": "tenant"}]}
+
+    def _matches(self, filter):
+        # Only parses the id and tenant filters the store builds
+        conditions = dict(condition.split(" == ") for condition in filter.split(" and "))
+        return [
+            id
+            for id, row in self.rows.items()
+            if all(json.loads(value) == row[field] for field, value in conditions.items())
+        ]
+
+    def query(self, collection_name, filter, output_fields):
+        return [{"count(*)": len(self._matches(filter))}]
+
+    def delete(self, collection_name, filter):
+        for id in self._matches(filter):
+            del self.rows[id]
+
+    def insert(self, collection_name, data):
+        self.writes.append(("insert", collection_name, data))
+
+    def upsert(self, collection_name, data):
+        self.writes.append(("upsert", collection_name, data))
+
+
+class MilvusVanna(Milvus_VectorStore, MockLLM):
+    def __init__(self, config=None):
+        Milvus_VectorStore.__init__(self, config=config)
+        MockLLM.__init__(self, config=config)
+
+    def log(self, message: str, title: str = "Info"):
+        pass
+
+
+@pytest.fixture
+def vn():
+    return MilvusVanna(config={"milvus_client": FakeMilvusClient(), "embedding_function": FakeEmbeddingFunction()})
+
+
+def test_milvus_batch_adds_embed_each_batch_once(vn):
+    ids = vn.add_ddl_batch(["CREATE TABLE a (x INT)", "CREATE TABLE b (y INT)", "CREATE TABLE c (z INT)"], batch_size=2)
+
+    assert len(ids) == 3 and all(id.endswith("-ddl") for id in ids)
+    assert vn.embedding_function.calls[1:] == [["CREATE TABLE a (x INT)", "CREATE TABLE b (y INT)"], ["CREATE TABLE c (z INT)"]]
+    assert [(write, collection_name, len(data)) for write, collection_name, data in vn.milvus_client.writes] == [
+        ("insert", "vannaddl", 2),
+        ("insert", "vannaddl", 1),
+    ]
+
+
+def test_milvus_batch_adds_keep_imported_ids_and_embeddings(vn):
+    ids = vn.add_question_sql_batch(
+        [{"question": "How many?", "sql": "SELECT COUNT(*) FROM t"}],
+        ids=["1-sql"],
+        embeddings=[[0.0, 1.0, 0.0]],
+    )
+
+    assert ids == ["1-sql"]
+    # Only the dimension probe in the constructor was embedded
+    assert len(vn.embedding_function.calls) == 1
+    assert vn.milvus_client.writes == [
+        (
+            "upsert",
+            "vannasql",
+            [{"id": "1-sql", "text": "How many?", "sql": "SELECT COUNT(*) FROM t", "vector": [0.0, 1.0, 0.0]}],
+        )
+    ]
+
+    with pytest.raises(ValueError, match="metadatas"):
+        vn.add_documentation_batch(["doc"], metadatas=[{"schema_table": "[]"}])
+
+
+def test_milvus_removes_training_data_only_from_its_tenant():
+    client = FakeMilvusClient()
+    client.rows = {"1-ddl": {"id": "1-ddl", "tenant": "acme"}}
+    vn = MilvusVanna(
+        config={"milvus_client": client, "embedding_function": FakeEmbeddingFunction(), "tenant_partitioning": True}
+    )
+
+    assert vn.remove_training_data("1-ddl", tenant="globex") is False
+    assert "1-ddl" in client.rows
+    assert vn.remove_training_data("1-ddl", tenant="acme") is True
+    assert client.rows == {}
+    assert vn.remove_training_data("1-ddl", tenant="acme") is False
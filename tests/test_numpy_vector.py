@@ -0,0 +1,275 @@
+import time
+import zlib
+
+import numpy as np
+
+from vanna.mock import MockLLM
+from vanna.numpy import NumPy_VectorStore
+
+
+def embed(texts):
+    return [np.random.default_rng(zlib.crc32(text.encode())).standard_normal(8) for text in texts]
+
+
+class NumPyVanna(NumPy_VectorStore, MockLLM):
+    def __init__(self, config=None):
+        NumPy_VectorStore.__init__(self, config=config)
+        MockLLM.__init__(self, config=config)
+
+
+def test_numpy_vector_store_persists_and_compacts(tmp_path):
+    config = {"path": str(tmp_path), "embedding_function": embed, "n_results": 2, "search_batch_size": 3}
+    vn = NumPyVanna(config=config)
+    ids = vn.add_ddl_batch([f"CREATE TABLE t{i} (id INT)" for i in range(10)])
+    vn.add_question_sql("How many rows?", "SELECT COUNT(*) FROM t1")
+
+    assert vn.get_related_ddl("CREATE TABLE t4 (id INT)")[0] == "CREATE TABLE t4 (id INT)"
+    assert vn.remove_training_data(ids[4])
+    assert "CREATE TABLE t4 (id INT)" not in vn.get_related_ddl("CREATE TABLE t4 (id INT)")
+
+    reloaded = NumPyVanna(config=config)
+    assert reloaded.collections["ddl"].mmapped
+    assert reloaded.collections["ddl"].tombstones == 0
+    assert reloaded.count_training_data() == 10
+    assert reloaded.get_similar_question_sql("How many rows?") == [
+        {"question": "How many rows?", "sql": "SELECT COUNT(*) FROM t1"}
+    ]
+
+
+def test_numpy_vector_store_replays_journal_after_crash(tmp_path):
+    # Nothing is saved unless flush() is called, so dropping the store simulates a crash
+    config = {"path": str(tmp_path), "embedding_function": embed, "flush_every": None, "flush_interval": None}
+    vn = NumPyVanna(config=config)
+    ids = vn.add_ddl_batch([f"CREATE TABLE t{i} (id INT)" for i in range(5)])
+    vn.flush()
+
+    # Writes after the save only append to the journal
+    assert vn.remove_training_data(ids[2])
+    vn.add_documentation("Orders are shipped daily")
+    assert not (tmp_path / "doc_metadata.jsonl").exists()
+
+    reloaded = NumPyVanna(config=config)
+    assert reloaded.count_training_data() == 5
+    assert "CREATE TABLE t2 (id INT)" not in reloaded.get_related_ddl("CREATE TABLE t2 (id INT)")
+    assert reloaded.get_related_documentation("Orders")[0] == "Orders are shipped daily"
+    assert (tmp_path / "doc_metadata.jsonl").exists()
+    assert (tmp_path / "ddl_journal.jsonl").read_text() == ""
+
+
+def test_numpy_vector_store_keeps_changes_of_other_processes(tmp_path):
+    # Two stores on one path stand in for two processes
+    config = {"path": str(tmp_path), "embedding_function": embed, "flush_every": None, "flush_interval": None}
+    a = NumPyVanna(config=config)
+    b = NumPyVanna(config=config)
+    a.add_documentation("A doc")
+    a.flush()
+    b.add_documentation("B doc")
+    a.add_documentation("Another A doc")
+    b.flush()
+
+    reloaded = NumPyVanna(config=config)
+    assert sorted(reloaded.get_training_data()["content"]) == ["A doc", "Another A doc", "B doc"]
+    assert b.get_related_documentation("A doc")[0] == "A doc"
+
+
+def test_add_batch_embeds_each_batch_once():
+    embedded = []
+    logged = []
+
+    def counting_embed(texts):
+        embedded.append(list(texts))
+        return embed(texts)
+
+    vn = NumPyVanna(config={"client": "in-memory", "embedding_function": counting_embed, "training_batch_size": 3})
+    vn.log = lambda message, title="Info": logged.append(message)
+    ddl = [f"CREATE TABLE t{i} (id INT)" for i in range(7)]
+
+    ids = vn.add_ddl_batch(ddl)
+    assert [len(texts) for texts in embedded] == [3, 3, 1]
+    assert logged == ["Added 3/7 DDL statements", "Added 6/7 DDL statements", "Added 7/7 DDL statements"]
+    assert len(set(ids)) == 7 and all(id.endswith("-ddl") for id in ids)
+
+    ids += vn.add_question_sql_batch([{"question": "How many rows?", "sql": "SELECT COUNT(*) FROM t1"}], batch_size=10)
+    assert vn.count_training_data() == 8
+    assert vn.remove_training_data(ids[-1])
+    assert vn.get_related_ddl("CREATE TABLE t5 (id INT)")[0] == "CREATE TABLE t5 (id INT)"
+
+
+def test_numpy_vector_store_quantized_search_reranks(tmp_path):
+    config = {"path": str(tmp_path), "embedding_function": embed, "quantization": "binary", "rerank_depth": 20}
+    vn = NumPyVanna(config=config)
+    vn.add_documentation_batch([f"Table t{i} holds orders" for i in range(40)])
+    vn.flush()
+
+    assert vn.collections["doc"].codes.shape == (40, 1)
+    assert vn.get_related_documentation("Table t7 holds orders")[0] == "Table t7 holds orders"
+
+    report = vn.quantization_recall_report("documentation", k=5, n_queries=10, rerank_depths=[40])
+    assert report.loc[report["quantization"] == "binary", "recall_at_k"].item() == 1.0
+
+
+def test_migrate_training_data_reuses_vectors_and_resumes(tmp_path):
+    source = NumPyVanna(config={"client": "in-memory", "embedding_function": embed})
+    source.add_ddl_batch([f"CREATE TABLE t{i} (id INT)" for i in range(5)])
+    source.add_question_sql("How many rows?", "SELECT COUNT(*) FROM t1")
+
+    embedded = []
+
+    def counting_embed(texts):
+        embedded.extend(texts)
+        return embed(texts)
+
+    checkpoint = str(tmp_path / "migration.json")
+    target = NumPyVanna(config={"path": str(tmp_path), "embedding_function": counting_embed})
+    with open(checkpoint, "w") as f:
+        f.write('{"offset": 4}')
+
+    assert source.migrate_training_data(target, page_size=2, checkpoint_path=checkpoint) == 6
+    assert target.count_training_data() == 2
+    assert embedded == ["SELECT COUNT(*) FROM customers -- How many customers are there?"]
+
+    assert source.migrate_training_data(target, page_size=2) == 6
+    assert set(target.get_training_data()["id"]) == set(source.get_training_data()["id"])
+    assert len(embedded) == 2
+    assert target.get_similar_question_sql("How many rows?")[0] == {"question": "How many rows?", "sql": "SELECT COUNT(*) FROM t1"}
+
+
+def test_retrieval_snapshot_warm_starts_in_memory_store(tmp_path):
+    path = str(tmp_path / "retrieval.snapshot")
+    config = {"client": "in-memory", "embedding_function": embed, "quantization": "int8", "n_results": 2}
+    vn = NumPyVanna(config=config)
+    vn.add_ddl_batch([f"CREATE TABLE t{i} (id INT)" for i in range(10)])
+    vn.add_question_sql("How many rows?", "SELECT COUNT(*) FROM t1")
+    related = vn.get_related_ddl("CREATE TABLE t4 (id INT)")
+    generation = vn.save_retrieval_snapshot(path)
+
+    embedded = []
+
+    def counting_embed(texts):
+        embedded.extend(texts)
+        return embed(texts)
+
+    worker = NumPyVanna(config={**config, "embedding_function": counting_embed})
+    assert worker.load_retrieval_snapshot(path)
+    assert worker.training_data_generation == generation
+    assert not worker.retrieval_snapshot_is_stale(path)
+    assert worker.collections["ddl"].mmapped
+    assert worker.get_related_ddl("CREATE TABLE t4 (id INT)") == related
+    assert worker.generate_questions() == ["How many rows?"]
+    assert embedded == []
+
+    worker.add_ddl("CREATE TABLE t10 (id INT)")
+    assert worker.retrieval_snapshot_is_stale(path)
+    assert not worker.load_retrieval_snapshot(path)
+    assert worker.get_related_ddl("CREATE TABLE t10 (id INT)")[0] == "CREATE TABLE t10 (id INT)"
+
+    # A fresh process replacing the snapshot moves past its generation
+    assert NumPyVanna(config=config).save_retrieval_snapshot(path) == generation + 1
+
+
+def test_retrieval_snapshot_is_stale_after_another_process_writes(tmp_path):
+    path = str(tmp_path / "retrieval.snapshot")
+    config = {"path": str(tmp_path), "embedding_function": embed}
+    vn = NumPyVanna(config=config)
+    vn.add_ddl_batch([f"CREATE TABLE t{i} (id INT)" for i in range(3)])
+    vn.save_retrieval_snapshot(path)
+
+    assert NumPyVanna(config=config).load_retrieval_snapshot(path)
+
+    # Each instance stands in for another worker process with its own generation counter
+    NumPyVanna(config=config).add_ddl("CREATE TABLE t3 (id INT)")
+    worker = NumPyVanna(config=config)
+    assert worker.retrieval_snapshot_is_stale(path)
+    assert not worker.load_retrieval_snapshot(path)
+
+
+def test_import_training_data_embeds_again_unless_reusing_vectors():
+    source = NumPyVanna(config={"client": "in-memory", "embedding_function": embed})
+    source.add_ddl_batch(["CREATE TABLE a (id INT)", "CREATE TABLE b (id INT)"])
+    [page] = source.export_training_data()
+
+    embedded = []
+
+    def counting_embed(texts):
+        embedded.extend(texts)
+        return embed(texts)
+
+    target = NumPyVanna(config={"client": "in-memory", "embedding_function": counting_embed})
+    assert target.import_training_data(page) == list(page["id"])
+    assert embedded == ["CREATE TABLE a (id INT)", "CREATE TABLE b (id INT)"]
+
+    assert target.import_training_data(page, reuse_vectors=True) == list(page["id"])
+    assert len(embedded) == 2 and target.count_training_data() == 2
+
+
+def test_retrieval_snapshot_checks_the_files_not_the_training_data(tmp_path, monkeypatch):
+    path = str(tmp_path / "retrieval.snapshot")
+    config = {"path": str(tmp_path), "embedding_function": embed}
+    vn = NumPyVanna(config=config)
+    vn.add_ddl_batch([f"CREATE TABLE t{i} (id INT)" for i in range(3)])
+
+    def get_training_data(**kwargs):
+        raise AssertionError("the fingerprint doesn't fetch the training data")
+
+    monkeypatch.setattr(NumPyVanna, "get_training_data", get_training_data)
+    # Saving the snapshot saves the pending changes first, so they don't make it stale
+    vn.save_retrieval_snapshot(path)
+    assert not vn.retrieval_snapshot_is_stale(path)
+    assert NumPyVanna(config=config).load_retrieval_snapshot(path)
+
+
+def test_restored_retrieval_cache_entries_outlive_the_ttl(tmp_path):
+    path = str(tmp_path / "retrieval.snapshot")
+    config = {"client": "in-memory", "embedding_function": embed, "retrieval_cache_ttl": 0}
+    vn = NumPyVanna(config=config)
+    vn.add_ddl_batch([f"CREATE TABLE t{i} (id INT)" for i in range(3)])
+    related = vn.get_related_ddl("CREATE TABLE t1 (id INT)")
+    vn.retrieval_cache_ttl = None
+    vn.save_retrieval_snapshot(path)
+
+    embedded = []
+
+    def counting_embed(texts):
+        embedded.extend(texts)
+        return embed(texts)
+
+    worker = NumPyVanna(config={**config, "embedding_function": counting_embed})
+    assert worker.load_retrieval_snapshot(path)
+    time.sleep(0.01)
+    assert worker.get_related_ddl("CREATE TABLE t1 (id INT)") == related
+    assert embedded == []
+
+    # Entries cached after loading still expire
+    worker.get_related_ddl("CREATE TABLE t2 (id INT)")
+    time.sleep(0.01)
+    worker.get_related_ddl("CREATE TABLE t2 (id INT)")
+    assert embedded == ["CREATE TABLE t2 (id INT)", "CREATE TABLE t2 (id INT)"]
+
+
+def test_select_context_compares_the_retrieved_vectors():
+    embedded = []
+
+    def counting_embed(texts):
+        embedded.extend(texts)
+        return embed(texts)
+
+    config = {"client": "in-memory", "embedding_function": counting_embed, "context_selection": "mmr", "context_similarity": "embedding"}
+    vn = NumPyVanna(config=config)
+    vn.add_documentation_batch(["Sales are in USD.", "Invoices are monthly.", "Refunds take a week."])
+    vn.add_question_sql("How many invoices?", "SELECT COUNT(*) FROM invoices")
+    embedded.clear()
+
+    question = "How many invoices are there?"
+    question_sql_list = vn.get_similar_question_sql(question)
+    doc_list = vn.get_related_documentation(question)
+    assert embedded == [question, question]
+
+    # Context from the vector store is compared through the vectors it retrieved
+    assert vn._remembered_context_vectors(question, doc_list).shape == (len(doc_list) + 1, 8)
+    question_sql, _, docs = vn.select_context(question, question_sql_list, [], doc_list)
+    assert embedded == [question, question]
+    assert question_sql == question_sql_list and sorted(docs) == sorted(doc_list)
+
+    # Context it didn't retrieve falls back to lexical similarity
+    _, _, docs = vn.select_context(question, [], [], doc_list + ["Sales are in EUR."])
+    assert embedded == [question, question] and len(docs) == 4
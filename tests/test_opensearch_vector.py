@@ -0,0 +1,105 @@
+import pytest
+
+pytest.importorskip("opensearchpy")
+pytest.importorskip("langchain_community")
+
+from vanna.mock import MockLLM
+from vanna.opensearch import opensearch_vector
+from vanna.opensearch.opensearch_vector import OpenSearch_VectorStore
+
+
+class FakeIndices:
+    def __init__(self, mappings):
+        self.mappings = mappings
+
+    def exists(self, index):
+        return index in self.mappings
+
+    def create(self, index, body):
+        self.mappings[index] = body["mappings"]
+
+    def get_mapping(self, index):
+        return {index: {"mappings": self.mappings[index]}}
+
+
+class FakeOpenSearch:
+    mappings = {}
+    responses = []
+
+    def __init__(self, **kwargs):
+        self.indices = FakeIndices(dict(FakeOpenSearch.mappings))
+
+    def msearch(self, body):
+        return {"responses": FakeOpenSearch.responses}
+
+
+class OpenSearchVanna(OpenSearch_VectorStore, MockLLM):
+    def __init__(self, config=None):
+        OpenSearch_VectorStore.__init__(self, config=config)
+        MockLLM.__init__(self, config=config)
+
+    def log(self, message: str, title: str = "Info"):
+        pass
+
+
+def hits(*scored):
+    return {"hits": {"hits": [{"_id": id, "_score": score, "_source": {"doc": id}} for id, score in scored]}}
+
+
+@pytest.fixture
+def fake_opensearch(monkeypatch):
+    monkeypatch.setattr(opensearch_vector, "OpenSearch", FakeOpenSearch)
+    monkeypatch.setattr(FakeOpenSearch, "mappings", {})
+    monkeypatch.setattr(FakeOpenSearch, "responses", [])
+    return FakeOpenSearch
+
+
+def test_hybrid_search_normalizes_bm25_and_vector_scores(fake_opensearch):
+    vn = OpenSearchVanna(
+        config={
+            "es_knn": True,
+            "es_hybrid": True,
+            "embedding_dim": 3,
+            "n_results": 2,
+            "embedding_function": lambda data: [[1.0, 0.0, 0.0] for _ in data],
+        }
+    )
+    fake_opensearch.responses = [
+        hits(),
+        hits(),
+        hits(),
+        hits(),
+        # "keyword" has a BM25 score far above any similarity, but "both" ranks high in both lists
+        hits(("keyword", 40.0), ("both", 30.0), ("neither", 2.0)),
+        hits(("both", 0.95), ("vector", 0.9), ("neither", 0.1)),
+    ]
+    assert vn.get_related_documentation("orders") == ["both", "keyword"]
+
+
+def test_knn_requires_an_index_with_a_knn_vector_field(fake_opensearch):
+    fake_opensearch.mappings = {"vanna_document_index": {"properties": {"doc": {"type": "text"}}}}
+    with pytest.raises(ValueError, match="vanna_document_index"):
+        OpenSearchVanna(config={"es_knn": True, "embedding_dim": 3})
+
+    # The indices it creates itself have the field
+    fake_opensearch.mappings = {}
+    OpenSearchVanna(config={"es_knn": True, "embedding_dim": 3})
+
+
+def test_batch_adds_keep_imported_ids_and_embeddings(fake_opensearch, monkeypatch):
+    actions = []
+    monkeypatch.setattr(opensearch_vector.helpers, "bulk", lambda client, batch: actions.extend(batch))
+
+    def embed(data):
+        raise AssertionError("imported embeddings are stored as they are")
+
+    vn = OpenSearchVanna(config={"es_knn": True, "embedding_dim": 3, "embedding_function": embed})
+    ids = vn.add_documentation_batch(["a", "b"], ids=["1-doc", "2-doc"], embeddings=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    assert ids == ["1-doc", "2-doc"]
+    assert [(action["_id"], action["_source"]) for action in actions] == [
+        ("1-doc", {"doc": "a", "embedding": [1.0, 0.0, 0.0]}),
+        ("2-doc", {"doc": "b", "embedding": [0.0, 1.0, 0.0]}),
+    ]
+
+    with pytest.raises(ValueError, match="metadatas"):
+        vn.add_documentation_batch(["a"], metadatas=[{"schema_table": "[]"}])
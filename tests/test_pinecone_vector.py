@@ -0,0 +1,107 @@
+import pytest
+
+pytest.importorskip("pinecone")
+
+from vanna.mock import MockLLM
+from vanna.pinecone import pinecone_vector
+from vanna.pinecone.pinecone_vector import PineconeDB_VectorStore
+
+
+class FakeIndex:
+    def __init__(self):
+        self.upserts = []
+        self.queries = []
+        self.matches = {}
+
+    def upsert(self, vectors, namespace):
+        self.upserts.append((namespace, vectors))
+
+    def fetch(self, ids, namespace=None):
+        raise AssertionError("upserts are idempotent, so nothing is fetched first")
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs)
+        return {"matches": self.matches.get(kwargs["namespace"], [])}
+
+
+class FakePinecone:
+    def __init__(self, api_key=None):
+        self.index = FakeIndex()
+
+    def list_indexes(self):
+        return [{"name": "vanna-index"}]
+
+    def describe_index(self, name):
+        return {"host": "vanna-index.pinecone.io"}
+
+    def Index(self, host):
+        return self.index
+
+
+class PineconeVanna(PineconeDB_VectorStore, MockLLM):
+    def __init__(self, config=None):
+        PineconeDB_VectorStore.__init__(self, config=config)
+        MockLLM.__init__(self, config=config)
+
+    def log(self, message: str, title: str = "Info"):
+        pass
+
+
+@pytest.fixture
+def vn(monkeypatch):
+    monkeypatch.setattr(pinecone_vector, "Pinecone", FakePinecone)
+    return PineconeVanna(config={"api_key": "key", "dimensions": 3})
+
+
+def test_pinecone_batch_adds_keep_imported_ids_and_embeddings(vn, monkeypatch):
+    def embed(data, **kwargs):
+        raise AssertionError("imported embeddings are stored as they are")
+
+    monkeypatch.setattr(vn, "generate_embeddings", embed)
+    ids = vn.add_ddl_batch(["CREATE TABLE a (x INT)"], ids=["1-ddl"], embeddings=[[0.0, 1.0, 0.0]])
+
+    assert ids == ["1-ddl"]
+    assert vn.Index.upserts == [("ddl", [("1-ddl", [0.0, 1.0, 0.0], {"ddl": "CREATE TABLE a (x INT)"})])]
+
+    with pytest.raises(ValueError, match="metadatas"):
+        vn.add_documentation_batch(["doc"], metadatas=[{"schema_table": "[]"}])
+
+
+def test_pinecone_adds_upsert_without_fetching(vn, monkeypatch):
+    monkeypatch.setattr(vn, "generate_embeddings", lambda data, **kwargs: [[1.0, 0.0, 0.0] for _ in data])
+    ddl_id = vn.add_ddl("CREATE TABLE a (x INT)")
+    # Keyword arguments reach the batch method
+    doc_id = vn.add_documentation("Orders are in the a table", ids=["1-doc"])
+    sql_id = vn.add_question_sql("How many?", "SELECT COUNT(*) FROM a")
+
+    assert [namespace for namespace, _ in vn.Index.upserts] == ["ddl", "documentation", "sql"]
+    assert [vectors[0][0] for _, vectors in vn.Index.upserts] == [ddl_id, "1-doc", sql_id]
+    assert doc_id == "1-doc"
+    # Adding the same item again upserts it under the same id
+    assert vn.add_ddl("CREATE TABLE a (x INT)") == ddl_id
+
+
+def test_pinecone_related_training_data_queries_each_namespace_once(vn, monkeypatch):
+    embedded = []
+
+    def embed(data, **kwargs):
+        embedded.append(data)
+        return [1.0, 0.0, 0.0]
+
+    monkeypatch.setattr(vn, "generate_embedding", embed)
+    vn.Index.matches = {
+        "sql": [{"metadata": {"sql": '{"question": "How many?", "sql": "SELECT COUNT(*) FROM a"}'}}],
+        "ddl": [{"metadata": {"ddl": "CREATE TABLE a (x INT)"}}],
+        "documentation": [{"metadata": {"documentation": "Orders are in the a table"}}],
+    }
+
+    assert vn.get_similar_question_sql("How many?") == [{"question": "How many?", "sql": "SELECT COUNT(*) FROM a"}]
+    assert vn.get_related_ddl("How many?") == ["CREATE TABLE a (x INT)"]
+    assert vn.get_related_documentation("How many?") == ["Orders are in the a table"]
+
+    assert embedded == ["How many?"]
+    assert sorted(query["namespace"] for query in vn.Index.queries) == ["ddl", "documentation", "sql"]
+    assert all(
+        query["include_values"] is False and query["include_metadata"] is True and query["vector"] == [1.0, 0.0, 0.0]
+        for query in vn.Index.queries
+    )
@@ -0,0 +1,41 @@
+import zlib
+
+import numpy as np
+from qdrant_client import QdrantClient
+
+from vanna.mock import MockLLM
+from vanna.qdrant import Qdrant_VectorStore
+
+
+class QdrantVanna(Qdrant_VectorStore, MockLLM):
+    def __init__(self, config=None):
+        Qdrant_VectorStore.__init__(self, config=config)
+        MockLLM.__init__(self, config=config)
+
+    def generate_embeddings(self, data, **kwargs):
+        return [np.random.default_rng(zlib.crc32(text.encode())).standard_normal(8).tolist() for text in data]
+
+
+def test_qdrant_tenants_are_isolated():
+    vn = QdrantVanna(config={"client": QdrantClient(":memory:"), "tenant_partitioning": "payload", "n_results": 5})
+    vn.add_ddl("CREATE TABLE orders (id INT)", tenant="acme")
+    vn.add_ddl("CREATE TABLE orders (id INT)", tenant="globex")
+    globex_id = vn.add_documentation("Orders are shipped daily", tenant="globex")
+    vn.add_question_sql("How many orders?", "SELECT COUNT(*) FROM orders")
+
+    assert vn.get_related_ddl("orders", tenant="acme") == ["CREATE TABLE orders (id INT)"]
+    assert vn.get_related_documentation("orders", tenant="acme") == []
+    assert vn.get_related_documentation("orders", tenant="globex") == ["Orders are shipped daily"]
+    assert vn.get_similar_question_sql("orders") == [{"question": "How many orders?", "sql": "SELECT COUNT(*) FROM orders"}]
+    assert vn.count_training_data(tenant="globex") == 2
+    assert len(vn.get_training_data(tenant="acme")) == 1
+
+    assert not vn.remove_training_data(globex_id, tenant="acme")
+    assert vn.count_training_data(tenant="globex") == 2
+    assert vn.remove_training_data(globex_id, tenant="globex")
+    assert vn.count_training_data(tenant="globex") == 1
+
+    assert vn.remove_tenant_training_data("globex")
+    assert vn.count_training_data(tenant="globex") == 0
+    assert vn.count_training_data(tenant="acme") == 1
+    assert vn.get_related_documentation("orders", tenant="globex") == []
@@ -0,0 +1,133 @@
+from vanna.base import VannaBase
+from vanna.mock import MockEmbedding, MockLLM, MockVectorDB
+
+
+class CountingVectorDB(MockVectorDB):
+    def __init__(self, config=None):
+        VannaBase.__init__(self, config=config)
+        self.calls = 0
+        self.ddl = []
+
+    def add_ddl(self, ddl: str, **kwargs) -> str:
+        self.ddl.append(ddl)
+        return self._get_id(ddl)
+
+    def get_related_ddl(self, question: str, **kwargs) -> list:
+        self.calls += 1
+        return list(self.ddl)
+
+
+class CachedVanna(CountingVectorDB, MockEmbedding, MockLLM):
+    def __init__(self, config=None):
+        CountingVectorDB.__init__(self, config=config)
+        MockLLM.__init__(self, config=config)
+
+
+def test_retrieval_cache_is_invalidated_by_training_data_changes():
+    vn = CachedVanna(config={"n_results_ddl": 5})
+    vn.add_ddl("CREATE TABLE a (id INT)")
+
+    assert vn.get_related_ddl("Which tables exist?") == ["CREATE TABLE a (id INT)"]
+    assert vn.get_related_ddl("  which TABLES   exist? ") == ["CREATE TABLE a (id INT)"]
+    assert vn.calls == 1
+
+    generation = vn.training_data_generation
+    vn.add_ddl("CREATE TABLE b (id INT)")
+    assert vn.training_data_generation == generation + 1
+    assert vn.get_related_ddl("Which tables exist?") == ["CREATE TABLE a (id INT)", "CREATE TABLE b (id INT)"]
+    assert vn.calls == 2
+
+    vn.n_results_ddl = 1
+    vn.get_related_ddl("Which tables exist?")
+    assert vn.calls == 3
+
+
+def test_retrieval_cache_returns_copies():
+    vn = CachedVanna()
+    vn.add_ddl("CREATE TABLE a (id INT)")
+
+    vn.get_related_ddl("Which tables exist?").append("CREATE TABLE b (id INT)")
+    vn.get_related_ddl("Which tables exist?").append("CREATE TABLE c (id INT)")
+    assert vn.get_related_ddl("Which tables exist?") == ["CREATE TABLE a (id INT)"]
+    assert vn.calls == 1
+
+
+def test_retrieval_cache_evicts_least_recently_used():
+    vn = CachedVanna(config={"retrieval_cache_size": 2})
+    for question in ["a", "b", "a", "c", "a", "b"]:
+        vn.get_related_ddl(question)
+    assert vn.calls == 4
+
+    vn.retrieval_cache_size = 0
+    vn.get_related_ddl("a")
+    assert vn.calls == 5
+
+
+def test_vannadb_related_training_data_is_bounded_and_invalidated():
+    from vanna.vannadb import VannaDB_VectorStore
+
+    class FakeVannaDB(VannaDB_VectorStore, MockLLM):
+        def __init__(self, config=None):
+            VannaDB_VectorStore.__init__(self, vanna_model="test", vanna_api_key="key", config=config)
+            MockLLM.__init__(self, config=config)
+            self.methods = []
+
+        def _rpc_call(self, method, params):
+            self.methods.append(method)
+            if method == "add_ddl":
+                return {"result": {"success": True, "message": "", "id": "1-ddl"}}
+            return {"result": {"questions": [], "ddl": [params[0].question], "documentation": []}}
+
+    vn = FakeVannaDB(config={"related_training_data_cache_size": 2, "retrieval_cache_size": 0})
+    assert vn.get_related_ddl("a") == ["a"]
+    vn.get_similar_question_sql("a")
+    vn.get_related_documentation("a")
+    assert vn.methods == ["get_related_training_data"]
+
+    vn.get_related_ddl("b")
+    vn.get_related_ddl("c")
+    assert len(vn.related_training_data) == 2
+
+    vn.add_ddl("CREATE TABLE a (id INT)")
+    assert len(vn.related_training_data) == 0
+    vn.get_related_ddl("c")
+    assert vn.methods.count("get_related_training_data") == 4
+
+
+def test_shared_related_training_data_is_keyed_on_question_and_generation():
+    vn = CachedVanna()
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return {"ddl": list(vn.ddl)}
+
+    assert vn._shared_related_training_data("q", fetch) == {"ddl": []}
+    vn._shared_related_training_data("q", fetch)["ddl"].append("CREATE TABLE x (id INT)")
+    assert vn._shared_related_training_data("q", fetch) == {"ddl": []}
+    assert len(fetches) == 1
+
+    vn._shared_related_training_data("q", fetch, tenant="acme")
+    assert len(fetches) == 2
+
+    vn.add_ddl("CREATE TABLE a (id INT)")
+    assert vn._shared_related_training_data("q", fetch, tenant="acme") == {"ddl": ["CREATE TABLE a (id INT)"]}
+    assert len(fetches) == 3
+
+
+def test_training_data_fingerprint_modes():
+    class CountedVanna(CachedVanna):
+        def count_training_data(self, training_data_type: str = None, search: str = None, **kwargs) -> int:
+            return len(self.ddl) if training_data_type == "ddl" else 0
+
+        def get_training_data(self, **kwargs):
+            raise AssertionError("counting doesn't fetch the training data")
+
+    vn = CountedVanna()
+    fingerprint = vn._training_data_fingerprint()
+    vn.add_ddl("CREATE TABLE a (id INT)")
+    assert vn._training_data_fingerprint() not in (None, fingerprint)
+
+    # Counting a store that doesn't count on its own would fetch all of its training data
+    assert CachedVanna()._training_data_fingerprint() is None
+    assert CachedVanna(config={"retrieval_snapshot_fingerprint": None})._training_data_fingerprint() is None
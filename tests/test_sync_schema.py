@@ -0,0 +1,147 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from vanna.base import VannaBase
+from vanna.mock import MockEmbedding, MockLLM
+from vanna.numpy import NumPy_VectorStore
+from vanna.utils import deterministic_uuid
+
+
+class VannaDictStore(MockEmbedding, MockLLM, VannaBase):
+    def __init__(self, config=None):
+        VannaBase.__init__(self, config=config)
+        self.documentation = {}
+
+    def log(self, message: str, title: str = "Info"):
+        pass
+
+    def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
+        raise NotImplementedError
+
+    def add_ddl(self, ddl: str, **kwargs) -> str:
+        raise NotImplementedError
+
+    def add_documentation(self, documentation: str, **kwargs) -> str:
+        id = deterministic_uuid(documentation) + "-doc"
+        self.documentation[id] = documentation
+        return id
+
+    def get_similar_question_sql(self, question: str, **kwargs) -> list:
+        return []
+
+    def get_related_ddl(self, question: str, **kwargs) -> list:
+        return []
+
+    def get_related_documentation(self, question: str, **kwargs) -> list:
+        return list(self.documentation.values())
+
+    def get_training_data(self, **kwargs) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "id": list(self.documentation.keys()),
+                "question": None,
+                "content": list(self.documentation.values()),
+                "training_data_type": "documentation",
+            }
+        )
+
+    def remove_training_data(self, id: str, **kwargs) -> bool:
+        return self.documentation.pop(id, None) is not None
+
+
+class NumPyVanna(NumPy_VectorStore, MockLLM):
+    def __init__(self, config=None):
+        NumPy_VectorStore.__init__(self, config=config)
+        MockLLM.__init__(self, config=config)
+
+    def log(self, message: str, title: str = "Info"):
+        pass
+
+
+def embed(texts):
+    return [np.random.default_rng(zlib.crc32(text.encode())).standard_normal(8) for text in texts]
+
+
+def information_schema(tables: dict) -> pd.DataFrame:
+    rows = []
+    for table, columns in tables.items():
+        for position, (column, data_type) in enumerate(columns, start=1):
+            rows.append(
+                {
+                    "TABLE_CATALOG": "DB",
+                    "TABLE_SCHEMA": "PUBLIC",
+                    "TABLE_NAME": table,
+                    "COLUMN_NAME": column,
+                    "ORDINAL_POSITION": position,
+                    "DATA_TYPE": data_type,
+                    "COMMENT": None,
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def test_sync_schema():
+    vn = VannaDictStore()
+
+    df = information_schema({"a": [("x", "int"), ("y", "int")], "b": [("z", "int")]})
+    diff = vn.sync_schema(df)
+    assert diff.added == ["DB.PUBLIC.a", "DB.PUBLIC.b"]
+    assert len(vn.documentation) == 2
+
+    # Row order returned by the database doesn't change the fingerprint
+    diff = vn.sync_schema(df.iloc[::-1])
+    assert diff.unchanged == 2 and diff.added == diff.changed == diff.removed == []
+
+    df = information_schema({"a": [("x", "text"), ("y", "int")], "c": [("w", "int")]})
+    diff = vn.sync_schema(df, dry_run=True)
+    assert diff.changed == ["DB.PUBLIC.a"]
+    assert len(vn.documentation) == 2 and vn.sync_schema(df, dry_run=True) == diff
+
+    diff = vn.sync_schema(df)
+    assert diff.added == ["DB.PUBLIC.c"]
+    assert diff.changed == ["DB.PUBLIC.a"]
+    assert diff.removed == ["DB.PUBLIC.b"]
+    assert len(vn.documentation) == 2
+    assert vn.sync_schema(df).unchanged == 2
+
+
+def test_sync_schema_reads_stored_metadata():
+    vn = NumPyVanna(config={"client": "in-memory", "embedding_function": embed})
+    vn.add_documentation("Our fiscal year starts in February.")
+
+    df = information_schema({"a": [("x", "int")], "b": [("z", "int")]})
+    vn.sync_schema(df)
+    metadata = vn.get_training_data_metadata("documentation", "schema_table")
+    assert sorted(item["schema_table"] for item in metadata.values()) == ['["DB", "PUBLIC", "a"]', '["DB", "PUBLIC", "b"]']
+
+    calls = []
+    vn.get_training_data = lambda **kwargs: calls.append("get_training_data")
+    remove_training_data = vn.remove_training_data
+    add_documentation_batch = vn.add_documentation_batch
+    vn.remove_training_data = lambda id, **kwargs: calls.append("remove") or remove_training_data(id)
+    vn.add_documentation_batch = lambda docs, **kwargs: calls.append("add") or add_documentation_batch(docs, **kwargs)
+
+    diff = vn.sync_schema(information_schema({"a": [("x", "text")]}))
+    assert diff.changed == ["DB.PUBLIC.a"] and diff.removed == ["DB.PUBLIC.b"]
+    assert calls == ["add", "remove", "remove"]
+
+    del vn.get_training_data
+    assert vn.count_training_data() == 2
+
+
+class VannaBatchDictStore(VannaDictStore):
+    # Like the stores whose native batch methods can't keep metadata
+    def add_documentation_batch(self, documentation_list: list, metadatas=None, **kwargs) -> list:
+        if metadatas is not None:
+            raise ValueError("metadatas can't be stored")
+        return [self.add_documentation(documentation) for documentation in documentation_list]
+
+
+def test_sync_schema_passes_metadata_only_to_stores_that_keep_it():
+    vn = VannaBatchDictStore()
+
+    df = information_schema({"a": [("x", "int")], "b": [("z", "int")]})
+    assert vn.sync_schema(df).added == ["DB.PUBLIC.a", "DB.PUBLIC.b"]
+    assert vn.sync_schema(df).unchanged == 2
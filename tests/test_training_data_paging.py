@@ -0,0 +1,113 @@
+import json
+import zlib
+
+import numpy as np
+import pandas as pd
+from chromadb import Documents, EmbeddingFunction, Embeddings
+
+from vanna.base import VannaBase
+from vanna.chromadb import ChromaDB_VectorStore
+from vanna.flask import VannaFlaskAPI
+from vanna.mock import MockEmbedding, MockLLM
+
+
+class VannaListStore(MockEmbedding, MockLLM, VannaBase):
+    def __init__(self, config=None):
+        VannaBase.__init__(self, config=config)
+        self.fetches = 0
+
+    def log(self, message: str, title: str = "Info"):
+        pass
+
+    def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
+        raise NotImplementedError
+
+    def add_ddl(self, ddl: str, **kwargs) -> str:
+        raise NotImplementedError
+
+    def add_documentation(self, documentation: str, **kwargs) -> str:
+        raise NotImplementedError
+
+    def get_similar_question_sql(self, question: str, **kwargs) -> list:
+        return []
+
+    def get_related_ddl(self, question: str, **kwargs) -> list:
+        return []
+
+    def get_related_documentation(self, question: str, **kwargs) -> list:
+        return []
+
+    def get_training_data(self, **kwargs) -> pd.DataFrame:
+        self.fetches += 1
+        return pd.DataFrame(
+            {
+                "id": [f"{i}-ddl" for i in range(5)],
+                "question": None,
+                "content": [f"CREATE TABLE t{i} (id INT)" for i in range(5)],
+                "training_data_type": "ddl",
+            }
+        )
+
+    def remove_training_data(self, id: str, **kwargs) -> bool:
+        return False
+
+
+def test_training_data_endpoint_fetches_training_data_once():
+    vn = VannaListStore()
+    client = VannaFlaskAPI(vn).flask_app.test_client()
+
+    response = client.get("/api/v0/get_training_data?page_size=2&offset=1")
+    assert response.json["total"] == 5
+    assert [row["id"] for row in json.loads(response.json["df"])] == ["1-ddl", "2-ddl"]
+    assert vn.fetches == 1
+
+    response = client.get("/api/v0/get_training_data")
+    assert response.json["total"] == 5
+    assert len(json.loads(response.json["df"])) == 5
+    assert vn.fetches == 2
+
+    assert client.get("/api/v0/get_training_data?page_size=0").status_code == 400
+    assert client.get("/api/v0/get_training_data?page_size=2&offset=-1").status_code == 400
+    assert vn.fetches == 2
+
+
+class CRC32EmbeddingFunction(EmbeddingFunction):
+    def __init__(self):
+        pass
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return [np.random.default_rng(zlib.crc32(text.encode())).standard_normal(8) for text in input]
+
+    @staticmethod
+    def name() -> str:
+        return "crc32"
+
+    def get_config(self) -> dict:
+        return {}
+
+    @staticmethod
+    def build_from_config(config: dict) -> "CRC32EmbeddingFunction":
+        return CRC32EmbeddingFunction()
+
+
+class ChromaVanna(ChromaDB_VectorStore, MockLLM):
+    def __init__(self, config=None):
+        ChromaDB_VectorStore.__init__(self, config=config)
+        MockLLM.__init__(self, config=config)
+
+
+def test_chroma_pages_match_get_training_data(tmp_path):
+    vn = ChromaVanna(config={"path": str(tmp_path), "embedding_function": CRC32EmbeddingFunction()})
+    vn.add_ddl_batch([f"CREATE TABLE orders_{i} (id INT)" for i in range(4)] + ["CREATE TABLE users (id INT)"])
+    vn.add_documentation_batch(["Orders are shipped daily", "Users sign up online"])
+    vn.add_question_sql("How many orders?", "SELECT COUNT(*) FROM orders_0")
+
+    for filters in ({}, {"training_data_type": "ddl"}, {"search": "orders"}, {"training_data_type": "sql", "search": "users"}):
+        expected = VannaBase._filter_training_data(vn.get_training_data(), **filters)
+        assert vn.count_training_data(**filters) == len(expected)
+
+        for page_size, offset in ((3, 0), (2, 3), (4, 7)):
+            pages = list(vn.iter_training_data(page_size=page_size, offset=offset, **filters))
+            assert all(len(page) <= page_size for page in pages)
+            ids = [id for page in pages for id in page["id"]]
+            assert sorted(ids) == sorted(expected["id"].iloc[offset:])
@@ -0,0 +1,79 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("weaviate")
+
+from vanna.mock import MockLLM
+from vanna.weaviate import WeaviateDatabase
+
+
+class FakeData:
+    def __init__(self):
+        self.objects = []
+
+    def insert_many(self, objects):
+        self.objects += objects
+        uuids = {i: obj.uuid if obj.uuid is not None else uuid.uuid4() for i, obj in enumerate(objects)}
+        return SimpleNamespace(errors={}, uuids=uuids)
+
+
+class FakeCollections:
+    def __init__(self):
+        self.collections = {}
+
+    def exists(self, name):
+        return True
+
+    def get(self, name):
+        return self.collections.setdefault(name, SimpleNamespace(data=FakeData()))
+
+
+class FakeWeaviateClient:
+    def __init__(self):
+        self.collections = FakeCollections()
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class WeaviateVanna(WeaviateDatabase, MockLLM):
+    def __init__(self, config=None):
+        WeaviateDatabase.__init__(self, config=config)
+        MockLLM.__init__(self, config=config)
+
+    def log(self, message: str, title: str = "Info"):
+        pass
+
+
+@pytest.fixture
+def vn(monkeypatch):
+    monkeypatch.setattr(WeaviateDatabase, "_initialize_weaviate_client", lambda self: FakeWeaviateClient())
+    return WeaviateVanna(config={"weaviate_port": 8080})
+
+
+def test_weaviate_batch_adds_keep_imported_ids_and_embeddings(vn, monkeypatch):
+    def embed(data, **kwargs):
+        raise AssertionError("imported embeddings are stored as they are")
+
+    monkeypatch.setattr(vn, "generate_embeddings", embed)
+    imported_uuid = "8a1f0a0e-4b0c-4f36-9d6c-2f3d1a2b3c4d"
+    ids = vn.add_documentation_batch(
+        ["a", "b"], ids=[f"{imported_uuid}-doc", "not-a-uuid-doc"], embeddings=[[1.0, 0.0], [0.0, 1.0]]
+    )
+
+    objects = vn.weaviate_client.collections.get("DocumentationEntry").data.objects
+    assert [(str(obj.uuid), obj.properties, obj.vector) for obj in objects] == [
+        (imported_uuid, {"description": "a"}, [1.0, 0.0]),
+        (str(objects[1].uuid), {"description": "b"}, [0.0, 1.0]),
+    ]
+    # Ids without a uuid part get a uuid derived from them, so importing them again overwrites the same object
+    assert ids == [f"{imported_uuid}-doc", f"{objects[1].uuid}-doc"]
+    assert WeaviateDatabase._object_uuid("not-a-uuid-doc") == str(objects[1].uuid)
+
+    with pytest.raises(ValueError, match="metadatas"):
+        vn.add_documentation_batch(["doc"], metadatas=[{"schema_table": "[]"}])